@@ -0,0 +1,94 @@
+"""
+Compare the capture buffer used by lib.record.record against the
+list-and-concatenate approach it replaced.
+
+Each case runs in its own process so that peak RSS is measured cleanly.
+
+    python benchmarks/capture_buffer.py [seconds ...]
+"""
+
+import os
+import sys
+import time
+import resource
+import subprocess
+
+import numpy
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from lib.capture_buffer import CaptureBuffer  # noqa
+
+SAMPLE_RATE = 48000
+CHUNK_SIZE = 1024
+NUM_CHANNELS = 2
+DEFAULT_DURATIONS = [10, 45, 120]
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere.
+    return peak / (1024. * 1024.) if sys.platform == 'darwin' else peak / 1024.
+
+
+def chunk_stream(seconds):
+    raw = numpy.random.randint(
+        -2 ** 15, 2 ** 15, CHUNK_SIZE * NUM_CHANNELS
+    ).astype(numpy.int16).tostring()
+    for _ in xrange(int(seconds * SAMPLE_RATE / CHUNK_SIZE)):
+        yield numpy.reshape(
+            numpy.fromstring(raw, dtype=numpy.int16), (2, -1), 'F')
+
+
+def capture_concatenate(seconds):
+    data = []
+    for snd_data in chunk_stream(seconds):
+        data.append(snd_data)
+    r = numpy.empty([NUM_CHANNELS, 0], dtype=numpy.int16)
+    for chunk in data:
+        r = numpy.concatenate((r, chunk), axis=1)
+    return r
+
+
+def capture_buffer(seconds):
+    data = CaptureBuffer.for_limit(
+        seconds, SAMPLE_RATE, NUM_CHANNELS, numpy.int16, CHUNK_SIZE)
+    for snd_data in chunk_stream(seconds):
+        data.append(snd_data)
+    return data.data
+
+
+STRATEGIES = {
+    'concatenate': capture_concatenate,
+    'buffer': capture_buffer,
+}
+
+
+def run_one(strategy, seconds):
+    baseline = peak_rss_mb()
+    start = time.time()
+    result = STRATEGIES[strategy](seconds)
+    elapsed = time.time() - start
+    assert result.shape[1] == int(seconds * SAMPLE_RATE / CHUNK_SIZE) * \
+        CHUNK_SIZE
+    print "%f %f" % (elapsed, peak_rss_mb() - baseline)
+
+
+def main(durations):
+    print "%8s  %12s  %10s  %14s" % (
+        'seconds', 'strategy', 'time (s)', 'peak RSS (MB)')
+    for seconds in durations:
+        for strategy in sorted(STRATEGIES):
+            output = subprocess.check_output([
+                sys.executable, os.path.abspath(__file__),
+                '--run', strategy, str(seconds)
+            ])
+            elapsed, rss = [float(x) for x in output.split()]
+            print "%8.1f  %12s  %10.3f  %14.1f" % (
+                seconds, strategy, elapsed, rss)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 4 and sys.argv[1] == '--run':
+        run_one(sys.argv[2], float(sys.argv[3]))
+    else:
+        main([float(x) for x in sys.argv[1:]] or DEFAULT_DURATIONS)
@@ -0,0 +1,65 @@
+"""
+Run the whole sample_program pipeline against the virtual instrument and
+report how long it took, so changes anywhere in the pipeline can be
+measured without MIDI or audio hardware.
+
+    python benchmarks/end_to_end.py [speed] [--profile]
+
+``speed`` is how many times faster than real time the instrument runs.
+With --profile, the 25 most expensive functions are printed afterwards.
+"""
+
+import os
+import sys
+import time
+import shutil
+import pstats
+import cProfile
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from lib.send_notes import sample_program  # noqa
+from lib.virtual_instrument import VirtualInstrument  # noqa
+
+LOW_KEY = 48
+HIGH_KEY = 72
+KEY_RANGE = 3
+VELOCITY_LEVELS = [31, 63, 95, 127]
+LIMIT = 2.0
+
+
+def run(speed):
+    output_folder = tempfile.mkdtemp()
+    try:
+        start = time.time()
+        sample_program(
+            output_folder=output_folder,
+            low_key=LOW_KEY,
+            high_key=HIGH_KEY,
+            key_range=KEY_RANGE,
+            velocity_levels=VELOCITY_LEVELS,
+            limit=LIMIT,
+            flac=False,
+            backend=VirtualInstrument(speed=speed),
+        )
+        return time.time() - start
+    finally:
+        shutil.rmtree(output_folder)
+
+
+def main(speed, profile):
+    notes = len(range(LOW_KEY, HIGH_KEY + 1, KEY_RANGE)) * len(VELOCITY_LEVELS)
+    if profile:
+        profiler = cProfile.Profile()
+        elapsed = profiler.runcall(run, speed)
+    else:
+        elapsed = run(speed)
+    print "Sampled %d notes at %2.1fx real time in %2.2f secs " \
+        "(%2.2f notes/sec)" % (notes, speed, elapsed, notes / elapsed)
+    if profile:
+        pstats.Stats(profiler).sort_stats('cumulative').print_stats(25)
+
+
+if __name__ == "__main__":
+    args = [arg for arg in sys.argv[1:] if arg != '--profile']
+    main(float(args[0]) if args else 20.0, '--profile' in sys.argv)
@@ -0,0 +1,119 @@
+"""
+Compare lib.loop.find_similar_sample_indices against the one-index-at-a-
+time Python loop it replaced, on a library of sustained samples.
+
+    python benchmarks/loop_matching.py [sample files ...]
+
+Each sample is searched the way a brute-force window matcher would
+search it: every position in the first window's length from its middle
+is matched against points one and two windows later. Without any
+files, sustained notes are rendered by the virtual instrument.
+"""
+
+import os
+import sys
+import time
+
+import numpy
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from lib.loop import find_similar_sample_indices, slope_at_index  # noqa
+from lib.wavio import read_wave_file  # noqa
+from lib.virtual_instrument import VirtualInstrument  # noqa
+
+SAMPLE_RATE = 48000
+RENDERED_NOTES = range(36, 96, 6)
+RENDERED_SECONDS = 3.0
+WINDOW_SIZE = 2048
+
+
+def find_similar_sample_index_loop(
+    file,
+    reference_index,
+    search_around_index,
+    search_size=100
+):
+    """
+    The one-index-at-a-time search that find_similar_sample_indices
+    replaced, kept as the reference it's tested against.
+    """
+    reference_slope = slope_at_index(file, reference_index) > 0
+    best_match = None
+    for i in xrange(
+        search_around_index - search_size,
+        search_around_index + search_size
+    ):
+        if i < 1 or i > len(file) - 2:
+            continue
+        if (slope_at_index(file, i) > 0) != reference_slope:
+            continue
+        abs_diff = abs(float(file[i]) - float(file[reference_index]))
+        if best_match is None or abs_diff < best_match[1]:
+            best_match = (i, abs_diff)
+    return best_match[0] if best_match is not None else search_around_index
+
+
+def rendered_library():
+    for note in RENDERED_NOTES:
+        instrument = VirtualInstrument(release=0.1)
+        instrument.send_message([0x90, note, 100])
+        data = instrument.render(
+            int(RENDERED_SECONDS * SAMPLE_RATE), 1, SAMPLE_RATE,
+            numpy.random.RandomState(note))
+        yield 'note %d' % note, (data[0] * 2 ** 15).astype(numpy.int16)
+
+
+def file_library(paths):
+    for path in paths:
+        yield os.path.basename(path), read_wave_file(path, True)[0]
+
+
+def search_positions(file):
+    start = len(file) / 2
+    references = numpy.arange(start, start + WINDOW_SIZE)
+    return references, references + WINDOW_SIZE, \
+        references + WINDOW_SIZE * 2
+
+
+def match_loop(file):
+    references, first, second = search_positions(file)
+    return [
+        [find_similar_sample_index_loop(file, r, a) for r, a in zip(
+            references, around)]
+        for around in (first, second)
+    ]
+
+
+def match_vectorized(file):
+    references, first, second = search_positions(file)
+    return [
+        find_similar_sample_indices(file, references, around).tolist()
+        for around in (first, second)
+    ]
+
+
+def main(paths):
+    library = list(file_library(paths) if paths else rendered_library())
+    print "%20s  %10s  %12s  %14s  %8s" % (
+        'sample', 'positions', 'loop (s)', 'vectorized (s)', 'speedup')
+    totals = [0.0, 0.0]
+    for name, file in library:
+        if len(file) < WINDOW_SIZE * 4:
+            continue
+        timings = []
+        results = []
+        for strategy in (match_loop, match_vectorized):
+            start = time.time()
+            results.append(strategy(file))
+            timings.append(time.time() - start)
+        assert results[0] == results[1], "Strategies disagree on %s" % name
+        totals = [total + t for total, t in zip(totals, timings)]
+        print "%20s  %10d  %12.3f  %14.3f  %7.1fx" % (
+            name[-20:], WINDOW_SIZE * 2, timings[0], timings[1],
+            timings[0] / timings[1])
+    print "%20s  %10s  %12.3f  %14.3f  %7.1fx" % (
+        'total', '', totals[0], totals[1], totals[0] / totals[1])
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
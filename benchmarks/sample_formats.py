@@ -0,0 +1,53 @@
+"""
+Measure encode and decode throughput for each sample format. Decoding
+int16 and float32 is a zero-copy view, so only int24 decode does real work.
+
+    python benchmarks/sample_formats.py [seconds]
+"""
+
+import os
+import sys
+import time
+
+import numpy
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from lib.sample_format import FORMATS  # noqa
+
+SAMPLE_RATE = 48000
+NUM_CHANNELS = 2
+REPEATS = 5
+
+
+def best_of(function, *args):
+    best = None
+    for _ in xrange(REPEATS):
+        start = time.time()
+        function(*args)
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def main(seconds):
+    noise = numpy.random.uniform(
+        -1, 1, (NUM_CHANNELS, int(seconds * SAMPLE_RATE)))
+    print "%2.1f secs of stereo audio, best of %d runs" % (seconds, REPEATS)
+    print "%8s  %12s  %16s  %16s" % (
+        'format', 'size (MB)', 'encode (MB/s)', 'decode (MB/s)')
+    for name, sample_format in sorted(FORMATS.items()):
+        data = (noise * (sample_format.full_scale - 1)).astype(
+            sample_format.dtype)
+        raw = sample_format.encode(data.T)
+        megabytes = len(raw) / (1024. * 1024.)
+        print "%8s  %12.1f  %16.1f  %16.1f" % (
+            name,
+            megabytes,
+            megabytes / best_of(sample_format.encode, data.T),
+            megabytes / best_of(sample_format.decode, raw),
+        )
+
+
+if __name__ == "__main__":
+    main(float(sys.argv[1]) if len(sys.argv) > 1 else 60)
@@ -0,0 +1,69 @@
+"""
+Compare WAV writing throughput of lib.wavio.write_wave_file against the
+struct.pack loop that lib.record.save_to_file used to run.
+
+    python benchmarks/wav_writer.py [seconds]
+"""
+
+import os
+import sys
+import time
+import wave
+import tempfile
+from struct import pack
+
+import numpy
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from lib.wavio import write_wave_file  # noqa
+from lib.sample_format import INT16  # noqa
+
+SAMPLE_RATE = 48000
+NUM_CHANNELS = 2
+
+
+def struct_pack_save(path, sample_width, data, sample_rate):
+    wf = wave.open(path, 'wb')
+    wf.setnchannels(NUM_CHANNELS)
+    wf.setsampwidth(sample_width)
+    wf.setframerate(sample_rate)
+
+    flattened = numpy.asarray(data.flatten('F'), dtype=numpy.int16)
+
+    write_chunk_size = 512
+    for chunk_start in xrange(0, len(flattened), write_chunk_size):
+        chunk = flattened[chunk_start:chunk_start + write_chunk_size]
+        packstring = '<' + ('h' * len(chunk))
+        wf.writeframes(pack(packstring, *chunk))
+    wf.close()
+
+
+WRITERS = [
+    ('struct.pack', struct_pack_save),
+    ('write_wave_file',
+     lambda path, sample_width, data, sample_rate: write_wave_file(
+         path, data, INT16, sample_rate)),
+]
+
+
+def main(seconds):
+    data = numpy.random.randint(
+        -2 ** 15, 2 ** 15, (NUM_CHANNELS, int(seconds * SAMPLE_RATE))
+    ).astype(numpy.int16)
+    megabytes = data.nbytes / (1024. * 1024.)
+    path = tempfile.mktemp(suffix='.wav')
+    print "Writing %2.1f secs of stereo audio (%2.1f MB)" % (
+        seconds, megabytes)
+    print "%16s  %10s  %10s" % ('writer', 'time (s)', 'MB/s')
+    try:
+        for name, writer in WRITERS:
+            start = time.time()
+            writer(path, 2, data, SAMPLE_RATE)
+            elapsed = time.time() - start
+            print "%16s  %10.3f  %10.1f" % (name, elapsed, megabytes / elapsed)
+    finally:
+        os.unlink(path)
+
+
+if __name__ == "__main__":
+    main(float(sys.argv[1]) if len(sys.argv) > 1 else 120)
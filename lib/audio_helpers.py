@@ -5,8 +5,10 @@ from record import record
 from constants import CLIPPING_THRESHOLD, \
     CLIPPING_CHECK_NOTE, \
     EXIT_ON_CLIPPING, \
-    SAMPLE_RATE
+    SAMPLE_RATE, \
+    SAMPLE_FORMAT
 from midi_helpers import all_notes_off, CHANNEL_OFFSET
+from noise_model import NoiseModel
 
 
 def generate_sample(
@@ -19,6 +21,13 @@ def generate_sample(
     print_progress=False,
     audio_interface_name=None,
     sample_rate=SAMPLE_RATE,
+    sample_format=SAMPLE_FORMAT,
+    session=None,
+    stream_to=None,
+    start_threshold=None,
+    end_threshold=None,
+    decay_prior=None,
+    steady_seconds=None,
 ):
     all_notes_off(midiout, midi_channel)
 
@@ -41,13 +50,23 @@ def generate_sample(
         print_progress=print_progress,
         audio_interface_name=audio_interface_name,
         sample_rate=sample_rate,
+        sample_format=sample_format,
+        session=session,
+        stream_to=stream_to,
+        start_threshold=start_threshold,
+        end_threshold=end_threshold,
+        decay_prior=decay_prior,
+        steady_seconds=steady_seconds,
     )
 
 
-def sample_threshold_from_noise_floor(bit_depth, audio_interface_name):
+def noise_model_from_noise_floor(
+    audio_interface_name,
+    session=None,
+):
     time.sleep(1)
     print "Sampling noise floor..."
-    sample_width, data, release_time = record(
+    recording = record(
         limit=2.0,
         after_start=None,
         on_time_up=None,
@@ -55,30 +74,32 @@ def sample_threshold_from_noise_floor(bit_depth, audio_interface_name):
         print_progress=True,
         allow_empty_return=True,
         audio_interface_name=audio_interface_name,
+        session=session,
     )
-    noise_floor = (
-        numpy.amax(numpy.absolute(data)) /
-        float(2 ** (bit_depth - 1))
+    noise_model = NoiseModel.from_capture(
+        recording.data, recording.sample_format.full_scale)
+    print "Noise floor has volume %8.8f dBFS (%8.8f dBFS RMS)" % (
+        percent_to_db(numpy.amax(noise_model.noise_peak)),
+        percent_to_db(noise_model.rms),
     )
-    print "Noise floor has volume %8.8f dBFS" % percent_to_db(noise_floor)
-    threshold = noise_floor * 1.1
-    print "Setting threshold to %8.8f dBFS" % percent_to_db(threshold)
-    return threshold
+    print "Setting threshold to %8.8f dBFS" % percent_to_db(
+        noise_model.threshold)
+    return noise_model
 
 
 def check_for_clipping(
     midiout,
     midi_channel,
     threshold,
-    bit_depth,
     audio_interface_name,
+    session=None,
 ):
     time.sleep(1)
     print "Checking for clipping and balance on note %s..." % (
         note_name(CLIPPING_CHECK_NOTE)
     )
 
-    sample_width, data, release_time = generate_sample(
+    recording = generate_sample(
         limit=2.0,
         midiout=midiout,
         note=CLIPPING_CHECK_NOTE,
@@ -87,15 +108,16 @@ def check_for_clipping(
         threshold=threshold,
         print_progress=True,
         audio_interface_name=audio_interface_name,
+        session=session,
     )
 
-    if data is None:
+    if recording.data is None:
         raise Exception(
             "Can't check for clipping because all we recorded was silence.")
 
     max_volume = (
-        numpy.amax(numpy.absolute(data)) /
-        float(2 ** (bit_depth - 1))
+        numpy.amax(numpy.absolute(recording.data)) /
+        recording.sample_format.full_scale
     )
 
     # All notes off, but like, a lot, again
@@ -135,6 +157,8 @@ def check_for_clipping(
     #         raise ValueError("Balance skewed!")
     # time.sleep(1)
 
+    return max_volume
+
 
 def fundamental_frequency(list, sampling_rate=1):
     w = numpy.fft.rfft(list)
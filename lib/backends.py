@@ -0,0 +1,129 @@
+"""Where MIDI goes out and audio comes in.
+
+A backend provides MIDI outputs (objects with an rtmidi-style
+``send_message``) and audio inputs (streams that call a PyAudio-style
+``callback(in_data, frame_count, time_info, status)`` from their own
+thread, and have ``stop_stream`` and ``close`` methods). The hardware
+backend uses rtmidi and PyAudio; virtual_instrument.VirtualInstrument is
+an in-process stand-in for running without any hardware at all.
+"""
+
+from midi_helpers import open_midi_port, open_midi_port_by_index
+
+try:
+    import pyaudio
+except ImportError:
+    pyaudio = None  # Only needed to record from real audio hardware.
+
+# PortAudio's values for these, so that backends without PyAudio can
+# speak the same callback protocol.
+PA_CONTINUE = 0
+PA_INPUT_OVERFLOW = 0x2
+
+
+def require_pyaudio():
+    if pyaudio is None:
+        raise ImportError(
+            "PyAudio is required to record from audio hardware.")
+
+
+def get_input_device_names(py_audio, info):
+    input_interface_names = {}
+    for i in range(0, info.get('deviceCount')):
+        device_info = py_audio.get_device_info_by_host_api_device_index(0, i)
+        if device_info.get('maxInputChannels') > 0:
+            input_interface_names[i] = device_info.get('name')
+    return input_interface_names
+
+
+def get_input_device_index(py_audio, audio_interface_name=None):
+    info = py_audio.get_host_api_info_by_index(0)
+    input_interface_names = get_input_device_names(py_audio, info)
+
+    if audio_interface_name:
+        for index, name in input_interface_names.iteritems():
+            if audio_interface_name.lower() in name.lower():
+                return index
+        else:
+            raise Exception(
+                "Could not find audio input '%s' in inputs:\n%s" % (
+                    audio_interface_name,
+                    list_input_devices(input_interface_names)))
+
+
+def get_input_device_name_by_index(audio_interface_index):
+    require_pyaudio()
+    py_audio = pyaudio.PyAudio()
+    info = py_audio.get_host_api_info_by_index(0)
+    input_interface_names = get_input_device_names(py_audio, info)
+
+    for index, name in input_interface_names.iteritems():
+        if index == audio_interface_index:
+            return name
+    else:
+        raise Exception(
+            "Could not find audio input index %s in inputs:\n%s" % (
+                audio_interface_index,
+                list_input_devices(input_interface_names)))
+
+
+def list_input_devices(device_names):
+    lines = []
+    for index, name in sorted(device_names.iteritems()):
+        lines.append(u"{:3d}. {}".format(index, name))
+    return u"\n".join(lines).encode("ascii", "ignore")
+
+
+class PyAudioInput(object):
+    """An input stream that shuts PyAudio down when it's closed."""
+
+    def __init__(self, py_audio, stream):
+        self.py_audio = py_audio
+        self.stream = stream
+
+    def stop_stream(self):
+        self.stream.stop_stream()
+
+    def start_stream(self):
+        self.stream.start_stream()
+
+    def close(self):
+        self.stream.close()
+        self.py_audio.terminate()
+
+
+class HardwareBackend(object):
+    """Real MIDI ports, through rtmidi, and audio inputs, through PyAudio."""
+
+    def open_midi_output(self, midi_port_name=None, midi_port_index=None):
+        if midi_port_name:
+            return open_midi_port(midi_port_name)
+        else:
+            return open_midi_port_by_index(midi_port_index)
+
+    def input_device_name(self, audio_interface_index):
+        return get_input_device_name_by_index(audio_interface_index)
+
+    def open_audio_input(
+        self,
+        audio_interface_name,
+        num_channels,
+        sample_rate,
+        sample_format,
+        frames_per_buffer,
+        callback,
+    ):
+        require_pyaudio()
+        py_audio = pyaudio.PyAudio()
+        stream = py_audio.open(
+            format=getattr(pyaudio, sample_format.pyaudio_format),
+            channels=num_channels,
+            rate=sample_rate,
+            input=True,
+            output=False,
+            frames_per_buffer=frames_per_buffer,
+            input_device_index=get_input_device_index(
+                py_audio, audio_interface_name),
+            stream_callback=callback,
+        )
+        return PyAudioInput(py_audio, stream)
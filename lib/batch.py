@@ -0,0 +1,124 @@
+"""Sample a bank of programs in one run.
+
+The MIDI port and the audio session are opened once, the noise floor is
+measured once, and each program is leveled and compressed to FLAC in the
+background while the next one is sampled. Each program's samples and
+SFZ files go into its own folder, named after its program number.
+"""
+
+import os
+from record import AudioSession
+from backends import HardwareBackend
+from pipeline import WorkerPool
+from utils import two_ints
+from constants import SAMPLE_RATE, SAMPLE_FORMAT
+from send_notes import sample_program
+
+
+def parse_programs(value):
+    """
+    Type for argparse. Expects a program number, or a range of them
+    like 0-15 (inclusive).
+    """
+    low, _, high = value.partition('-')
+    programs = range(int(low), int(high or low) + 1)
+    if not programs:
+        raise ValueError("Program ranges go from low to high.")
+    return programs
+
+
+def parse_program_cc(value):
+    """
+    Type for argparse. Expects PROGRAM:CC,VALUE[:CC,VALUE...], the
+    controller changes to send before that program's program change.
+    """
+    parts = value.split(':')
+    return int(parts[0]), [two_ints(part) for part in parts[1:]]
+
+
+def program_folder(output_folder, program_number):
+    return os.path.join(output_folder, '%03d' % program_number)
+
+
+def sample_programs(
+    programs,
+    output_folder='foo',
+    program_ccs=None,
+    cc_before=None,
+    midi_port_name=None,
+    midi_port_index=None,
+    audio_interface_name=None,
+    audio_interface_index=None,
+    sample_rate=SAMPLE_RATE,
+    sample_format=SAMPLE_FORMAT,
+    backend=None,
+    dry_run=False,
+    **kwargs
+):
+    """
+    Sample each of ``programs`` into a folder of ``output_folder``.
+    ``program_ccs`` maps program numbers to the (CC, value) pairs sent
+    before that program's program change, after ``cc_before``. Every
+    other argument is passed on to sample_program.
+    """
+    program_ccs = program_ccs or {}
+    if not os.path.isdir(output_folder):
+        os.makedirs(output_folder)
+
+    def sample(program_number, **session_kwargs):
+        return sample_program(
+            output_folder=program_folder(output_folder, program_number),
+            program_number=program_number,
+            cc_before=(cc_before or []) + program_ccs.get(program_number, []),
+            midi_port_name=midi_port_name,
+            midi_port_index=midi_port_index,
+            audio_interface_name=audio_interface_name,
+            sample_rate=sample_rate,
+            sample_format=sample_format,
+            dry_run=dry_run,
+            **dict(kwargs, **session_kwargs)
+        )
+
+    if dry_run:
+        for program_number in programs:
+            print "Program %d:" % program_number
+            sample(program_number)
+        return
+
+    backend = backend or HardwareBackend()
+    midiout = backend.open_midi_output(midi_port_name, midi_port_index)
+    if not audio_interface_name:
+        audio_interface_name = backend.input_device_name(
+            audio_interface_index)
+
+    session = AudioSession(
+        audio_interface_name,
+        sample_rate,
+        sample_format,
+        backend=backend,
+    ).open()
+    # One program is leveled and compressed at a time, behind sampling.
+    finisher = WorkerPool(1)
+    noise_model = None
+    finished = []
+    try:
+        for i, program_number in enumerate(programs):
+            print "Program %d of %d:" % (i + 1, len(programs))
+            calibration, job = sample(
+                program_number,
+                backend=backend,
+                midiout=midiout,
+                session=session,
+                noise_model=noise_model,
+                finisher=finisher,
+            )
+            noise_model = calibration.noise_model
+            finished.append(job)
+    finally:
+        session.close()
+        print "Waiting for %d programs to be leveled and compressed..." % (
+            sum(1 for job in finished if not job.done))
+        finisher.close()
+    for job in finished:
+        job.result()
+    print session.timing_report()
@@ -0,0 +1,49 @@
+import os
+import json
+
+from constants import CACHE_DIR
+
+
+def cache_key(*parts):
+    """A cache key from anything that identifies a result, like a port name
+    and a program number."""
+    return json.dumps(parts)
+
+
+class Cache(object):
+    """
+    A small JSON file of results, kept in CACHE_DIR under ``name`` and
+    rewritten whole on every set(). Values must be JSON-serializable.
+    """
+
+    def __init__(self, name, directory=None):
+        self.path = os.path.join(
+            os.path.expanduser(directory or CACHE_DIR), name + '.json')
+        self.entries = self.load()
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (IOError, ValueError):
+            return {}
+
+    def get(self, key, default=None):
+        return self.entries.get(key, default)
+
+    def set(self, key, value):
+        self.entries[key] = value
+        self.save()
+
+    def delete(self, key):
+        if self.entries.pop(key, None) is not None:
+            self.save()
+
+    def save(self):
+        directory = os.path.dirname(self.path)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        temporary = self.path + '.tmp'
+        with open(temporary, 'w') as f:
+            json.dump(self.entries, f, indent=2, sort_keys=True)
+        os.rename(temporary, self.path)
@@ -0,0 +1,189 @@
+"""
+Remember each setup's noise floor and clipping check between sessions.
+
+Measuring the noise floor and checking for clipping takes a few seconds
+per session, which adds up over a batch of programs. A calibration is
+reused for the same audio interface, sample rate, MIDI port and channel,
+program and controller changes until it's CALIBRATION_TTL old, as long
+as a short re-measure of the noise floor still agrees with it.
+"""
+
+import time
+import numpy
+from cache import Cache, cache_key
+from noise_model import NoiseModel
+from record import record
+from audio_helpers import noise_model_from_noise_floor, check_for_clipping
+from utils import percent_to_db
+
+CALIBRATION_CACHE_NAME = 'calibrations'
+# How long a calibration is trusted for, in seconds.
+CALIBRATION_TTL = 24 * 60 * 60
+# How long the noise floor is re-measured for before a cached calibration
+# is reused, and how far (in dB) any input's level may have drifted.
+DRIFT_CHECK_SECONDS = 0.2
+MAX_DRIFT_DB = 3.0
+
+
+def calibration_key(
+    audio_interface_name,
+    sample_rate,
+    midi_port,
+    midi_channel,
+    program_number,
+    cc_before=None,
+    cc_after=None,
+):
+    """
+    What a calibration depends on: the audio input, and the sound played
+    into it, like range_probe.range_cache_key.
+    """
+    return cache_key(
+        audio_interface_name,
+        sample_rate,
+        midi_port,
+        midi_channel,
+        program_number,
+        cc_before,
+        cc_after,
+    )
+
+
+class Calibration(object):
+    """A noise model, and the peak level of the clipping check note."""
+
+    def __init__(self, noise_model, max_volume, measured_at=None):
+        self.noise_model = noise_model
+        self.max_volume = max_volume
+        self.measured_at = measured_at if measured_at is not None \
+            else time.time()
+
+    def to_json(self):
+        return {
+            'noise_rms': self.noise_model.noise_rms.tolist(),
+            'noise_peak': self.noise_model.noise_peak.tolist(),
+            'max_volume': float(self.max_volume),
+            'measured_at': self.measured_at,
+        }
+
+    @classmethod
+    def from_json(cls, value):
+        return cls(
+            NoiseModel(value['noise_rms'], value['noise_peak']),
+            value['max_volume'],
+            value['measured_at'],
+        )
+
+    @property
+    def age(self):
+        return time.time() - self.measured_at
+
+    def drift_db(self, noise_model):
+        """
+        How far the loudest-drifting input of a freshly measured
+        ``noise_model`` is from this calibration's, in dB. Not finite if
+        they can't be compared, as when an input couldn't be measured.
+        """
+        if len(noise_model.noise_rms) != len(self.noise_model.noise_rms):
+            return numpy.inf
+        considered = numpy.isfinite(self.noise_model.noise_rms)
+        drift = [
+            abs(percent_to_db(new) - percent_to_db(old))
+            for new, old in zip(
+                noise_model.noise_rms[considered],
+                self.noise_model.noise_rms[considered])
+        ]
+        return float(numpy.max(drift)) if drift else 0.0
+
+
+def measure_drift(calibration, audio_interface_name, session=None):
+    recording = record(
+        limit=DRIFT_CHECK_SECONDS,
+        after_start=None,
+        on_time_up=None,
+        threshold=0.1,
+        print_progress=False,
+        allow_empty_return=True,
+        audio_interface_name=audio_interface_name,
+        session=session,
+    )
+    return calibration.drift_db(NoiseModel.from_capture(
+        recording.data, recording.sample_format.full_scale))
+
+
+def cached_calibration(cache, key, audio_interface_name, session=None):
+    """
+    The cached calibration for ``key``, or None if there isn't one, it's
+    too old, or the noise floor no longer matches it.
+    """
+    value = cache.get(key)
+    if value is None:
+        return None
+    calibration = Calibration.from_json(value)
+    if calibration.age > CALIBRATION_TTL:
+        print "Cached calibration is %d hours old; recalibrating." % (
+            calibration.age / 3600)
+        return None
+    drift = measure_drift(calibration, audio_interface_name, session)
+    if not numpy.isfinite(drift):
+        print "Can't compare the noise floor with the cached one; " \
+            "recalibrating."
+        return None
+    if drift > MAX_DRIFT_DB:
+        print "Noise floor has drifted %2.2f dB; recalibrating." % drift
+        return None
+    print "Using cached calibration from %d minutes ago " \
+        "(noise floor within %2.2f dB)." % (calibration.age / 60, drift)
+    return calibration
+
+
+def calibrate(
+    midiout,
+    midi_channel,
+    audio_interface_name,
+    session,
+    sample_rate,
+    program_number=None,
+    recalibrate=False,
+    noise_model=None,
+    midi_port=None,
+    cc_before=None,
+    cc_after=None,
+):
+    """
+    Measure the noise floor and check for clipping, or reuse a cached
+    calibration if it still holds. Only calibrations of a known program
+    are cached, keyed by ``midi_port`` and the controller changes sent
+    around the program change, too. If ``noise_model`` is given, as when
+    several programs are sampled through one interface, only the clipping
+    check is run.
+    """
+    if program_number is not None:
+        cache = Cache(CALIBRATION_CACHE_NAME)
+        key = calibration_key(
+            audio_interface_name, sample_rate, midi_port, midi_channel,
+            program_number, cc_before, cc_after)
+        if not recalibrate:
+            calibration = cached_calibration(
+                cache, key, audio_interface_name, session)
+            if calibration is not None:
+                return calibration
+    else:
+        cache = key = None
+
+    if noise_model is None:
+        noise_model = noise_model_from_noise_floor(
+            audio_interface_name,
+            session=session,
+        )
+    max_volume = check_for_clipping(
+        midiout,
+        midi_channel,
+        noise_model.threshold,
+        audio_interface_name,
+        session=session,
+    )
+    calibration = Calibration(noise_model, max_volume)
+    if cache is not None:
+        cache.set(key, calibration.to_json())
+    return calibration
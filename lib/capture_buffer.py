@@ -0,0 +1,88 @@
+import numpy
+
+# How much room to leave for the release tail after the time limit is hit.
+DEFAULT_TAIL_SECONDS = 5.0
+DEFAULT_CAPACITY_SECONDS = 10.0
+
+
+class CaptureBuffer(object):
+    """
+    A preallocated, growable buffer of multichannel audio.
+
+    Chunks are copied in place into one contiguous (channels, frames) array,
+    so capturing a note costs one copy per chunk rather than the repeated
+    concatenation of everything captured so far. The captured audio is
+    handed back as a view into that array.
+    """
+
+    def __init__(self, num_channels, dtype, capacity, chunk_size=1024):
+        self.num_channels = num_channels
+        self.chunk_size = chunk_size
+        self.length = 0
+        self._array = numpy.empty(
+            (num_channels, max(int(capacity), chunk_size)),
+            dtype=dtype
+        )
+
+    @classmethod
+    def for_limit(
+        cls,
+        limit,
+        sample_rate,
+        num_channels,
+        dtype,
+        chunk_size=1024,
+        tail_seconds=DEFAULT_TAIL_SECONDS,
+    ):
+        """
+        Size a buffer for a capture of up to ``limit`` seconds, plus
+        some room for the release tail that follows.
+        """
+        if limit is None:
+            seconds = DEFAULT_CAPACITY_SECONDS
+        else:
+            seconds = float(limit) + tail_seconds
+        return cls(
+            num_channels,
+            dtype,
+            int(seconds * sample_rate),
+            chunk_size,
+        )
+
+    @property
+    def capacity(self):
+        return self._array.shape[1]
+
+    @property
+    def num_chunks(self):
+        return (self.length + self.chunk_size - 1) // self.chunk_size
+
+    @property
+    def data(self):
+        """A view of everything captured so far. No copy is made."""
+        return self._array[:, :self.length]
+
+    def chunk(self, index):
+        """A view of the ``index``th chunk (negative indices allowed)."""
+        if index < 0:
+            index += self.num_chunks
+        if not 0 <= index < self.num_chunks:
+            raise IndexError("Chunk index %d out of range." % index)
+        start = index * self.chunk_size
+        return self._array[:, start:min(start + self.chunk_size, self.length)]
+
+    def append(self, chunk):
+        frames = chunk.shape[1]
+        if self.length + frames > self.capacity:
+            self._grow(self.length + frames)
+        self._array[:, self.length:self.length + frames] = chunk
+        self.length += frames
+
+    def _grow(self, minimum_capacity):
+        capacity = max(minimum_capacity, self.capacity * 2)
+        array = numpy.empty(
+            (self.num_channels, capacity),
+            dtype=self._array.dtype
+        )
+        array[:, :self.length] = self._array[:, :self.length]
+        self._array = array
@@ -5,16 +5,22 @@ import numpy
 import itertools
 import traceback
 from tqdm import tqdm
-from tabulate import tabulate
 
 from utils import normalized, trim_mono_data
 from audio_helpers import fundamental_frequency
 from wavio import read_wave_file
-
-import matplotlib.pyplot as plt
+from noise_model import windowed_rms
 
 sampling_rate = 44100.0
 assume_stereo_frequency_match = True
+SPECTRUM_SIZE = 32768
+# Envelopes are compared in windows of this many frames, so that free
+# running oscillators with different phases still compare as equal.
+ENVELOPE_WINDOW = 480
+# Brightness is averaged over windows of this many frames, from the
+# peak on, ignoring windows more than SUSTAIN_RANGE dB below the loudest.
+CENTROID_WINDOW = 4096
+SUSTAIN_RANGE = 20.0
 
 
 def aligned_sublists(*lists):
@@ -38,6 +44,86 @@ def normalized_difference(lista, listb):
     ) / compare
 
 
+def spectral_distance(lista, listb, size=SPECTRUM_SIZE):
+    """
+    How different the timbres of two aligned signals are, regardless of
+    their gain: the distance between the unit-normalized magnitude
+    spectra of their first ``size`` samples, from 0 (identical) to
+    sqrt(2) (nothing in common).
+    """
+    spectra = []
+    for list in (lista, listb):
+        spectrum = numpy.absolute(numpy.fft.rfft(
+            numpy.asarray(list[:size], dtype=numpy.float64), size))
+        norm = numpy.linalg.norm(spectrum)
+        spectra.append(spectrum / norm if norm else spectrum)
+    return numpy.linalg.norm(spectra[0] - spectra[1])
+
+
+def spectral_centroid(list, sample_rate, size=SPECTRUM_SIZE):
+    """The "center of mass" of a signal's spectrum, in Hz."""
+    spectrum = numpy.absolute(numpy.fft.rfft(
+        numpy.asarray(list[:size], dtype=numpy.float64), size))
+    total = numpy.sum(spectrum)
+    if not total:
+        return 0.0
+    frequencies = numpy.fft.rfftfreq(size, 1.0 / sample_rate)
+    return numpy.sum(frequencies * spectrum) / total
+
+
+def sustained_spectral_centroid(list, sample_rate, window=CENTROID_WINDOW):
+    """
+    The power-weighted spectral centroid of a note's sustain, in Hz: the
+    mean over Hann-windowed ``window``-frame windows from its peak on,
+    leaving out the quiet ones. A single long, unwindowed spectrum would
+    smear each harmonic across the whole spectrum, by an amount that
+    depends on how it falls between bins, and so from note to note; and
+    weighting by magnitude rather than power lets the noise floor pull
+    quieter notes brighter.
+    """
+    list = numpy.asarray(list, dtype=numpy.float64)
+    list = list[numpy.argmax(numpy.absolute(list)):]
+    num_windows = len(list) // window
+    if num_windows == 0:
+        return spectral_centroid(list, sample_rate)
+    windows = list[:num_windows * window].reshape((num_windows, window))
+    loudness = numpy.sqrt(numpy.mean(windows ** 2, 1))
+    windows = windows[
+        loudness >= numpy.amax(loudness) * 10 ** (-SUSTAIN_RANGE / 20)]
+    power = numpy.absolute(
+        numpy.fft.rfft(windows * numpy.hanning(window))) ** 2
+    totals = numpy.sum(power, 1)
+    if not totals.all():
+        return 0.0
+    frequencies = numpy.fft.rfftfreq(window, 1.0 / sample_rate)
+    return numpy.mean(numpy.sum(frequencies * power, 1) / totals)
+
+
+def envelope_difference(lista, listb, window=ENVELOPE_WINDOW):
+    """normalized_difference between the RMS envelopes of two signals."""
+    return normalized_difference(*[
+        windowed_rms(numpy.asarray(list)[None, :], window)[0]
+        for list in (lista, listb)
+    ])
+
+
+def timbre_distance(lista, listb, frequency_a, frequency_b, sample_rate):
+    """
+    How different two notes of (possibly) different pitches sound: how
+    many octaves apart their brightnesses are, with the spectral centroids
+    of their sustains measured in harmonics of each note's fundamental,
+    plus how different their envelopes are.
+    """
+    brightness = [
+        sustained_spectral_centroid(list, sample_rate) / frequency
+        for list, frequency in ((lista, frequency_a), (listb, frequency_b))
+    ]
+    if not all(brightness):
+        return numpy.inf
+    return abs(numpy.log2(brightness[0] / brightness[1])) + \
+        envelope_difference(*aligned_sublists(lista, listb))
+
+
 def freq_diff(lista, listb, only_compare_first=100000):
     return fundamental_frequency(lista[:only_compare_first]) /\
         fundamental_frequency(listb[:only_compare_first])
@@ -90,6 +176,8 @@ def generate_pairs(infiles):
 
 
 def process_all(aifs):
+    from tabulate import tabulate
+
     results = []
     try:
         for result in generate_pairs(aifs):
@@ -124,6 +212,8 @@ def process_all(aifs):
 
 
 def graph_ffts():
+    import matplotlib.pyplot as plt
+
     files = ['A1_v111_15.00s.aif', 'A2_v31_15.00s.aif']
     for file in files:
         stereo = read_wave_file(os.path.join(root_dir, file))
@@ -147,6 +237,8 @@ def graph_ffts():
 
 
 def freq_shift():
+    import matplotlib.pyplot as plt
+
     files = ['A1_v111_15.00s.aif', 'A1_v95_15.00s.aif']
     wavea, waveb = [
         read_wave_file(os.path.join(root_dir, file)) for file in files
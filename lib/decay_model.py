@@ -0,0 +1,122 @@
+import numpy
+from collections import deque
+
+from utils import percent_to_db
+
+# How much of the most recent envelope is fitted, in seconds.
+FIT_WINDOW = 1.0
+# Only envelope points this far above the floor are fitted, so the flat
+# noise floor at the end of a tail doesn't bend the line.
+FIT_MARGIN_DB = 6.0
+# How many envelope points are needed before a fit is trusted, and how
+# straight (in dB) they have to be.
+MIN_FIT_POINTS = 8
+MIN_R_SQUARED = 0.9
+# How many envelope points a prior from neighbouring notes is worth.
+PRIOR_WEIGHT = 8.0
+# How far away (in keys) a neighbour can be and still act as a prior.
+NEIGHBOUR_KEYS = 3
+VELOCITY_SCALE = 16.0
+
+
+def envelope_db(chunk, full_scale):
+    """The level of the loudest channel of a (channels, frames) chunk."""
+    chunk = numpy.asarray(chunk, dtype=numpy.float64)
+    rms = numpy.sqrt(numpy.mean(chunk ** 2, 1))
+    return percent_to_db(numpy.amax(rms) / full_scale)
+
+
+class DecayEstimator(object):
+    """
+    Fits an exponential decay (a straight line, in dB) to the envelope of
+    a capture as it arrives, and predicts when it will reach the noise
+    floor at ``floor_db``. ``prior`` is an expected decay rate in dB per
+    second, usually from neighbouring notes; it's blended into the fit
+    and lets a fit be trusted with half as many points.
+    """
+
+    def __init__(self, floor_db, chunk_seconds, prior=None):
+        self.floor_db = floor_db
+        self.points = max(int(FIT_WINDOW / chunk_seconds), MIN_FIT_POINTS)
+        self.restart(prior)
+
+    def restart(self, prior=None):
+        """Start fitting afresh, as after a note off."""
+        self.prior = prior
+        self.times = deque(maxlen=self.points)
+        self.levels = deque(maxlen=self.points)
+        self.slope = None
+        self.intercept = None
+
+    def update(self, time, level_db):
+        if level_db < self.floor_db + FIT_MARGIN_DB:
+            return
+        self.times.append(time)
+        self.levels.append(level_db)
+        self.fit()
+
+    def fit(self):
+        n = len(self.levels)
+        needed = MIN_FIT_POINTS if self.prior is None else MIN_FIT_POINTS / 2
+        self.slope = self.intercept = None
+        if n < needed:
+            return
+        t = numpy.array(self.times)
+        y = numpy.array(self.levels)
+        t_mean = t.mean()
+        y_mean = y.mean()
+        spread = numpy.sum((t - t_mean) ** 2)
+        if not spread:
+            return
+        slope = numpy.sum((t - t_mean) * (y - y_mean)) / spread
+        total = numpy.sum((y - y_mean) ** 2)
+        residual = numpy.sum((y - (y_mean + slope * (t - t_mean))) ** 2)
+        if not total or 1 - residual / total < MIN_R_SQUARED:
+            return
+        if self.prior is not None:
+            slope = (n * slope + PRIOR_WEIGHT * self.prior) / (
+                n + PRIOR_WEIGHT)
+        self.slope = slope
+        self.intercept = y_mean - slope * t_mean
+
+    @property
+    def rate(self):
+        """The fitted decay rate in dB per second, if the fit is trusted."""
+        if self.slope is None or self.slope >= 0:
+            return None
+        return self.slope
+
+    def floor_time(self):
+        """When the envelope is predicted to reach the floor, or None."""
+        if self.rate is None:
+            return None
+        return (self.floor_db - self.intercept) / self.slope
+
+
+class DecayPriors(object):
+    """
+    The release decay rates of notes captured so far, so that each new
+    note can start from what its neighbours did.
+    """
+
+    def __init__(self):
+        self.rates = {}
+
+    def add(self, note, velocity, rate):
+        if rate is not None:
+            self.rates[(note, velocity)] = rate
+
+    def prior_for(self, note, velocity):
+        """A weighted average of nearby notes' rates, or None."""
+        total = weights = 0.0
+        for (other_note, other_velocity), rate in self.rates.iteritems():
+            distance = abs(other_note - note)
+            if distance > NEIGHBOUR_KEYS:
+                continue
+            weight = 1.0 / (
+                1 + distance + abs(other_velocity - velocity) / VELOCITY_SCALE)
+            total += weight * rate
+            weights += weight
+        if not weights:
+            return None
+        return total / weights
@@ -0,0 +1,163 @@
+import os
+import json
+import argparse
+from sfzparser import SFZFile, Region
+
+JOURNAL_FILENAME = 'journal.jsonl'
+SFZ_FILENAME = 'file.sfz'
+# Stored alongside each region, but not part of it: how long its capture
+# took, for estimating how long later sessions will take.
+SECONDS_KEY = '_capture_seconds'
+
+
+def plain_value(value):
+    """For json.dumps: turn numpy scalars (like loop points) into numbers."""
+    return value.item()
+
+
+def region_key(region):
+    """The (key center, high velocity) that identifies a sampled region."""
+    attributes = region.attributes
+    return (
+        int(attributes.get('key', attributes.get('pitch_keycenter'))),
+        int(attributes['hivel']),
+    )
+
+
+def read_journal(path):
+    """
+    Return the (region, capture seconds) of each complete line of a
+    journal, and the length in bytes of those lines.
+    """
+    entries = []
+    good_length = 0
+    with open(path, 'rb') as f:
+        for line in f:
+            try:
+                attributes = json.loads(line)
+            except ValueError:
+                break
+            if not line.endswith('\n'):
+                break
+            good_length += len(line)
+            seconds = attributes.pop(SECONDS_KEY, None)
+            entries.append((Region(attributes), seconds))
+    return entries, good_length
+
+
+class SessionJournal(object):
+    """
+    An append-only record of the regions sampled into one folder, with
+    an index by (key center, high velocity) for resuming.
+
+    Each region is one line of JSON, flushed and fsync'd as soon as it's
+    added, so a crash loses at most the line being written; a torn last
+    line is dropped when the journal is reopened. The SFZ file is only
+    written by materialize(), rather than after every region.
+    """
+
+    def __init__(self, path, root=None):
+        self.path = path
+        self.root = root if root is not None else os.path.dirname(path)
+        self.index = {}
+        self.keys = []
+        self.seconds = {}
+        self.load()
+        self.file = open(self.path, 'a')
+
+    @classmethod
+    def for_folder(cls, output_folder):
+        """
+        Open the journal in ``output_folder``, starting it from that
+        folder's file.sfz if it was sampled before journals existed.
+        """
+        path = os.path.join(output_folder, JOURNAL_FILENAME)
+        is_new = not os.path.exists(path)
+        journal = cls(path, output_folder)
+        if is_new:
+            journal.import_sfz(os.path.join(output_folder, SFZ_FILENAME))
+        return journal
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return len(self.keys)
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        entries, good_length = read_journal(self.path)
+        for region, seconds in entries:
+            self.remember(region, seconds)
+        if good_length < os.path.getsize(self.path):
+            print "Dropping an incomplete entry from the end of %s." % (
+                self.path)
+            with open(self.path, 'r+b') as f:
+                f.truncate(good_length)
+
+    def import_sfz(self, sfzfile):
+        try:
+            with open(sfzfile) as f:
+                groups = SFZFile(f.read()).groups
+        except IOError:
+            return
+        for group in groups:
+            for region in group.regions:
+                if region.attributes:
+                    self.add(region)
+
+    def remember(self, region, seconds=None):
+        if not region.exists(self.root):
+            return
+        key = region_key(region)
+        if key not in self.index:
+            self.keys.append(key)
+        self.index[key] = region
+        if seconds is not None:
+            self.seconds[key] = seconds
+
+    def add(self, region, seconds=None):
+        """Record a region, and optionally how long its capture took."""
+        line = dict(region.attributes)
+        if seconds is not None:
+            line[SECONDS_KEY] = seconds
+        self.file.write(json.dumps(line, default=plain_value) + '\n')
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.remember(region, seconds)
+
+    def get(self, keycenter, hivel):
+        return self.index.get((keycenter, hivel))
+
+    @property
+    def regions(self):
+        return [self.index[key] for key in self.keys]
+
+    def materialize(self, sfzfile=None):
+        """Write every region to an SFZ file, by default file.sfz."""
+        sfzfile = sfzfile or os.path.join(self.root, SFZ_FILENAME)
+        temporary = sfzfile + '.tmp'
+        with open(temporary, 'w') as f:
+            f.write("\n".join([str(r) for r in self.regions]))
+        os.rename(temporary, sfzfile)
+
+    def close(self):
+        self.file.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='write file.sfz from the journals of sampled folders'
+    )
+    parser.add_argument(
+        'folders', type=str, help='folders to process', nargs='+')
+    args = parser.parse_args()
+
+    for folder in args.folders:
+        with SessionJournal.for_folder(folder) as journal:
+            journal.materialize()
+            print "%s: %d regions" % (folder, len(journal))
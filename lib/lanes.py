@@ -0,0 +1,365 @@
+"""Sample several instruments at once from one multichannel input.
+
+A "lane" is one instrument: the MIDI port and channel its notes are sent
+on, and the pair of audio inputs it is recorded from. All lanes play the
+same note at the same time, are captured by one multichannel stream, and
+are split back apart into per-lane samples, so sampling N identical
+modules (or N programs of a multitimbral one) takes as long as one.
+"""
+
+import os
+import numpy
+from tqdm import tqdm
+from record import AudioSession, save_to_file
+from backends import HardwareBackend
+from onsets import OnsetTracker
+from noise_model import NoiseModel
+from journal import SessionJournal
+from pitch import compute_zones, Zone
+from utils import note_name, percent_to_db, warn_on_clipping
+from constants import SAMPLE_RATE, SAMPLE_FORMAT, \
+    CLIPPING_CHECK_NOTE, \
+    CLIPPING_THRESHOLD, \
+    EXIT_ON_CLIPPING
+from volume_leveler import level_volume
+from flacize import flacize_after_sampling
+from loop import find_loop_points, DEFAULT_LOOP_STRATEGY
+from midi_helpers import Midi, all_notes_off, \
+    set_program_number, \
+    CHANNEL_OFFSET
+from planner import plan_session
+from send_notes import VELOCITIES, \
+    filename_for, \
+    generate_region
+
+
+# The command-line options (and their argparse dests) that sample_lanes
+# doesn't support, so they're rejected along with --lane rather than
+# silently ignored.
+LANE_UNSUPPORTED_OPTIONS = [
+    ('--programs', 'programs'),
+    ('--program-cc', 'program_ccs'),
+    ('--max-attempts', 'max_attempts'),
+    ('--adaptive-zones', 'adaptive_zones'),
+    ('--probe-velocities', 'probe_velocities'),
+    ('--probe-range', 'probe_range'),
+    ('--reprobe-range', 'reprobe_range'),
+    ('--has-portamento', 'has_portamento'),
+    ('--loop-sustain', 'loop_sustain'),
+    ('--stream-to-disk', 'stream_to_disk'),
+    ('--midi-channel', 'midi_channel'),
+    ('--recalibrate', 'recalibrate'),
+    ('--dry-run', 'dry_run'),
+    ('--workers', 'workers'),
+]
+
+
+class Lane(object):
+    def __init__(self, midi_channel, input_channels, midi_port_name=None):
+        """
+        ``input_channels`` are zero-based indices into the audio
+        interface's inputs.
+        """
+        self.midi_channel = midi_channel
+        self.input_channels = tuple(input_channels)
+        self.midi_port_name = midi_port_name
+        self.midiout = None
+        self.output_folder = None
+        self.threshold = None
+        self.journal = None
+        self.note_regions = []
+        self.groups = []
+
+    def __repr__(self):
+        return '<Lane midi_channel={} inputs={} port={}>'.format(
+            self.midi_channel,
+            ','.join(str(c + 1) for c in self.input_channels),
+            self.midi_port_name)
+
+    def play(self, note, velocity):
+        self.midiout.send_message([
+            CHANNEL_OFFSET + self.midi_channel, note, velocity
+        ])
+
+
+def parse_lane(value):
+    """
+    Type for argparse. Expects MIDI_CHANNEL:LEFT,RIGHT[:MIDI_PORT_NAME],
+    with input numbers starting at 1.
+    """
+    parts = value.split(':', 2)
+    inputs = [int(x) - 1 for x in parts[1].split(',')]
+    if any(x < 0 for x in inputs):
+        raise ValueError("Input numbers start at 1.")
+    return Lane(
+        int(parts[0]),
+        inputs,
+        parts[2] if len(parts) > 2 else None,
+    )
+
+
+def open_lane_ports(lanes, midi_port_name, midi_port_index, backend):
+    """Open each distinct MIDI port once, and share it between lanes."""
+    ports = {}
+    for lane in lanes:
+        port_name = lane.midi_port_name or midi_port_name
+        if port_name not in ports:
+            ports[port_name] = backend.open_midi_output(
+                port_name, midi_port_index)
+        lane.midiout = ports[port_name]
+
+
+def channel_thresholds(lanes, num_channels):
+    """One silence threshold per input; unused inputs never count."""
+    thresholds = numpy.empty(num_channels)
+    thresholds.fill(numpy.inf)
+    for lane in lanes:
+        thresholds[list(lane.input_channels)] = lane.threshold
+    return thresholds
+
+
+def lane_thresholds_from_noise_floor(session, lanes):
+    print "Sampling noise floor on %d lanes..." % len(lanes)
+    recording = session.capture_note(
+        limit=2.0,
+        threshold=0.1,
+        print_progress=False,
+        allow_empty_return=True,
+    )
+    full_scale = recording.sample_format.full_scale
+    for lane in lanes:
+        noise_floor = numpy.amax(numpy.absolute(
+            recording.data[list(lane.input_channels)]
+        )) / full_scale
+        lane.threshold = noise_floor * 1.1
+        print "%s: noise floor %8.8f dBFS" % (
+            lane, percent_to_db(noise_floor))
+    session.noise_model = NoiseModel.from_capture(
+        recording.data,
+        full_scale,
+        channels=[c for lane in lanes for c in lane.input_channels],
+    )
+
+
+def capture_lanes(
+    session,
+    lanes,
+    note,
+    velocity,
+    limit,
+    print_progress=False,
+):
+    """
+    Play ``note`` on every lane at once and capture them all together.
+    Returns the recording and one OnsetTracker per lane.
+    """
+    for lane in lanes:
+        all_notes_off(lane.midiout, lane.midi_channel)
+
+    def after_start():
+        for lane in lanes:
+            lane.play(note, velocity)
+
+    def on_time_up():
+        for lane in lanes:
+            lane.play(note, 0)
+        return True  # Get the release after keyup
+
+    full_scale = session.sample_format.full_scale
+    trackers = [
+        OnsetTracker(lane.threshold * 10, lane.threshold, full_scale)
+        for lane in lanes
+    ]
+    recording = session.capture_note(
+        limit=limit,
+        after_start=after_start,
+        on_time_up=on_time_up,
+        threshold=channel_thresholds(lanes, session.num_channels),
+        print_progress=print_progress,
+        group_trackers=zip([lane.input_channels for lane in lanes], trackers),
+    )
+    return recording, trackers
+
+
+def check_lanes_for_clipping(session, lanes):
+    print "Checking for clipping on note %s..." % (
+        note_name(CLIPPING_CHECK_NOTE))
+    recording, _ = capture_lanes(session, lanes, CLIPPING_CHECK_NOTE, 127, 2.0)
+    if recording.data is None:
+        raise Exception(
+            "Can't check for clipping because all we recorded was silence.")
+    for lane in lanes:
+        all_notes_off(lane.midiout, lane.midi_channel)
+        max_volume = numpy.amax(numpy.absolute(
+            recording.data[list(lane.input_channels)]
+        )) / recording.sample_format.full_scale
+        print "%s: maximum volume is around %8.8f dBFS" % (
+            lane, percent_to_db(max_volume))
+        if max_volume >= CLIPPING_THRESHOLD and EXIT_ON_CLIPPING:
+            raise ValueError("Clipping detected at max volume on %s!" % lane)
+
+
+def sample_lane_note(
+    session,
+    lanes,
+    zone,
+    velocity,
+    velocity_levels,
+    limit,
+    looping_enabled=False,
+    loop_strategy=DEFAULT_LOOP_STRATEGY,
+    print_progress=False,
+):
+    """
+    Capture one note on every lane, and split the capture into a sample
+    and a journaled region per lane.
+    """
+    if print_progress:
+        print("Sampling %s at velocity %s on %d lanes..." % (
+            note_name(zone.center), velocity, len(lanes)))
+
+    sample_rate = session.sample_rate
+    recording, trackers = capture_lanes(
+        session, lanes, zone.center, velocity, limit, print_progress)
+
+    for i, (lane, tracker) in enumerate(zip(lanes, trackers)):
+        if recording.data is None or not tracker.found_onset:
+            continue
+        data = recording.trimmed_group(lane.input_channels, i)
+        warn_on_clipping(
+            data, full_scale=recording.sample_format.full_scale)
+        if looping_enabled:
+            loop = find_loop_points(
+                data,
+                sample_rate,
+                end=recording.group_sustain_length(i),
+                strategy=loop_strategy,
+            )
+        else:
+            loop = None
+        save_to_file(
+            os.path.join(
+                lane.output_folder,
+                filename_for(zone.center, velocity)),
+            recording.sample_format,
+            data,
+            sample_rate,
+        )
+        region = generate_region(zone, velocity, velocity_levels, loop)
+        lane.journal.add(region)
+        lane.note_regions.append(region)
+
+
+def sample_lanes(
+    lanes,
+    output_folder='foo',
+    low_key=21,
+    high_key=109,
+    midi_port_name=None,
+    midi_port_index=None,
+    audio_interface_name=None,
+    audio_interface_index=None,
+    cc_before=None,
+    program_number=None,
+    cc_after=None,
+    flac=True,
+    velocity_levels=VELOCITIES,
+    key_range=1,
+    cleanup_aif_files=True,
+    limit=None,
+    looping_enabled=False,
+    loop_strategy=DEFAULT_LOOP_STRATEGY,
+    print_progress=False,
+    sample_asc=False,
+    sample_rate=SAMPLE_RATE,
+    sample_format=SAMPLE_FORMAT,
+    backend=None,
+):
+    """
+    Like send_notes.sample_program, but for several lanes at once. Each
+    lane's samples and SFZ files go into ``output_folder``/laneN. A note
+    that every lane's journal already has is not sampled again.
+    """
+    backend = backend or HardwareBackend()
+    open_lane_ports(lanes, midi_port_name, midi_port_index, backend)
+
+    if not audio_interface_name:
+        audio_interface_name = backend.input_device_name(
+            audio_interface_index)
+
+    for i, lane in enumerate(lanes):
+        lane.output_folder = os.path.join(output_folder, 'lane%d' % (i + 1))
+        if not os.path.isdir(lane.output_folder):
+            os.makedirs(lane.output_folder)
+        lane.journal = SessionJournal.for_folder(lane.output_folder)
+        print "Sampling %s into path %s" % (lane, lane.output_folder)
+
+        midi = Midi(lane.midiout, channel=lane.midi_channel)
+        for cc in cc_before or []:
+            midi.cc(cc[0], cc[1])
+        set_program_number(lane.midiout, lane.midi_channel, program_number)
+        for cc in cc_after or []:
+            midi.cc(cc[0], cc[1])
+
+    session = AudioSession(
+        audio_interface_name,
+        sample_rate,
+        sample_format,
+        num_channels=max(
+            channel for lane in lanes for channel in lane.input_channels
+        ) + 1,
+        backend=backend,
+    ).open()
+
+    lane_thresholds_from_noise_floor(session, lanes)
+    check_lanes_for_clipping(session, lanes)
+
+    velocity_levels = sorted({int(v) for v in velocity_levels})
+    zones_to_sample = compute_zones(
+        Zone(low=low_key, high=high_key), step=key_range)
+
+    def sampled(zone, velocity):
+        return all(
+            lane.journal.get(zone.center, velocity) is not None
+            for lane in lanes
+        )
+
+    for note in tqdm(plan_session(
+        zones_to_sample,
+        velocity_levels,
+        sample_asc,
+        sampled,
+    )):
+        zone, velocity = note.zone, note.velocity
+        if note.sampled:
+            for lane in lanes:
+                lane.note_regions.append(
+                    lane.journal.get(zone.center, velocity))
+        else:
+            sample_lane_note(
+                session, lanes, zone, velocity, velocity_levels, limit,
+                looping_enabled, loop_strategy, print_progress)
+
+        if note.done_note:
+            for lane in lanes:
+                if lane.note_regions:
+                    lane.groups.append(
+                        level_volume(lane.note_regions, lane.output_folder))
+                    lane.note_regions = []
+
+    session.close()
+    print(session.timing_report())
+
+    for lane in lanes:
+        sfzfile = os.path.join(lane.output_folder, 'file.sfz')
+        lane.journal.materialize(sfzfile)
+        lane.journal.close()
+        with open(sfzfile + '.leveled.sfz', 'w') as file:
+            file.write("\n".join([str(group) for group in lane.groups]))
+        if flac:
+            flacize_after_sampling(
+                lane.output_folder,
+                lane.groups,
+                sfzfile,
+                cleanup_aif_files=cleanup_aif_files,
+            )
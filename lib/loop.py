@@ -1,66 +1,43 @@
 import sys
+import time
 import numpy
-from tqdm import tqdm
-from truncate import read_wave_file
-from audio_helpers import fundamental_frequency
+from collections import namedtuple
+from wavio import read_sample_file
 
 QUANTIZE_FACTOR = 8
-
-
-def compare_windows(window_a, window_b):
-    return numpy.sqrt(numpy.mean(numpy.power(window_a - window_b, 2)))
-
-
-def slide_window(file, period, start_at=0, end_before=0):
-    for power in reversed(xrange(7, 10)):
-        multiple = 2 ** power
-        window_size = int(period * multiple)
-        # Uncomment this to search from the start_at value to the end_before
-        # rather than just through one window's length
-        # end_range = len(file) - (window_size * 2) - end_before
-        end_range = start_at + window_size
-        for i in xrange(start_at, end_range):
-            yield power, i, window_size
-
-
-def window_match(file):
-    period = (1.0 / fundamental_frequency(file, 1)) * 2
-    print period, 'period in samples'
-
-    winner = None
-
-    window_positions = list(
-        slide_window(file, period, len(file) / 2, len(file) / 8)
-    )
-    for power, i, window_size in tqdm(window_positions):
-        window_start = find_similar_sample_index(file, i, i + window_size)
-        window_end = find_similar_sample_index(file, i, i + (window_size * 2))
-        effective_size = window_end - window_start
-
-        difference = compare_windows(
-            file[i:i + effective_size],
-            file[window_start:window_end]
-        ) / effective_size
-        if winner is None or difference < winner[0]:
-            winner = (
-                difference,
-                effective_size,
-                i,
-                abs(file[i] - file[window_start])
-            )
-            print 'new winner', winner
-
-    lowest_difference, winning_window_size, winning_index, gap = winner
-
-    print "Best loop match:", lowest_difference
-    print "window size", winning_window_size
-    print "winning index", winning_index
-    print "winning gap", gap
-    return winning_index, winning_window_size
+# The part of a sample that's searched for loops, as fractions of the
+# part before its note off (or of the whole sample, if that's unknown).
+SUSTAIN_WINDOW = (0.0, 1.0)
+
+# For the cross-correlation strategy: how much audio after a loop's start
+# has to match the audio after its end, in seconds; the shortest loop;
+# how many loop starts are tried; and how much the audio is decimated for
+# the coarse search, before it's refined at the full sample rate.
+CORRELATION_WINDOW = 0.05
+MIN_LOOP_SECONDS = 0.2
+CORRELATION_STARTS = 4
+DECIMATION = 8
+# How many positions find_similar_sample_indices searches at once, to
+# bound the size of its (positions, 2 * search_size) arrays.
+MATCH_BATCH = 4096
+
+# How candidate loops are scored: the seconds of audio on either side of
+# a loop's boundary compared sample by sample, and compared by spectrum;
+# how far (in frames) each candidate's end is nudged to make more
+# candidates; how the metrics in LoopScores are weighted; and how many
+# candidates are scored at most per sample, in batches. Capping the count
+# rather than the time keeps the loops found independent of CPU load.
+BOUNDARY_WINDOW = 0.005
+SPECTRUM_WINDOW = 0.02
+CANDIDATE_SPREAD = 2
+SCORE_WEIGHTS = (1.0, 0.5, 0.5, 0.5)
+SCORING_BATCH = 64
+SCORING_BATCHES = 8
 
 
 def slope_at_index(file, i):
-    return (file[i + 1] - file[i - 1]) / 2
+    # In floating point, so int16 samples can't wrap around.
+    return (numpy.float64(file[i + 1]) - file[i - 1]) / 2
 
 
 def find_similar_sample_index(
@@ -69,101 +46,136 @@ def find_similar_sample_index(
     search_around_index,
     search_size=100  # samples
 ):
-    reference_slope = slope_at_index(file, reference_index) > 0
-    best_match = None
-    search_range = xrange(
-        search_around_index - search_size,
-        search_around_index + search_size
-    )
-    for i in search_range:
-        slope = slope_at_index(file, i) > 0
-        if slope != reference_slope:
-            continue
+    return int(find_similar_sample_indices(
+        file, [reference_index], [search_around_index], search_size)[0])
 
-        abs_diff = abs(file[i] - file[reference_index])
 
-        if best_match is not None:
-            _, best_abs_diff = best_match
-            if abs_diff < best_abs_diff:
-                best_match = (i, abs_diff)
-        else:
-            best_match = (i, abs_diff)
-    return best_match[0] if best_match is not None else search_around_index
-
-
-def zero_crossing_match(file):
-    period = (1.0 / fundamental_frequency(file, 1)) * 2
-    print period, 'period in samples'
-
-    period_multiple = 64
-    period = period * period_multiple
-
-    for i in reversed(xrange(2 * len(file) / 3, 5 * len(file) / 6)):
-        if file[i] >= 0 and file[i + 1] < 0 and \
-                file[int(i + period)] >= 0 and \
-                file[int(i + 1 + period)] < 0 and \
-                file[int(i + period * 2)] >= 0 and \
-                file[int(i + 1 + period * 2)] < 0:
-            return i, int(period)
-
-
-def fast_autocorrelate(x):
+def find_similar_sample_indices(
+    file,
+    reference_indices,
+    search_around_indices,
+    search_size=100  # samples
+):
     """
-    Compute the autocorrelation of the signal, based on the properties of the
-    power spectral density of the signal.
-
-    Note that the input's length may be reduced before the correlation is
-    performed due to a pathalogical case in numpy.fft:
+    For each pair of reference index and index to search around, find
+    the index within ``search_size`` samples of the latter whose slope
+    goes the same way as the reference's, and whose value is closest to
+    the reference's. Only indices with a sample on either side are
+    considered; where no sample's slope matches, the index searched
+    around is returned. The pairs are searched MATCH_BATCH at a time.
+    """
+    references = numpy.asarray(reference_indices, dtype=numpy.intp)
+    around = numpy.asarray(search_around_indices, dtype=numpy.intp)
+    return numpy.concatenate([
+        match_similar_samples(
+            file,
+            references[i:i + MATCH_BATCH],
+            around[i:i + MATCH_BATCH],
+            search_size,
+        )
+        for i in xrange(0, len(references), MATCH_BATCH)
+    ] or [numpy.zeros(0, numpy.intp)])
+
+
+def match_similar_samples(file, references, around, search_size):
+    file = numpy.asarray(file)
+    last = len(file) - 2
+    candidates = around[:, None] + numpy.arange(
+        -search_size, search_size, dtype=numpy.intp)
+    in_range = (candidates >= 1) & (candidates <= last)
+    candidates_read = numpy.clip(candidates, 1, last)
+    references = numpy.clip(references, 1, last)
+
+    reference_slopes = slope_at_index(file, references) > 0
+    matching = in_range & (
+        (slope_at_index(file, candidates_read) > 0) ==
+        reference_slopes[:, None])
+    differences = numpy.absolute(
+        file[candidates_read].astype(numpy.float64) -
+        file[references][:, None])
+    differences[~matching] = numpy.inf
+
+    best = numpy.argmin(differences, 1)
+    rows = numpy.arange(len(candidates))
+    return numpy.where(
+        matching[rows, best], candidates[rows, best], around)
+
+
+def smooth_length(n):
+    """
+    The smallest length of at least ``n`` with no prime factors above 5.
+    numpy.fft is O(n log n) for lengths like these, but can be as slow
+    as a naive O(n^2) DFT for lengths with large prime factors:
     http://stackoverflow.com/a/23531074/679081
-
-    > The FFT algorithm used in np.fft performs very well (meaning O(n log n))
-    > when the input length has many small prime factors, and very bad
-    > (meaning a naive DFT requiring O(n^2)) when the input size is a prime
-    > number.
+    """
+    n = max(int(n), 1)
+    best = 1
+    while best < n:
+        best *= 2
+    power_of_5 = 1
+    while power_of_5 < best:
+        power_of_3_and_5 = power_of_5
+        while power_of_3_and_5 < best:
+            length = power_of_3_and_5
+            while length < n:
+                length *= 2
+            best = min(best, length)
+            power_of_3_and_5 *= 3
+        power_of_5 *= 5
+    return best
+
+
+class Autocorrelation(object):
+    """
+    The normalized autocorrelation of the ``start``:``end`` window of a
+    signal, at lags of up to half the window.
+
+    The window is zero-padded to a smooth length at least twice as long,
+    so the correlation doesn't wrap around, and transformed with real
+    FFTs. Its spectrum is kept, so it's only computed once per sample
+    however many loop candidates are searched in it. (numpy.fft always
+    computes in double precision; the spectrum and result are stored as
+    single precision to halve their size.)
     """
 
-    # This is one simple way to ensure that the input array
-    # has a length with many small prime factors, although it
-    # doesn't guarantee that (also hopefully we don't chop too much)
-    optimal_input_length = int(numpy.sqrt(len(x))) ** 2
-    x = x[:optimal_input_length]
-    xp = x - numpy.mean(x)
-    f = numpy.fft.fft(xp)
-    p = numpy.absolute(numpy.power(f, 2))
-    pi = numpy.fft.ifft(p)
-    result = numpy.real(pi)[:x.size / 2] / numpy.sum(numpy.power(xp, 2))
-    return result
+    def __init__(self, x, start=0, end=None):
+        x = numpy.asarray(x[start:end], dtype=numpy.float64)
+        x = x - numpy.mean(x)
+        self.offset = start
+        self.length = len(x)
+        self.fft_size = smooth_length(2 * len(x) - 1)
+        self.energy = numpy.sum(numpy.power(x, 2))
+        self.spectrum = numpy.fft.rfft(x, self.fft_size).astype(
+            numpy.complex64)
+        self._values = None
+
+    @property
+    def values(self):
+        if self._values is None:
+            power = numpy.power(numpy.absolute(self.spectrum), 2)
+            values = numpy.fft.irfft(power, self.fft_size)[
+                :self.length / 2]
+            if self.energy:
+                values /= self.energy
+            self._values = values.astype(numpy.float32)
+        return self._values
 
 
 def find_argmax_after(file, offset):
     return numpy.argmax(file[offset:]) + offset
 
 
-def autocorrelated_loop(file, search_start, min_loop_width_in_seconds=0.2):
-    # Strategy:
-    #  1) run an autocorrelation on the file.
-    #  3) Find argmax of the autocorrelation
-    #  4) define some peak_width and find the next highest peak after current
-    #  5) define the loop bounds as from the first peak to the second peak
-    #  6) massage the loop bounds using find_similar_sample_index
-    #  7) ???
-    #  8) Profit!
-    autocorrelation = fast_autocorrelate(file)
-    return find_loop_from_autocorrelation(
-        file,
-        autocorrelation,
-        search_start,
-        min_loop_width_in_seconds
-    )
-
-
-def find_loop_from_autocorrelation(
-    file,
+def autocorrelation_peaks(
     autocorrelation,
     search_start,
     min_loop_width_in_seconds=0.2,
     sample_rate=48000
 ):
+    """
+    The highest autocorrelation peak after ``search_start`` / 2, and
+    the highest peak at least ``min_loop_width_in_seconds`` after it:
+    a loop's rough start and end, before they're matched up.
+    """
     search_start /= 2
     max_autocorrelation_peak_width = int(
         min_loop_width_in_seconds * sample_rate
@@ -173,25 +185,13 @@ def find_loop_from_autocorrelation(
         autocorrelation,
         loop_start + max_autocorrelation_peak_width
     )
+    return loop_start, loop_end
 
-    loop_end = find_similar_sample_index(file, loop_start, loop_end) - 1
-    return loop_start, (loop_end - loop_start)
-
-
-def minimize(iterable, callable):
-    best_result = None
-    best_score = None
-    for x in iterable:
-        if x:
-            score = callable(*x)
-            if best_score is None or score < best_score:
-                best_score = score
-                best_result = x
-    return best_result
 
-
-def autocorrelate_loops(file, sample_rate):
-    autocorrelation = fast_autocorrelate(file)
+def autocorrelate_loops(file, sample_rate, sustain_window=SUSTAIN_WINDOW):
+    offset, end = [int(f * len(file)) for f in sustain_window]
+    autocorrelation = Autocorrelation(file, offset, end).values
+    file = file[offset:end]
     search_points = [
         3 * len(file) / 4,
         2 * len(file) / 3,
@@ -199,42 +199,334 @@ def autocorrelate_loops(file, sample_rate):
         len(file) / 3,
     ]
     loop_widths = [0.2, 0.4, 0.6, 0.8, 1.0, 1.5, 2, 2.5, 3.]
+    peaks = []
     for search_point in search_points:
         for width in loop_widths:
             try:
-                yield find_loop_from_autocorrelation(
-                    file, autocorrelation,
-                    search_point, width, sample_rate)
+                peaks.append(autocorrelation_peaks(
+                    autocorrelation, search_point, width, sample_rate))
             except ValueError:
                 # We couldn't search for a loop width of that size.
                 pass
+    if peaks:
+        # Match up every candidate's end with its start in one pass.
+        loop_starts, loop_ends = zip(*peaks)
+        loop_ends = find_similar_sample_indices(
+            file, loop_starts, loop_ends) - 1
+        for loop_start, loop_end in zip(loop_starts, loop_ends):
+            yield offset + loop_start, int(loop_end - loop_start)
+    yield None
+
+
+def decimate(x, factor):
+    """Average every ``factor`` samples, dropping any left over."""
+    x = numpy.asarray(x, dtype=numpy.float64)
+    return x[:len(x) - len(x) % factor].reshape((-1, factor)).mean(1)
+
+
+def normalized_cross_correlation(template, signal):
+    """
+    The correlation coefficient (in [-1, 1]) between ``template`` and
+    every same-length window of ``signal``, computed with real FFTs and
+    running sums rather than one window at a time.
+    """
+    template = numpy.asarray(template, dtype=numpy.float64)
+    signal = numpy.asarray(signal, dtype=numpy.float64)
+    width = len(template)
+    num_windows = len(signal) - width + 1
+    template = template - numpy.mean(template)
+    template_norm = numpy.sqrt(numpy.sum(numpy.power(template, 2)))
+    if num_windows < 1 or not template_norm:
+        return numpy.zeros(max(num_windows, 0))
+
+    # The template has zero mean, so each window's own mean drops out of
+    # the correlation; it only matters for each window's energy.
+    size = smooth_length(len(signal) + width - 1)
+    correlation = numpy.fft.irfft(
+        numpy.fft.rfft(signal, size) * numpy.fft.rfft(template[::-1], size),
+        size,
+    )[width - 1:width - 1 + num_windows]
+
+    sums = numpy.concatenate(([0], numpy.cumsum(signal)))
+    squares = numpy.concatenate(([0], numpy.cumsum(numpy.power(signal, 2))))
+    energy = (squares[width:] - squares[:-width]) - \
+        numpy.power(sums[width:] - sums[:-width], 2) / width
+    norms = numpy.sqrt(numpy.maximum(energy, 0)) * template_norm
+    scores = numpy.zeros(num_windows)
+    nonzero = norms > template_norm * 1e-6
+    scores[nonzero] = correlation[nonzero] / norms[nonzero]
+    return scores
+
+
+def cross_correlation_loops(
+    file,
+    sample_rate,
+    sustain_window=SUSTAIN_WINDOW,
+):
+    """
+    Yield loops whose end is followed by the same waveform as their start.
+
+    For each of a few loop starts, the audio just after it is correlated
+    against everything later, scoring every loop length at once. This is
+    done on decimated audio first; the best length for each start is then
+    refined at the full sample rate, within a few decimated samples of
+    where the coarse search found it.
+    """
+    offset, end = [int(f * len(file)) for f in sustain_window]
+    file = file[offset:end]
+    window = int(CORRELATION_WINDOW * sample_rate)
+    min_length = int(MIN_LOOP_SECONDS * sample_rate)
+    coarse = decimate(file, DECIMATION)
+    coarse_window = window / DECIMATION
+    coarse_min_length = min_length / DECIMATION
+
+    last_start = len(coarse) - coarse_min_length - coarse_window * 2
+    if last_start <= 0:
+        yield None
+        return
+    for coarse_start in numpy.linspace(
+        0, last_start, CORRELATION_STARTS, endpoint=False
+    ).astype(int):
+        template = coarse[coarse_start:coarse_start + coarse_window]
+        scores = normalized_cross_correlation(
+            template, coarse[coarse_start + coarse_min_length:])
+        coarse_length = coarse_min_length + numpy.argmax(scores)
+
+        # Refine the length at full resolution.
+        start = coarse_start * DECIMATION
+        low = max(min_length, (coarse_length - 2) * DECIMATION)
+        high = min(
+            len(file) - start - window, (coarse_length + 2) * DECIMATION)
+        if high <= low:
+            continue
+        scores = normalized_cross_correlation(
+            file[start:start + window],
+            file[start + low:start + high + window])
+        length = low + int(numpy.argmax(scores))
+        # Nudge the end by a sample or two, to where its value and slope
+        # best match the start's.
+        length = find_similar_sample_index(
+            file, start, start + length, search_size=2) - start
+        # The loop ends on the frame before the one that matches its start.
+        yield offset + start, int(length) - 1
     yield None
 
 
-def find_loop_points(data, sample_rate):
-    channel = data[0]
+LOOP_STRATEGIES = {
+    'autocorrelation': autocorrelate_loops,
+    'cross-correlation': cross_correlation_loops,
+}
+DEFAULT_LOOP_STRATEGY = 'autocorrelation'
+
+
+class LoopScores(namedtuple('LoopScores', [
+    'waveform',
+    'slope',
+    'spectrum',
+    'stereo',
+])):
+    """
+    Per-candidate mismatches between the audio around a loop's start and
+    the audio that follows its end, each from 0 (seamless) to about 1:
+    the RMS difference of the waveforms relative to their levels, the
+    difference in slope across the seam, the distance between their
+    spectra, and how much worse the worst channel's waveform is than the
+    average.
+    """
+
+    @property
+    def total(self):
+        return sum(
+            weight * metric for weight, metric in zip(SCORE_WEIGHTS, self))
+
+
+def boundary_windows(data, positions, window):
+    """
+    The audio from ``window`` frames before to ``window`` frames after
+    each of ``positions``, as a (channels, positions, 2 * window) array.
+    Frames past either end of ``data`` repeat its first or last frame.
+    """
+    indices = numpy.clip(
+        numpy.asarray(positions)[:, None] + numpy.arange(-window, window),
+        0,
+        data.shape[1] - 1,
+    )
+    return numpy.asarray(data[:, indices], dtype=numpy.float64)
+
+
+def rms(x, axis=-1):
+    return numpy.sqrt(numpy.mean(x * x, axis))
+
+
+def score_loop_candidates(
+    data,
+    loop_starts,
+    loop_ends,
+    sample_rate,
+    window_seconds=BOUNDARY_WINDOW,
+):
+    """
+    Score every loop of a (channels, frames) sample at once. A loop plays
+    up to and including ``loop_end``, then wraps back to ``loop_start``,
+    so the audio around ``loop_start`` should match the audio around
+    ``loop_end + 1``. Returns LoopScores of arrays, one score per loop.
+    """
+    data = numpy.asarray(data)
+    loop_starts = numpy.asarray(loop_starts)
+    wraps_to = numpy.asarray(loop_ends) + 1
+    window = max(2, int(window_seconds * sample_rate))
+    at_start = boundary_windows(data, loop_starts, window)
+    at_end = boundary_windows(data, wraps_to, window)
+
+    tiny = numpy.finfo(numpy.float64).tiny
+    level = numpy.maximum(rms(at_start) + rms(at_end), tiny)
+    waveform = rms(at_start - at_end) / level
+
+    # The slope into the seam should carry on past it, at the scale of
+    # the slopes nearby.
+    slope_at_end = at_end[:, :, window - 1] - at_end[:, :, window - 2]
+    slope_at_start = at_start[:, :, window] - at_start[:, :, window - 1]
+    slope_scale = numpy.maximum(
+        rms(numpy.diff(at_start)) + rms(numpy.diff(at_end)), tiny)
+    slope = numpy.minimum(
+        numpy.absolute(slope_at_end - slope_at_start) / slope_scale, 1)
+
+    # Timbre is compared on the channels' mix, which is cheaper and
+    # close enough; the channels' waveforms are compared separately.
+    spectrum_window = max(2, int(SPECTRUM_WINDOW * sample_rate))
+    taper = numpy.hanning(spectrum_window * 2)
+    spectra = [
+        numpy.absolute(numpy.fft.rfft(numpy.mean(
+            boundary_windows(data, positions, spectrum_window), 0) * taper))
+        for positions in (loop_starts, wraps_to)
+    ]
+    spectra = [
+        spectrum / numpy.maximum(
+            numpy.linalg.norm(spectrum, axis=-1)[..., None], tiny)
+        for spectrum in spectra
+    ]
+    spectrum = numpy.linalg.norm(
+        spectra[0] - spectra[1], axis=-1) / numpy.sqrt(2)
+
+    return LoopScores(
+        numpy.mean(waveform, 0),
+        numpy.mean(slope, 0),
+        spectrum,
+        numpy.max(waveform, 0) - numpy.mean(waveform, 0),
+    )
 
-    result = minimize(
-        autocorrelate_loops(channel, sample_rate),
-        lambda start, length: abs(channel[start] - channel[start + length])
+
+def loop_candidates(candidates, frames, spread=CANDIDATE_SPREAD):
+    """
+    The (loop start, loop end) of each of ``candidates`` ((start, length)
+    pairs from one of LOOP_STRATEGIES), then each again with its end
+    nudged by up to ``spread`` frames, as two arrays. Loops must end
+    before ``frames``.
+    """
+    candidates = [candidate for candidate in candidates if candidate]
+    if not candidates:
+        return numpy.zeros(0, int), numpy.zeros(0, int)
+    loop_starts, lengths = numpy.array(candidates, dtype=int).T
+    nudges = [0] + [
+        sign * distance
+        for distance in xrange(1, spread + 1)
+        for sign in (-1, 1)
+    ]
+    loop_starts = numpy.tile(loop_starts, len(nudges))
+    loop_ends = loop_starts + numpy.repeat(nudges, len(candidates)) + \
+        numpy.tile(lengths, len(nudges))
+    valid = (loop_starts >= 0) & (loop_ends > loop_starts) & \
+        (loop_ends < frames)
+    return loop_starts[valid], loop_ends[valid]
+
+
+def best_loop(
+    data,
+    loop_starts,
+    loop_ends,
+    sample_rate,
+    max_batches=SCORING_BATCHES,
+    budget=None,
+):
+    """
+    The (loop start, loop end) with the lowest total LoopScores. The
+    candidates are scored in order, SCORING_BATCH at a time, until they
+    run out or ``max_batches`` have been scored. If a ``budget`` (in
+    seconds) is given, scoring also stops once it has passed, which is
+    faster but makes the result depend on how busy the CPU is. The first
+    batch is always scored.
+    """
+    start = time.time()
+    best = None
+    for i in xrange(0, min(len(loop_starts), SCORING_BATCH * max_batches),
+                    SCORING_BATCH):
+        batch = slice(i, i + SCORING_BATCH)
+        scores = score_loop_candidates(
+            data, loop_starts[batch], loop_ends[batch], sample_rate).total
+        j = numpy.argmin(scores)
+        if best is None or scores[j] < best[0]:
+            best = (scores[j], int(loop_starts[batch][j]),
+                    int(loop_ends[batch][j]))
+        if budget is not None and time.time() - start > budget:
+            break
+    if best is not None:
+        return best[1:]
+
+
+def find_loop_points(
+    data,
+    sample_rate,
+    end=None,
+    sustain_window=SUSTAIN_WINDOW,
+    strategy=DEFAULT_LOOP_STRATEGY,
+    budget=None,
+):
+    """
+    Find loop points in a (channels, frames) sample. If ``end`` is given,
+    the loop is kept within the first ``end`` frames, like the part of a
+    sample before its note off. Only the ``sustain_window`` fractions of
+    those frames are searched, using one of LOOP_STRATEGIES, and the
+    candidates it finds are scored against each other by
+    score_loop_candidates, within an optional time ``budget``; see
+    best_loop. Returns None if no loop is found, and raises
+    ValueError if ``sustain_window`` isn't a range within 0 to 1.
+    """
+    if not 0 <= sustain_window[0] < sustain_window[1] <= 1:
+        raise ValueError(
+            "The sustain window must go from low to high, within 0 to 1; "
+            "got %s." % (sustain_window,))
+    data = numpy.asarray(data)
+    channel = data[0][:end]
+    loop_starts, loop_ends = loop_candidates(
+        LOOP_STRATEGIES[strategy](channel, sample_rate, sustain_window),
+        len(channel),
     )
+    return best_loop(
+        data, loop_starts, loop_ends, sample_rate, budget=budget)
 
-    if result:
-        loop_start, loop_size = result
-        return loop_start, loop_start + loop_size
 
+def loop_quality(channel, loop_start, loop_end, sample_rate):
+    """
+    How seamlessly playback wraps from ``loop_end`` back to
+    ``loop_start``: 1 minus the waveform mismatch from LoopScores. 1 is a
+    perfect match, and 0 is no better than two unrelated sounds.
+    """
+    scores = score_loop_candidates(
+        numpy.asarray(channel)[None], [loop_start], [loop_end], sample_rate)
+    return float(1 - scores.waveform[0])
 
-def process(aif, sample_rate=48000):
-    file = read_wave_file(aif)
 
-    # loop_start, loop_size = window_match(file)
-    # loop_start, loop_size = zero_crossing_match(file)
-    loop_start, loop_end = find_loop_points(file)
+def process(aif):
+    import matplotlib.pyplot as plt
+    file, sample_rate = read_sample_file(aif)
+
+    loop_start, loop_end = find_loop_points(file, sample_rate)
     loop_size = loop_end - loop_start
 
     file = file[0]
 
     print 'start, end', loop_start, loop_end
+    print 'quality', loop_quality(file, loop_start, loop_end, sample_rate)
 
     plt.plot(file[loop_start:loop_end])
     plt.plot(file[loop_end:loop_start + (2 * loop_size)])
@@ -249,5 +541,4 @@ def process(aif, sample_rate=48000):
     plt.show()
 
 if __name__ == "__main__":
-    import matplotlib.pyplot as plt
     process(sys.argv[1])
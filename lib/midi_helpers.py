@@ -1,9 +1,14 @@
 import time
-import rtmidi
+
+try:
+    import rtmidi
+except ImportError:
+    rtmidi = None  # Only needed to talk to real MIDI ports.
 
 
 CHANNEL_OFFSET = 0x90 - 1
 CC_CHANNEL_OFFSET = 0xB0 - 1
+PROGRAM_CHANGE_CHANNEL_OFFSET = 0xC0 - 1
 
 
 class Midi(object):
@@ -34,7 +39,13 @@ def all_notes_off(midiout, midi_channel):
     ])
 
 
+def require_rtmidi():
+    if rtmidi is None:
+        raise ImportError("python-rtmidi is required to use MIDI ports.")
+
+
 def open_midi_port(midi_port_name):
+    require_rtmidi()
     midiout = rtmidi.MidiOut()
     ports = midiout.get_ports()
     for i, port_name in enumerate(ports):
@@ -58,8 +69,7 @@ def set_program_number(midiout, midi_channel, program_number):
         ])
         # Program change to program number % 128
         midiout.send_message([
-            CHANNEL_OFFSET + midi_channel,
-            0xC0,
+            PROGRAM_CHANGE_CHANNEL_OFFSET + midi_channel,
             program_number % 128,
         ])
 
@@ -71,6 +81,7 @@ def set_program_number(midiout, midi_channel, program_number):
 
 
 def open_midi_port_by_index(midi_port_index):
+    require_rtmidi()
     midiout = rtmidi.MidiOut()
     ports = midiout.get_ports()
     if midi_port_index > 0 and midi_port_index <= len(ports):
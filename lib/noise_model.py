@@ -0,0 +1,112 @@
+import numpy
+
+# Silence is judged on the RMS of windows this many frames long, so that
+# a single click can't keep a note alive.
+RMS_WINDOW = 256
+# The gate opens when a window is this many times louder than the noise
+# floor (about 12dB), and closes again once every input is back under
+# CLOSE_RATIO times the noise floor (about 3.5dB).
+OPEN_RATIO = 4.0
+CLOSE_RATIO = 1.5
+# How long the gate must stay closed before a note is considered over.
+HOLD_TIME = 0.5
+# Which percentile of the noise capture's windows counts as its level,
+# so that a stray click during the noise capture doesn't inflate it.
+NOISE_PERCENTILE = 95
+# -120dBFS; keeps a perfectly silent input from never gating.
+MIN_NOISE_RMS = 0.000001
+
+
+def windowed_rms(data, window=RMS_WINDOW):
+    """
+    The RMS of each consecutive ``window``-frame window of a (channels,
+    frames) array, as a (channels, windows) array. A trailing partial
+    window is ignored, unless it's all there is.
+    """
+    data = numpy.asarray(data, dtype=numpy.float64)
+    num_windows = data.shape[1] // window
+    if num_windows == 0:
+        return numpy.sqrt(numpy.mean(data ** 2, 1))[:, None]
+    windows = data[:, :num_windows * window].reshape(
+        (data.shape[0], num_windows, window))
+    return numpy.sqrt(numpy.mean(windows ** 2, 2))
+
+
+class NoiseModel(object):
+    """
+    What silence sounds like on each input, learned from a capture of
+    the noise floor. ``noise_rms`` and ``noise_peak`` are per-input
+    fractions of full scale; inputs that shouldn't count towards
+    silence detection have a ``noise_rms`` of infinity.
+    """
+
+    def __init__(
+        self,
+        noise_rms,
+        noise_peak,
+        open_ratio=OPEN_RATIO,
+        close_ratio=CLOSE_RATIO,
+        hold_time=HOLD_TIME,
+        window=RMS_WINDOW,
+    ):
+        self.noise_rms = numpy.maximum(
+            numpy.asarray(noise_rms, dtype=numpy.float64), MIN_NOISE_RMS)
+        self.noise_peak = numpy.asarray(noise_peak, dtype=numpy.float64)
+        self.open_ratio = open_ratio
+        self.close_ratio = close_ratio
+        self.hold_time = hold_time
+        self.window = window
+
+    @classmethod
+    def from_capture(cls, data, full_scale, channels=None, **kwargs):
+        """
+        Model the noise in a (channels, frames) capture. If ``channels``
+        is given, only those inputs are considered.
+        """
+        noise_rms = numpy.percentile(
+            windowed_rms(data, kwargs.get('window', RMS_WINDOW)),
+            NOISE_PERCENTILE,
+            axis=1,
+        ) / full_scale
+        noise_peak = numpy.amax(numpy.absolute(data), 1) / float(full_scale)
+        if channels is not None:
+            ignored = numpy.ones(len(noise_rms), dtype=bool)
+            ignored[list(channels)] = False
+            noise_rms[ignored] = numpy.inf
+            noise_peak[ignored] = 0
+        return cls(noise_rms, noise_peak, **kwargs)
+
+    @property
+    def rms(self):
+        """The loudest considered input's noise level."""
+        return numpy.amax(self.noise_rms[numpy.isfinite(self.noise_rms)])
+
+    @property
+    def threshold(self):
+        """A peak threshold just above the noise, for trimming."""
+        return numpy.amax(self.noise_peak) * 1.1
+
+    def gate(self, full_scale):
+        return NoiseGate(self, full_scale)
+
+
+class NoiseGate(object):
+    """
+    Decides, chunk by chunk, whether one capture has gone silent,
+    with hysteresis between opening and closing.
+    """
+
+    def __init__(self, model, full_scale):
+        self.window = model.window
+        self.open_level = model.noise_rms * model.open_ratio * full_scale
+        self.close_level = model.noise_rms * model.close_ratio * full_scale
+        self.is_open = False
+
+    def is_silent(self, chunk):
+        loudest = numpy.amax(windowed_rms(chunk, self.window), 1)
+        if self.is_open:
+            if (loudest < self.close_level).all():
+                self.is_open = False
+        elif (loudest > self.open_level).any():
+            self.is_open = True
+        return not self.is_open
@@ -0,0 +1,73 @@
+import numpy
+
+from constants import default_silence_threshold, bit_depth
+
+
+def absolute_threshold(threshold, full_scale=float(2 ** (bit_depth - 1))):
+    """Scale a threshold given as a fraction of full scale to samples."""
+    if int(threshold) != threshold:
+        threshold = threshold * full_scale
+    return threshold
+
+
+class OnsetTracker(object):
+    """
+    Track where a capture's audio starts and ends, one chunk at a time.
+
+    The resulting ``start`` and ``end`` are the same bounds that
+    utils.trim_data would find by scanning the whole capture afterwards:
+    one sample before the first sample louder than ``start_threshold``,
+    and one sample after the last sample louder than ``end_threshold``.
+    Unlike trim_data, a channel that never crosses a threshold doesn't
+    disable trimming for the other channels.
+    """
+
+    def __init__(
+        self,
+        start_threshold=default_silence_threshold,
+        end_threshold=default_silence_threshold,
+        full_scale=float(2 ** (bit_depth - 1)),
+    ):
+        self.start_threshold = absolute_threshold(start_threshold, full_scale)
+        self.end_threshold = absolute_threshold(end_threshold, full_scale)
+        self.length = 0
+        self.onset = None
+        self.last_loud = None
+
+    def update(self, chunk, absolute=None):
+        """
+        Account for the next (channels, frames) chunk of the capture.
+        ``absolute`` can be passed if numpy.absolute(chunk) is already
+        at hand.
+        """
+        if absolute is None:
+            absolute = numpy.absolute(chunk)
+        loudest = numpy.amax(absolute, 0)
+
+        if self.onset is None:
+            above = loudest > self.start_threshold
+            if above.any():
+                self.onset = self.length + int(numpy.argmax(above))
+
+        above = loudest > self.end_threshold
+        if above.any():
+            self.last_loud = self.length + len(above) - 1 - int(
+                numpy.argmax(above[::-1]))
+
+        self.length += chunk.shape[1]
+
+    @property
+    def found_onset(self):
+        return self.onset is not None
+
+    @property
+    def start(self):
+        if self.onset is None:
+            return 0
+        return max(self.onset - 1, 0)
+
+    @property
+    def end(self):
+        if self.last_loud is None:
+            return self.length
+        return min(self.last_loud + 2, self.length)
@@ -0,0 +1,89 @@
+import sys
+import Queue
+import threading
+
+
+class Job(object):
+    """The eventual result of calling ``func`` on a worker thread."""
+
+    def __init__(self, func, args=(), kwargs=None):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs or {}
+        self.value = None
+        self.exc_info = None
+        self.finished = threading.Event()
+
+    def run(self):
+        try:
+            self.value = self.func(*self.args, **self.kwargs)
+        except BaseException:
+            self.exc_info = sys.exc_info()
+        finally:
+            self.finished.set()
+
+    @property
+    def done(self):
+        return self.finished.is_set()
+
+    def result(self):
+        """Wait for the job, then return its value or re-raise its error."""
+        self.finished.wait()
+        if self.exc_info is not None:
+            raise self.exc_info[0], self.exc_info[1], self.exc_info[2]
+        return self.value
+
+
+class WorkerPool(object):
+    """
+    A fixed number of worker threads with a bounded backlog.
+
+    submit() blocks while ``max_pending`` jobs are unfinished, so a
+    producer can't get arbitrarily far ahead of the workers, and the
+    data held by queued jobs stays bounded. Jobs are started in the
+    order they're submitted, so a job may wait on the result of any job
+    submitted before it. With no workers, jobs run in submit().
+    """
+
+    def __init__(self, workers=2, max_pending=None):
+        self.jobs = Queue.Queue()
+        self.slots = threading.Semaphore(max_pending or max(workers * 2, 1))
+        self.threads = []
+        for _ in xrange(workers):
+            thread = threading.Thread(target=self.work)
+            thread.daemon = True
+            thread.start()
+            self.threads.append(thread)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def submit(self, func, *args, **kwargs):
+        job = Job(func, args, kwargs)
+        if not self.threads:
+            job.run()
+            return job
+        self.slots.acquire()
+        self.jobs.put(job)
+        return job
+
+    def work(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                return
+            try:
+                job.run()
+            finally:
+                self.slots.release()
+
+    def close(self):
+        """Finish every submitted job, then stop the workers."""
+        for _ in self.threads:
+            self.jobs.put(None)
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
@@ -105,3 +105,50 @@ def compute_zones(pitch_range, step):
         if low > pitch_range.high:
             break
     return regions
+
+
+def zones_around(keys, pitch_range):
+    """Plan one zone around each of the sorted, sampled ``keys``.
+
+    The keys between two samples are split between them, with
+    preference given to extending each zone downwards, as in
+    ``optimal_pitch_center``.
+    """
+    zones = []
+    low = pitch_range.low
+    for key, next_key in zip(keys, keys[1:] + [None]):
+        if next_key is None:
+            high = pitch_range.high
+        else:
+            high = key + (next_key - key - 1) // 2
+        zones.append(Zone(low=low, high=high, center=key))
+        low = high + 1
+    return zones
+
+
+def plan_zones(pitch_range, distance, tolerance, max_step=12, min_step=1):
+    """Plan zones adaptively, with more of them where the sound changes.
+
+    Keys are first sampled every ``max_step`` keys, plus the top of
+    ``pitch_range``. Wherever two neighbouring sampled keys are more
+    than ``min_step`` apart and ``distance(low_key, high_key)`` exceeds
+    ``tolerance``, the key halfway between them is sampled too, and both
+    halves are checked again.
+
+    The param ``distance`` is any callable taking two keys and returning
+    how different they sound; sampling the keys is up to it.
+    """
+    assert isinstance(pitch_range, Zone)
+    assert 0 < min_step <= max_step
+    keys = list(range(pitch_range.low, pitch_range.high + 1, max_step))
+    if keys[-1] != pitch_range.high:
+        keys.append(pitch_range.high)
+
+    pairs = list(zip(keys, keys[1:]))
+    while pairs:
+        low, high = pairs.pop()
+        if high - low > min_step and distance(low, high) > tolerance:
+            middle = (low + high) // 2
+            keys.append(middle)
+            pairs.extend([(low, middle), (middle, high)])
+    return zones_around(sorted(keys), pitch_range)
@@ -0,0 +1,200 @@
+"""
+Plan a sampling session before it starts: which notes still need to be
+played, in what order, and roughly how long that will take.
+"""
+
+import os
+import time
+from collections import namedtuple
+from journal import read_journal, region_key, JOURNAL_FILENAME
+
+# How long the release and the silence timeout are assumed to add to the
+# held part of a note that no earlier session has sampled near.
+FALLBACK_TAIL_SECONDS = 2.0
+# How far away (in keys) an earlier capture can be and still inform an
+# estimate; see DurationModel.estimate.
+NEIGHBOUR_KEYS = 6
+VELOCITY_SCALE = 16.0
+
+
+class PlannedNote(namedtuple('PlannedNote', [
+    'zone',
+    'velocity',
+    'done_note',
+    'presample',
+    'sampled',
+])):
+    """
+    One (zone, velocity) of a session. ``done_note`` marks the last
+    velocity of its zone, ``presample`` whether it needs a portamento
+    presample first, and ``sampled`` whether an earlier run already
+    sampled it.
+    """
+
+
+def plan_session(
+    zones,
+    velocities,
+    ascending=False,
+    sampled=None,
+    portamento=False,
+):
+    """
+    Order every note of a session. All of a zone's velocities are played
+    together, so the pitch only changes once per zone, and with
+    ``portamento`` only a note that changes the pitch needs a presample.
+    ``sampled`` is called with (zone, velocity) and says if a note can be
+    skipped.
+    """
+    plan = []
+    last_played = None
+    for zone in (zones if ascending else reversed(zones)):
+        for i, velocity in enumerate(velocities):
+            skip = sampled is not None and sampled(zone, velocity)
+            plan.append(PlannedNote(
+                zone,
+                velocity,
+                i == len(velocities) - 1,
+                portamento and not skip and zone.center != last_played,
+                skip,
+            ))
+            if not skip:
+                last_played = zone.center
+    return plan
+
+
+def history_folders(output_folder):
+    """
+    The folders whose journals inform a session in ``output_folder``: it
+    and its siblings, which usually hold other programs of the same
+    instrument.
+    """
+    parent = os.path.dirname(os.path.abspath(output_folder))
+    try:
+        siblings = sorted(os.listdir(parent))
+    except OSError:
+        siblings = []
+    folders = [os.path.join(parent, name) for name in siblings]
+    return [
+        folder for folder in folders
+        if os.path.exists(os.path.join(folder, JOURNAL_FILENAME))
+    ]
+
+
+class DurationModel(object):
+    """
+    How long each note takes to capture, from how long notes nearby
+    took in earlier sessions, or ``fallback`` seconds with no history.
+    """
+
+    def __init__(self, fallback):
+        self.fallback = fallback
+        self.seconds = {}
+
+    @classmethod
+    def from_folders(cls, folders, fallback):
+        model = cls(fallback)
+        for folder in folders:
+            entries, _ = read_journal(os.path.join(folder, JOURNAL_FILENAME))
+            for region, seconds in entries:
+                if seconds is not None:
+                    model.add(*(region_key(region) + (seconds,)))
+        return model
+
+    def __len__(self):
+        return sum(len(seconds) for seconds in self.seconds.itervalues())
+
+    def add(self, note, velocity, seconds):
+        self.seconds.setdefault((note, velocity), []).append(seconds)
+
+    def estimate(self, note, velocity):
+        """A weighted average of nearby captures, or the fallback."""
+        total = weights = 0.0
+        for (other_note, other_velocity), seconds in self.seconds.iteritems():
+            distance = abs(other_note - note)
+            if distance > NEIGHBOUR_KEYS:
+                continue
+            weight = len(seconds) / (
+                1 + distance + abs(other_velocity - velocity) / VELOCITY_SCALE)
+            total += weight * sum(seconds) / len(seconds)
+            weights += weight
+        if not weights:
+            return self.fallback
+        return total / weights
+
+    def note_seconds(self, note, presample_seconds=0):
+        """The estimated time a planned note will take, if any."""
+        if note.sampled:
+            return 0
+        seconds = self.estimate(note.zone.center, note.velocity)
+        if note.presample:
+            seconds += presample_seconds
+        return seconds
+
+
+def format_seconds(seconds):
+    minutes, seconds = divmod(int(round(seconds)), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return "%dh%02dm%02ds" % (hours, minutes, seconds)
+    return "%dm%02ds" % (minutes, seconds)
+
+
+def describe_plan(plan, model, presample_seconds=0):
+    to_sample = [note for note in plan if not note.sampled]
+    planned = sum(model.note_seconds(note, presample_seconds) for note in plan)
+    return (
+        "%d notes to sample (%d already sampled), %d presamples; "
+        "estimated %s from %d earlier captures." % (
+            len(to_sample),
+            len(plan) - len(to_sample),
+            sum(1 for note in to_sample if note.presample),
+            format_seconds(planned),
+            len(model),
+        )
+    )
+
+
+class Progress(object):
+    """
+    Tracks a session against its planned duration. The time left is the
+    planned time left, scaled by how far off the plan has been so far.
+    """
+
+    def __init__(self, planned_seconds):
+        self.planned = planned_seconds
+        self.done = 0.0
+        self.start = time.time()
+
+    def advance(self, planned_seconds):
+        self.done += planned_seconds
+
+    @property
+    def remaining(self):
+        remaining = max(0, self.planned - self.done)
+        elapsed = time.time() - self.start
+        if self.done and elapsed:
+            remaining *= elapsed / self.done
+        return remaining
+
+    def report(self):
+        return "%s elapsed, about %s left (planned %s)." % (
+            format_seconds(time.time() - self.start),
+            format_seconds(self.remaining),
+            format_seconds(self.planned),
+        )
+
+
+def sampled_keys(output_folder):
+    """
+    The (key center, high velocity) of each note already sampled into
+    ``output_folder``, read without opening its journal for writing.
+    """
+    path = os.path.join(output_folder, JOURNAL_FILENAME)
+    if not os.path.exists(path):
+        return set()
+    entries, _ = read_journal(path)
+    return set(
+        region_key(region) for region, _ in entries
+        if region.exists(output_folder)
+    )
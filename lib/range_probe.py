@@ -0,0 +1,74 @@
+"""
+Find out, before a full run, which keys an instrument actually plays.
+
+Each key is held briefly at one velocity, and its release is captured
+so it can't ring into the next probe. Keys that don't start a note are
+left out of the session, rather than each being held until the silence
+timeout once per velocity. Results are cached per instrument and
+program, so resampling a program doesn't probe it again.
+"""
+
+from cache import cache_key
+from pitch import Zone
+from utils import note_name
+
+# How long each key is held while probing, in seconds.
+RANGE_PROBE_LIMIT = 0.5
+RANGE_CACHE_NAME = 'key_ranges'
+
+
+def range_cache_key(midi_port, program_number, cc_before=None, cc_after=None):
+    """
+    What identifies one sound: the instrument, its program, and any
+    controller changes (like bank selects) sent around the program change.
+    """
+    return cache_key(midi_port, program_number, cc_before, cc_after)
+
+
+def responsive_keys(sounds, keys, cache=None, key=None):
+    """
+    Which of ``keys`` the instrument plays. ``sounds`` is called with a
+    key and returns whether it started a note. Keys already probed under
+    ``key`` in ``cache`` aren't probed again.
+    """
+    cached = cache.get(key, {}) if cache is not None else {}
+    probed = set(cached.get('probed', []))
+    responsive = set(cached.get('responsive', []))
+
+    to_probe = [k for k in keys if k not in probed]
+    if to_probe:
+        print "Probing %d keys from %s to %s..." % (
+            len(to_probe), note_name(to_probe[0]), note_name(to_probe[-1]))
+    for k in to_probe:
+        if sounds(k):
+            responsive.add(k)
+        probed.add(k)
+    if cache is not None and to_probe:
+        cache.set(key, {
+            'probed': sorted(probed),
+            'responsive': sorted(responsive),
+        })
+
+    result = [k for k in keys if k in responsive]
+    print "Instrument plays %d of %d keys%s." % (
+        len(result), len(keys),
+        " (cached)" if not to_probe else "")
+    return result
+
+
+def prune_zones(zones, responsive):
+    """
+    Drop zones with no responsive keys, shrink the rest to the keys that
+    respond, and move any silent center to the nearest responsive key.
+    """
+    responsive = set(responsive)
+    pruned = []
+    for zone in zones:
+        keys = sorted(
+            k for k in set(xrange(zone.low, zone.high + 1)) | {zone.center}
+            if k in responsive)
+        if not keys:
+            continue
+        center = min(keys, key=lambda k: (abs(k - zone.center), -k))
+        pruned.append(Zone(low=keys[0], high=keys[-1], center=center))
+    return pruned
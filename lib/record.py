@@ -1,15 +1,26 @@
+import os
 import sys
+import time
 import numpy
-from struct import pack
-from constants import bit_depth, NUMPY_DTYPE, SAMPLE_RATE
+from collections import deque, namedtuple
+from constants import SAMPLE_RATE, SAMPLE_FORMAT
 from utils import percent_to_db, dbfs_as_percent
-
-import pyaudio
-import wave
+from capture_buffer import CaptureBuffer
+from wavio import write_wave_file, TrimmingWaveWriter
+from onsets import OnsetTracker
+from decay_model import DecayEstimator, envelope_db
+from steady_state import SteadyStateDetector
+from sample_format import by_name
+from backends import HardwareBackend, PA_CONTINUE, PA_INPUT_OVERFLOW
 
 CHUNK_SIZE = 1024
 NUM_CHANNELS = 2
-FORMAT = pyaudio.paInt16 if bit_depth == 16 else pyaudio.paInt24
+
+# Roughly 1.4 seconds of audio at 48kHz.
+CHUNK_QUEUE_SIZE = 64
+QUEUE_POLL_INTERVAL = 0.002
+QUEUE_TIMEOUT = 2.0
+METER_INTERVAL = 0.05
 
 if not sys.platform == "win32":
     GO_UP = "\033[F"
@@ -19,58 +30,513 @@ else:
     ERASE = ""
 
 
-def is_silent(snd_data, threshold):
-    maxval = max(
-        abs(numpy.amax(snd_data)),
-        abs(numpy.amin(snd_data))
-    ) / float(2 ** (bit_depth - 1))
-    return maxval < threshold
-
-
-def get_input_device_names(py_audio, info):
-    input_interface_names = {}
-    for i in range(0, info.get('deviceCount')):
-        device_info = py_audio.get_device_info_by_host_api_device_index(0, i)
-        if device_info.get('maxInputChannels') > 0:
-            input_interface_names[i] = device_info.get('name')
-    return input_interface_names
-
-
-def get_input_device_index(py_audio, audio_interface_name=None):
-    info = py_audio.get_host_api_info_by_index(0)
-    input_interface_names = get_input_device_names(py_audio, info)
-
-    if audio_interface_name:
-        for index, name in input_interface_names.iteritems():
-            if audio_interface_name.lower() in name.lower():
-                return index
+def is_silent(snd_data, threshold, full_scale):
+    """
+    True if every channel's peak is below ``threshold``, which may be a
+    single value or one value per channel.
+    """
+    peaks = numpy.amax(numpy.absolute(snd_data), 1) / full_scale
+    return bool((peaks < threshold).all())
+
+
+def highest_threshold(threshold):
+    """
+    The highest of one or more per-channel thresholds, ignoring the
+    infinite ones of channels that are never listened to.
+    """
+    threshold = numpy.asarray(threshold, dtype=numpy.float64)
+    return numpy.amax(threshold[numpy.isfinite(threshold)])
+
+
+class ChunkQueue(object):
+    """
+    A bounded queue of raw audio chunks, filled by the audio backend's
+    callback thread and drained by record().
+
+    deque.append and deque.popleft are atomic, so the audio thread never
+    waits on a lock. If the consumer falls behind and the queue fills up,
+    incoming chunks are dropped and counted as overflows; input overflows
+    reported by the backend itself are counted as xruns.
+
+    Chunks that arrive while nobody is listening are discarded, so the
+    stream can be left running between captures.
+    """
+
+    def __init__(self, maxsize=CHUNK_QUEUE_SIZE):
+        self.maxsize = maxsize
+        self.overflows = 0
+        self.xruns = 0
+        self.listening = False
+        self._chunks = deque()
+
+    def start(self):
+        self._chunks.clear()
+        self.overflows = 0
+        self.xruns = 0
+        self.listening = True
+
+    def stop(self):
+        self.listening = False
+        self._chunks.clear()
+
+    def callback(self, in_data, frame_count, time_info, status):
+        if not self.listening:
+            return (None, PA_CONTINUE)
+        if status & PA_INPUT_OVERFLOW:
+            self.xruns += 1
+        if len(self._chunks) >= self.maxsize:
+            self.overflows += 1
         else:
-            raise Exception(
-                "Could not find audio input '%s' in inputs:\n%s" % (
-                    audio_interface_name,
-                    list_input_devices(input_interface_names)))
-
+            self._chunks.append(in_data)
+        return (None, PA_CONTINUE)
+
+    def get(self, timeout=QUEUE_TIMEOUT):
+        waited = 0.0
+        while True:
+            try:
+                return self._chunks.popleft()
+            except IndexError:
+                if waited >= timeout:
+                    raise IOError(
+                        "No audio received for %2.2f seconds." % timeout)
+                time.sleep(QUEUE_POLL_INTERVAL)
+                waited += QUEUE_POLL_INTERVAL
+
+
+class Recording(namedtuple('Recording', [
+    'sample_format',
+    'data',
+    'release_time',
+    'overflows',
+    'xruns',
+    'peak',
+    'path',
+    'trim_start',
+    'trim_end',
+    'group_trims',
+    'decay_rate',
+    'release_frame',
+])):
+    """
+    The result of one capture. ``trim_start`` and ``trim_end`` are the
+    bounds of the audible part of the capture, tracked while recording,
+    so that trimming is just a slice. If the capture was asked to track
+    groups of channels separately, ``group_trims`` holds each group's
+    (start, end) bounds.
+    """
+
+    @property
+    def trimmed(self):
+        if self.data is None:
+            return None
+        return self.data[:, self.trim_start:self.trim_end]
+
+    def trimmed_group(self, channels, index):
+        """The trimmed audio of one group of channels."""
+        if self.data is None:
+            return None
+        start, end = self.group_trims[index]
+        return self.data[list(channels), start:end]
+
+    @property
+    def sustain_length(self):
+        """
+        How many frames of the trimmed capture were recorded before the
+        note off, or None if the capture had no release.
+        """
+        if self.release_frame is None:
+            return None
+        return max(0, self.release_frame - self.trim_start)
+
+    def group_sustain_length(self, index):
+        """Like sustain_length, but for one group's trimmed audio."""
+        if self.release_frame is None:
+            return None
+        start, end = self.group_trims[index]
+        return min(max(0, self.release_frame - start), end - start)
+
+
+def print_meters(
+    peak_in_buffer,
+    full_scale,
+    total_duration_seconds,
+    num_silent,
+    silence_timeout,
+    in_tail,
+    estimated_remaining_duration,
+):
+    raw_percentages = (
+        peak_in_buffer.astype(numpy.float) / full_scale
+    )
+    dbfs = [percent_to_db(x) for x in raw_percentages]
+    pct_loudness = [dbfs_as_percent(db) for db in dbfs]
+    sys.stderr.write(ERASE)
+    sys.stderr.write("\t%2.2f secs\t" % total_duration_seconds)
+    sys.stderr.write("% 7.2f dBFS\t\t|%s%s|\n" % (
+        dbfs[0],
+        int(40 * pct_loudness[0]) * '=',
+        int(40 * (1 - pct_loudness[0])) * ' ',
+    ))
+    sys.stderr.write(ERASE)
+    sys.stderr.write("\t\t\t% 7.2f dBFS\t\t|%s%s|\n" % (
+        dbfs[1],
+        int(40 * pct_loudness[1]) * '=',
+        int(40 * (1 - pct_loudness[1])) * ' ',
+    ))
+    pct_silence_end = min(1., float(num_silent) / silence_timeout)
+    estimated_remaining_duration_string = \
+        "est. remaining duration: %2.2f secs" % (
+            estimated_remaining_duration
+        )
+    if in_tail:
+        sys.stderr.write(ERASE)
+        sys.stderr.write("\t\treleasing\t\tsilence:|%s%s| %s" % (
+            int(40 * pct_silence_end) * '=',
+            int(40 * (1 - pct_silence_end)) * ' ',
+            estimated_remaining_duration_string,
+        ))
+    else:
+        sys.stderr.write(ERASE)
+        sys.stderr.write("\t\t\t\t\tsilence:|%s%s| %s" % (
+            int(40 * pct_silence_end) * '=',
+            int(40 * (1 - pct_silence_end)) * ' ',
+            estimated_remaining_duration_string,
+        ))
+    sys.stderr.write(GO_UP)
+    sys.stderr.write(GO_UP)
+
+
+class AudioSession(object):
+    """
+    An audio input that stays open across many captures.
+
+    Looking up the input device and opening a stream on it (through a
+    backend; see backends.py) happen once, in open(). Between captures
+    the stream keeps running and its chunks are discarded, so
+    capture_note() can start listening immediately.
+    """
+
+    def __init__(
+        self,
+        audio_interface_name=None,
+        sample_rate=SAMPLE_RATE,
+        sample_format=SAMPLE_FORMAT,
+        num_channels=NUM_CHANNELS,
+        backend=None,
+    ):
+        self.audio_interface_name = audio_interface_name
+        self.backend = backend or HardwareBackend()
+        self.sample_rate = sample_rate
+        self.num_channels = num_channels
+        if isinstance(sample_format, basestring):
+            sample_format = by_name(sample_format)
+        self.sample_format = sample_format
+        self.stream = None
+        self.chunks = ChunkQueue()
+        # Set once the noise floor has been measured; see noise_model.py.
+        self.noise_model = None
+        self.early_endings = 0
+        self.seconds_saved = 0.0
+        self.setup_time = 0.0
+        self.teardown_time = 0.0
+        self.captures = 0
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def open(self):
+        start = time.time()
+        # Audio is pulled off the device on the backend's own thread, so
+        # that the analysis and metering in capture_note can never block
+        # the capture.
+        self.stream = self.backend.open_audio_input(
+            self.audio_interface_name,
+            self.num_channels,
+            self.sample_rate,
+            self.sample_format,
+            CHUNK_SIZE,
+            self.chunks.callback,
+        )
+        self.setup_time = time.time() - start
+        return self
+
+    def close(self):
+        start = time.time()
+        self.chunks.stop()
+        if self.stream is not None:
+            self.stream.stop_stream()
+            self.stream.close()
+            self.stream = None
+        self.teardown_time = time.time() - start
+
+    def timing_report(self):
+        """
+        Describe how much device setup time was avoided by reusing this
+        session, assuming each capture would otherwise have paid the same
+        setup and teardown cost as this session did once.
+        """
+        overhead = self.setup_time + self.teardown_time
+        return (
+            "Audio session: %d captures, %2.1f ms setup/teardown once, "
+            "~%2.2f secs of per-note setup saved." % (
+                self.captures,
+                overhead * 1000,
+                overhead * max(0, self.captures - 1),
+            )
+        ) + (
+            "\nDecay model: ended %d captures early, saving %2.2f secs." % (
+                self.early_endings, self.seconds_saved)
+        )
+
+    def capture_note(
+        self,
+        limit=None,
+        after_start=None,
+        on_time_up=None,
+        threshold=0.00025,
+        print_progress=True,
+        allow_empty_return=False,
+        stream_to=None,
+        start_threshold=None,
+        end_threshold=None,
+        group_trackers=None,
+        decay_prior=None,
+        steady_seconds=None,
+    ):
+        """
+        Capture one note. If ``stream_to`` is given, the capture is
+        written to that path as it arrives, with silence trimmed from
+        both ends using ``start_threshold`` and ``end_threshold``, and
+        only one chunk is held in memory; otherwise the whole capture is
+        returned in memory, along with the same trim points.
+
+        ``group_trackers`` is an optional list of (channel indices,
+        OnsetTracker) pairs, used to track trim points for groups of
+        channels separately when several instruments are recorded at
+        once. ``threshold`` may be one value per channel.
+
+        Once the session has a ``noise_model``, it decides when the
+        capture has gone silent instead of ``threshold``.
+
+        The capture also ends without waiting out the silence timeout
+        once its decay has been fitted confidently and the predicted
+        time to reach the noise floor has passed. ``decay_prior`` is the
+        release decay rate expected from neighbouring notes, in dB/sec;
+        see decay_model.py.
+
+        If ``steady_seconds`` is given, the note is released as soon as
+        it has been steady for that long, rather than held until
+        ``limit``; see steady_state.py.
+        """
+        sample_rate = self.sample_rate
+        sample_format = self.sample_format
+        num_channels = self.num_channels
+        chunks = self.chunks
+        self.captures += 1
+
+        num_silent = 0
+        if self.noise_model is not None:
+            gate = self.noise_model.gate(sample_format.full_scale)
+            silence_timeout = sample_rate * self.noise_model.hold_time
+        else:
+            gate = None
+            silence_timeout = sample_rate * 2.0
+        if self.noise_model is not None:
+            floor_db = percent_to_db(self.noise_model.rms)
+        else:
+            floor_db = percent_to_db(highest_threshold(threshold))
+        decay = DecayEstimator(floor_db, float(CHUNK_SIZE) / sample_rate)
+        if steady_seconds:
+            steady_state = SteadyStateDetector(
+                sample_rate, steady_seconds, sample_format.full_scale,
+                floor_db)
+        else:
+            steady_state = None
+        release_frame = None
+        snd_started = False
+        in_tail = False
+        release_time = None
+        last_meter_time = 0
 
-def get_input_device_name_by_index(audio_interface_index):
-    py_audio = pyaudio.PyAudio()
-    info = py_audio.get_host_api_info_by_index(0)
-    input_interface_names = get_input_device_names(py_audio, info)
+        if print_progress:
+            sys.stderr.write("\n")
+
+        peak_value = None
+        peak_index = None
+
+        if start_threshold is None:
+            start_threshold = highest_threshold(threshold)
+        if end_threshold is None:
+            end_threshold = highest_threshold(threshold)
+        tracker = OnsetTracker(
+            start_threshold,
+            end_threshold,
+            sample_format.full_scale,
+        )
+        group_trackers = [
+            (list(channels), group_tracker)
+            for channels, group_tracker in group_trackers or []
+        ]
+        if stream_to is not None:
+            data = None
+            writer = TrimmingWaveWriter(
+                stream_to,
+                num_channels,
+                sample_format,
+                sample_rate,
+                tracker,
+            )
+        else:
+            writer = None
+            data = CaptureBuffer.for_limit(
+                limit,
+                sample_rate,
+                num_channels,
+                sample_format.dtype,
+                CHUNK_SIZE,
+            )
+        total_length = 0
+
+        chunks.start()
+        try:
+            while 1:
+                if total_length > 0 and after_start is not None:
+                    after_start()
+                    after_start = None  # don't call back again
+                array = chunks.get()
+                snd_data = sample_format.decode(array)
+                snd_data = numpy.reshape(snd_data, (num_channels, -1), 'F')
+
+                absolute = numpy.absolute(snd_data)
+                peak_in_buffer = numpy.amax(absolute, 1)
+                peak_in_buffer_idx = numpy.argmax(numpy.amax(absolute, 0))
+                mono_peak_in_buffer = max(peak_in_buffer)
+
+                if peak_value is None or peak_value < mono_peak_in_buffer:
+                    peak_value = mono_peak_in_buffer
+                    peak_index = total_length + peak_in_buffer_idx
+
+                if writer is not None:
+                    writer.write(snd_data, absolute)
+                else:
+                    tracker.update(snd_data, absolute)
+                    data.append(snd_data)
+                for channels, group_tracker in group_trackers:
+                    group_tracker.update(
+                        snd_data[channels], absolute[channels])
+                total_length += len(snd_data[0])
+                total_duration_seconds = float(total_length) / sample_rate
+                decay.update(
+                    total_duration_seconds,
+                    envelope_db(snd_data, sample_format.full_scale))
+                floor_time = decay.floor_time()
+                if steady_state is not None and not in_tail:
+                    steady_state.update(snd_data)
+
+                if print_progress and \
+                        time.time() - last_meter_time >= METER_INTERVAL:
+                    last_meter_time = time.time()
+                    time_since_peak = total_length - peak_index
+                    if floor_time is not None:
+                        estimated_remaining_duration = max(
+                            0, floor_time - total_duration_seconds)
+                    elif time_since_peak and peak_value:
+                        estimated_remaining_duration = (
+                            float(mono_peak_in_buffer) / peak_value
+                        ) / time_since_peak
+                    else:
+                        estimated_remaining_duration = 1
+                    print_meters(
+                        peak_in_buffer,
+                        sample_format.full_scale,
+                        total_duration_seconds,
+                        num_silent,
+                        silence_timeout,
+                        in_tail,
+                        estimated_remaining_duration,
+                    )
+
+                if gate is not None:
+                    silent = gate.is_silent(snd_data)
+                else:
+                    silent = is_silent(
+                        snd_data, threshold, sample_format.full_scale)
 
-    for index, name in input_interface_names.iteritems():
-        if index == audio_interface_index:
-            return name
-    else:
-        raise Exception(
-            "Could not find audio input index %s in inputs:\n%s" % (
-                audio_interface_index,
-                list_input_devices(input_interface_names)))
+                if silent:
+                    num_silent += CHUNK_SIZE
+                elif not snd_started:
+                    snd_started = True
+                else:
+                    num_silent = 0
 
+                if silent and snd_started and num_silent <= silence_timeout \
+                        and floor_time is not None \
+                        and total_duration_seconds >= floor_time:
+                    # The tail is where the decay model said it would be,
+                    # so there's no need to wait out the silence timeout.
+                    self.early_endings += 1
+                    self.seconds_saved += float(
+                        silence_timeout - num_silent) / sample_rate
+                    num_silent = silence_timeout + 1
+
+                if num_silent > silence_timeout:
+                    if on_time_up is not None:
+                        on_time_up()
+                    break
+                elif not in_tail and (
+                    (limit is not None and total_duration_seconds >= limit) or
+                    (steady_state is not None and steady_state.ready)
+                ):
+                    if on_time_up is not None:
+                        if on_time_up():
+                            num_silent = 0
+                            in_tail = True
+                            release_time = total_duration_seconds
+                            release_frame = total_length
+                            decay.restart(decay_prior)
+                        else:
+                            break
+                    else:
+                        break
+        finally:
+            chunks.stop()
+            if writer is not None:
+                writer.close()
 
-def list_input_devices(device_names):
-    lines = []
-    for index, name in sorted(device_names.iteritems()):
-        lines.append(u"{:3d}. {}".format(index, name))
-    return u"\n".join(lines).encode("ascii", "ignore")
+        if print_progress:
+            sys.stderr.write("\n\n\n")
+
+        if chunks.overflows or chunks.xruns:
+            print(
+                "WARNING: dropped %d chunks and saw %d input overflows while "
+                "recording; audio may contain gaps." % (
+                    chunks.overflows, chunks.xruns))
+
+        keep = snd_started or allow_empty_return
+        path = None
+        if writer is not None:
+            if keep and writer.trimmed_length > 0:
+                path = stream_to
+            else:
+                os.unlink(stream_to)
+
+        return Recording(
+            sample_format,
+            data.data if keep and data is not None else None,
+            release_time,
+            chunks.overflows,
+            chunks.xruns,
+            peak_value,
+            path,
+            tracker.start,
+            tracker.end,
+            [(t.start, t.end) for _, t in group_trackers],
+            decay.rate if in_tail else None,
+            release_frame,
+        )
 
 
 def record(
@@ -82,149 +548,41 @@ def record(
     allow_empty_return=False,
     audio_interface_name=None,
     sample_rate=SAMPLE_RATE,
+    sample_format=SAMPLE_FORMAT,
+    session=None,
+    backend=None,
+    stream_to=None,
+    start_threshold=None,
+    end_threshold=None,
+    decay_prior=None,
+    steady_seconds=None,
 ):
-    p = pyaudio.PyAudio()
-    input_device_index = get_input_device_index(p, audio_interface_name)
-
-    stream = p.open(
-        format=FORMAT,
-        channels=NUM_CHANNELS,
-        rate=sample_rate,
-        input=True,
-        output=False,
-        frames_per_buffer=CHUNK_SIZE,
-        input_device_index=input_device_index
+    """
+    Capture one note, using ``session`` if given. Otherwise, a temporary
+    AudioSession is opened and closed around the capture.
+    """
+    kwargs = dict(
+        limit=limit,
+        after_start=after_start,
+        on_time_up=on_time_up,
+        threshold=threshold,
+        print_progress=print_progress,
+        allow_empty_return=allow_empty_return,
+        stream_to=stream_to,
+        start_threshold=start_threshold,
+        end_threshold=end_threshold,
+        decay_prior=decay_prior,
+        steady_seconds=steady_seconds,
     )
-
-    num_silent = 0
-    silence_timeout = sample_rate * 2.0
-    snd_started = False
-    in_tail = False
-    release_time = None
-
-    if print_progress:
-        sys.stderr.write("\n")
-
-    peak_value = None
-    peak_index = None
-
-    data = []
-    total_length = 0
-
-    while 1:
-        if total_length > 0 and after_start is not None:
-            after_start()
-            after_start = None  # don't call back again
-        array = stream.read(CHUNK_SIZE)
-        snd_data = numpy.fromstring(array, dtype=NUMPY_DTYPE)
-        snd_data = numpy.reshape(snd_data, (2, -1), 'F')
-
-        peak_in_buffer = numpy.amax(numpy.absolute(snd_data), 1)
-        peak_in_buffer_idx = numpy.argmax(numpy.absolute(snd_data))
-        mono_peak_in_buffer = max(peak_in_buffer)
-
-        if peak_value is None or peak_value < mono_peak_in_buffer:
-            peak_value = mono_peak_in_buffer
-            peak_index = total_length + peak_in_buffer_idx
-
-        data.append(snd_data)
-        total_length += len(snd_data[0])
-        total_duration_seconds = float(total_length) / sample_rate
-
-        time_since_peak = total_length - peak_index
-        peak_pct = mono_peak_in_buffer / peak_value
-        if time_since_peak:
-            estimated_remaining_duration = peak_pct / time_since_peak
-        else:
-            estimated_remaining_duration = 1
-
-        if print_progress:
-            raw_percentages = (
-                peak_in_buffer.astype(numpy.float) /
-                float(2 ** (bit_depth - 1))
-            )
-            dbfs = [percent_to_db(x) for x in raw_percentages]
-            pct_loudness = [dbfs_as_percent(db) for db in dbfs]
-            sys.stderr.write(ERASE)
-            sys.stderr.write("\t%2.2f secs\t" % total_duration_seconds)
-            sys.stderr.write("% 7.2f dBFS\t\t|%s%s|\n" % (
-                dbfs[0],
-                int(40 * pct_loudness[0]) * '=',
-                int(40 * (1 - pct_loudness[0])) * ' ',
-            ))
-            sys.stderr.write(ERASE)
-            sys.stderr.write("\t\t\t% 7.2f dBFS\t\t|%s%s|\n" % (
-                dbfs[1],
-                int(40 * pct_loudness[1]) * '=',
-                int(40 * (1 - pct_loudness[1])) * ' ',
-            ))
-            pct_silence_end = float(num_silent) / silence_timeout
-            estimated_remaining_duration_string = \
-                "est. remaining duration: %2.2f secs" % (
-                    estimated_remaining_duration
-                )
-            if in_tail:
-                sys.stderr.write(ERASE)
-                sys.stderr.write("\t\treleasing\t\tsilence:|%s%s| %s" % (
-                    int(40 * pct_silence_end) * '=',
-                    int(40 * (1 - pct_silence_end)) * ' ',
-                    estimated_remaining_duration_string,
-                ))
-            else:
-                sys.stderr.write(ERASE)
-                sys.stderr.write("\t\t\t\t\tsilence:|%s%s| %s" % (
-                    int(40 * pct_silence_end) * '=',
-                    int(40 * (1 - pct_silence_end)) * ' ',
-                    estimated_remaining_duration_string,
-                ))
-            sys.stderr.write(GO_UP)
-            sys.stderr.write(GO_UP)
-
-        silent = is_silent(snd_data, threshold)
-
-        if silent:
-            num_silent += CHUNK_SIZE
-        elif not snd_started:
-            snd_started = True
-        else:
-            num_silent = 0
-
-        if num_silent > silence_timeout:
-            if on_time_up is not None:
-                on_time_up()
-            break
-        elif not in_tail \
-                and limit is not None \
-                and total_duration_seconds >= limit:
-            if on_time_up is not None:
-                if on_time_up():
-                    num_silent = 0
-                    in_tail = True
-                    release_time = total_duration_seconds
-                else:
-                    break
-            else:
-                break
-
-    if print_progress:
-        sys.stderr.write("\n\n\n")
-
-    # TODO this is inefficient, should preallocate a huge
-    # array up front and then just copy into it maybe?
-    # but not in the tight loop, what if that causes the clicks?
-    r = numpy.empty([NUM_CHANNELS, 0], dtype=NUMPY_DTYPE)
-    for chunk in data:
-        r = numpy.concatenate((r, chunk), axis=1)
-
-    sample_width = p.get_sample_size(FORMAT)
-    stream.stop_stream()
-    stream.close()
-    p.terminate()
-
-    if snd_started or allow_empty_return:
-        return sample_width, r, release_time
-    else:
-        return sample_width, None, release_time
+    if session is not None:
+        return session.capture_note(**kwargs)
+    with AudioSession(
+        audio_interface_name,
+        sample_rate,
+        sample_format,
+        backend=backend,
+    ) as session:
+        return session.capture_note(**kwargs)
 
 
 def record_to_file(
@@ -234,33 +592,22 @@ def record_to_file(
     on_time_up=None,
     sample_rate=SAMPLE_RATE
 ):
-    sample_width, data, release_time = record(
-        limit,
-        after_start,
-        on_time_up,
-        sample_rate,
+    recording = record(
+        limit=limit,
+        after_start=after_start,
+        on_time_up=on_time_up,
+        sample_rate=sample_rate,
     )
-    if data is not None:
-        save_to_file(path, sample_width, data, sample_rate)
+    if recording.data is not None:
+        save_to_file(
+            path, recording.sample_format, recording.data, sample_rate)
         return path
     else:
         return None
 
 
-def save_to_file(path, sample_width, data, sample_rate=SAMPLE_RATE):
-    wf = wave.open(path, 'wb')
-    wf.setnchannels(NUM_CHANNELS)
-    wf.setsampwidth(sample_width)
-    wf.setframerate(sample_rate)
-
-    flattened = numpy.asarray(data.flatten('F'), dtype=NUMPY_DTYPE)
-
-    write_chunk_size = 512
-    for chunk_start in xrange(0, len(flattened), write_chunk_size):
-        chunk = flattened[chunk_start:chunk_start + write_chunk_size]
-        packstring = '<' + ('h' * len(chunk))
-        wf.writeframes(pack(packstring, *chunk))
-    wf.close()
+def save_to_file(path, sample_format, data, sample_rate=SAMPLE_RATE):
+    write_wave_file(path, data, sample_format, sample_rate)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,294 @@
+"""
+Find new loop points for the samples of existing SFZ libraries.
+
+Every region with a sample is looped again, one sample file per worker
+process, and the SFZ files are rewritten in place with each region's
+loop_mode, loop_start and loop_end. Regions that share a sample file
+(like those of a FLAC file made by flacize) are looped from one decode
+of it, each within its own offset and end, and before the release at
+the end of it.
+"""
+
+import os
+import sys
+import time
+import wave
+import argparse
+import multiprocessing
+import numpy
+from sfzparser import SFZFile
+from flacize import full_path
+from wavio import read_sample_file
+from loop import find_loop_points, \
+    loop_quality, \
+    LOOP_STRATEGIES, \
+    DEFAULT_LOOP_STRATEGY, \
+    SUSTAIN_WINDOW, \
+    MIN_LOOP_SECONDS
+from noise_model import windowed_rms
+
+# A region's envelope is measured in ENVELOPE_SECONDS windows, in dB,
+# and fitted with a level held for STEADY_SECONDS followed by a straight
+# line (an exponential decay) to the end; the knee of the best fit is
+# where its sustain ends, if the line falls by at least RELEASE_DROP_DB.
+# Anything more than SUSTAIN_RANGE_DB below the peak, like a noise floor,
+# is left out.
+ENVELOPE_SECONDS = 0.01
+STEADY_SECONDS = 0.5
+RELEASE_DROP_DB = 6.0
+SUSTAIN_RANGE_DB = 40.0
+
+
+class RegionLoop(object):
+    """
+    The outcome of re-looping one region: its loop and quality, or why
+    it has none.
+    """
+
+    def __init__(self, index, loop, quality, seconds, problem=None):
+        self.index = index
+        self.loop = loop
+        self.quality = quality
+        self.seconds = seconds
+        self.problem = problem
+
+
+def region_bounds(attributes):
+    """
+    The (offset, end) frames of a region within its sample file, as a
+    slice. SFZ's ``end`` is the last frame played, so it's inclusive.
+    """
+    offset = int(attributes.get('offset', 0))
+    end = attributes.get('end')
+    return offset, int(end) + 1 if end is not None else None
+
+
+def region_problem(frames, offset, end, sample_rate):
+    """
+    Why a region from ``offset`` to ``end`` of a sample ``frames`` long
+    can't be looped, or None if it can be.
+    """
+    if end is None:
+        end = frames
+    if not 0 <= offset < end <= frames:
+        return "frames %d-%d are outside the sample's %d frames" % (
+            offset, end, frames)
+    if end - offset < 2 * MIN_LOOP_SECONDS * sample_rate:
+        return "too short to loop (%d frames)" % (end - offset)
+
+
+def sustain_end(data, sample_rate):
+    """
+    How many frames of a (channels, frames) sample come before its final
+    decay, like the release after a note off, which a loop shouldn't
+    reach into; or all of them, if it doesn't end in a decay.
+    """
+    window = int(ENVELOPE_SECONDS * sample_rate)
+    steady = int(STEADY_SECONDS / ENVELOPE_SECONDS)
+    envelope = numpy.amax(windowed_rms(data, window), 0)
+    if not numpy.amax(envelope):
+        return data.shape[1]
+    levels = 20 * numpy.log10(numpy.maximum(
+        envelope / numpy.amax(envelope), 1e-10))
+    levels = levels[:numpy.nonzero(levels >= -SUSTAIN_RANGE_DB)[0][-1] + 1]
+    knees = numpy.arange(numpy.argmax(levels) + steady, len(levels) - 1)
+    if not len(knees):
+        return data.shape[1]
+
+    # Sums of everything up to each window, to fit any run of them at once.
+    t = numpy.arange(len(levels), dtype=numpy.float64) - len(levels) / 2
+    sums = [
+        numpy.concatenate(([0], numpy.cumsum(x)))
+        for x in (numpy.ones(len(t)), levels, levels ** 2, t, t ** 2,
+                  t * levels)
+    ]
+    held = [x[knees] - x[knees - steady] for x in sums[:3]]
+    held_error = held[2] - held[1] ** 2 / held[0]
+    n, y, yy, t, tt, ty = [x[-1] - x[knees] for x in sums]
+    covariance = ty - t * y / n
+    spread = tt - t ** 2 / n
+    decay_error = yy - y ** 2 / n - covariance ** 2 / spread
+
+    decaying = -covariance / spread * n >= RELEASE_DROP_DB
+    if not decaying.any():
+        return data.shape[1]
+    error = numpy.where(
+        decaying, (held_error + decay_error) / (steady + n), numpy.inf)
+    return int(knees[numpy.argmin(error)]) * window
+
+
+def loop_sample(task):
+    """
+    Loop every region of one sample file. ``task`` is (path, regions,
+    strategy, sustain_window), where each region is (index, offset,
+    end). Returns (path, [RegionLoop], seconds to decode, error).
+    """
+    path, regions, strategy, sustain_window = task
+    start = time.time()
+    try:
+        data, sample_rate = read_sample_file(path)
+    except (IOError, OSError, wave.Error) as e:
+        return path, [], time.time() - start, str(e) or repr(e)
+    decode_seconds = time.time() - start
+
+    results = []
+    for index, offset, end in regions:
+        start = time.time()
+        problem = region_problem(data.shape[1], offset, end, sample_rate)
+        loop = None
+        quality = None
+        if problem is None:
+            region_data = data[:, offset:end]
+            sustain_length = sustain_end(region_data, sample_rate)
+            try:
+                loop = find_loop_points(
+                    region_data,
+                    sample_rate,
+                    end=sustain_length,
+                    sustain_window=sustain_window,
+                    strategy=strategy,
+                )
+            except ValueError as e:
+                problem = str(e)
+            else:
+                if loop is None:
+                    problem = "no loop found"
+        if loop is not None:
+            quality = loop_quality(region_data[0], loop[0], loop[1],
+                                   sample_rate)
+            loop = (loop[0] + offset, loop[1] + offset)
+        results.append(RegionLoop(
+            index, loop, quality, time.time() - start, problem))
+    return path, results, decode_seconds, None
+
+
+def looping_tasks(sfzfiles, strategy, sustain_window):
+    """
+    Group the regions of ``sfzfiles`` (path to SFZFile) by the sample
+    file they play. Returns (tasks for loop_sample, a map of each
+    region's index to its Region).
+    """
+    by_sample = {}
+    regions = {}
+    for filename, sfz in sfzfiles:
+        for group in sfz.groups:
+            for region in group.regions:
+                attributes = region.merge(group.attributes).attributes
+                if 'sample' not in attributes:
+                    continue
+                index = len(regions)
+                regions[index] = region
+                path = full_path(filename, attributes['sample'])
+                by_sample.setdefault(path, []).append(
+                    (index,) + region_bounds(attributes))
+    tasks = [
+        (path, sample_regions, strategy, sustain_window)
+        for path, sample_regions in sorted(by_sample.iteritems())
+    ]
+    return tasks, regions
+
+
+def apply_loop(region, loop):
+    region.attributes.update({
+        'loop_mode': 'loop_continuous',
+        'loop_start': loop[0],
+        'loop_end': loop[1],
+    })
+
+
+def write_sfz(filename, sfz):
+    tmp_path = filename + '.tmp'
+    with open(tmp_path, 'w') as f:
+        f.write("\n".join([str(group) for group in sfz.groups]))
+    os.rename(tmp_path, filename)
+
+
+def reloop(
+    filenames,
+    strategy=DEFAULT_LOOP_STRATEGY,
+    sustain_window=SUSTAIN_WINDOW,
+    workers=None,
+    dry_run=False,
+):
+    """
+    Re-loop every region of the SFZ files at ``filenames`` across
+    ``workers`` processes (one per core by default), printing each
+    region's loop, quality and timing. Returns the mean quality of the
+    loops found, or None if none were.
+    """
+    sfzfiles = [
+        (filename, SFZFile(open(filename).read()))
+        for filename in filenames
+    ]
+    tasks, regions = looping_tasks(sfzfiles, strategy, sustain_window)
+
+    start = time.time()
+    pool = multiprocessing.Pool(workers or multiprocessing.cpu_count())
+    qualities = []
+    failed = 0
+    try:
+        for path, results, decode_seconds, error in pool.imap_unordered(
+                loop_sample, tasks):
+            name = os.path.basename(path)
+            if error is not None:
+                print "%s: could not read: %s" % (name, error)
+                failed += 1
+                continue
+            print "%s: decoded in %2.2fs" % (name, decode_seconds)
+            for result in results:
+                if result.loop is None:
+                    print "\t%s (%2.2fs)" % (result.problem, result.seconds)
+                    continue
+                print "\tloop %d-%d, quality %2.3f (%2.2fs)" % (
+                    result.loop[0], result.loop[1], result.quality,
+                    result.seconds)
+                qualities.append(result.quality)
+                apply_loop(regions[result.index], result.loop)
+    finally:
+        pool.close()
+        pool.join()
+
+    print "Looped %d of %d regions from %d samples in %2.2fs%s." % (
+        len(qualities), len(regions), len(tasks) - failed,
+        time.time() - start,
+        ", mean quality %2.3f" % (sum(qualities) / len(qualities))
+        if qualities else "")
+
+    if not dry_run:
+        for filename, sfz in sfzfiles:
+            write_sfz(filename, sfz)
+    if qualities:
+        return sum(qualities) / len(qualities)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='find new loop points for the samples of SFZ files'
+    )
+    parser.add_argument('files', type=str, help='files to process', nargs='+')
+    parser.add_argument(
+        '--loop-strategy', type=str, default=DEFAULT_LOOP_STRATEGY,
+        choices=sorted(LOOP_STRATEGIES),
+        help='how to search for loop points')
+    parser.add_argument(
+        '--sustain-window', type=float, nargs=2, default=SUSTAIN_WINDOW,
+        metavar=('START', 'END'),
+        help='the fractions of each region, up to its release, to search '
+        'for loops, to keep loops out of attacks')
+    parser.add_argument(
+        '--workers', type=int, default=None,
+        help='how many processes to loop samples in (default: one per '
+        'core)')
+    parser.add_argument(
+        '--dry-run', action='store_true', dest='dry_run',
+        help='print the loops found without rewriting the SFZ files')
+    args = parser.parse_args()
+
+    if reloop(
+        args.files,
+        strategy=args.loop_strategy,
+        sustain_window=tuple(args.sustain_window),
+        workers=args.workers,
+        dry_run=args.dry_run,
+    ) is None:
+        sys.exit(1)
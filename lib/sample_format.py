@@ -0,0 +1,99 @@
+import numpy
+
+WAVE_FORMAT_PCM = 1
+WAVE_FORMAT_IEEE_FLOAT = 3
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+
+class SampleFormat(object):
+    """
+    How samples of one format are captured, held in memory and stored.
+
+    ``dtype`` is the in-memory type, ``sample_width`` the number of bytes
+    per sample on the wire and on disk, and ``full_scale`` the magnitude
+    of a 0 dBFS sample. decode() and encode() convert between interleaved
+    little-endian bytes and flat arrays of ``dtype``.
+    """
+
+    def __init__(
+        self,
+        name,
+        dtype,
+        sample_width,
+        full_scale,
+        pyaudio_format,
+        wave_format_tag=WAVE_FORMAT_PCM,
+    ):
+        self.name = name
+        self.dtype = numpy.dtype(dtype)
+        self.sample_width = sample_width
+        self.full_scale = full_scale
+        # The name of the matching constant in the pyaudio module.
+        self.pyaudio_format = pyaudio_format
+        self.wave_format_tag = wave_format_tag
+
+    @property
+    def bits_per_sample(self):
+        return self.sample_width * 8
+
+    def decode(self, raw):
+        return numpy.frombuffer(
+            raw, dtype=self.dtype.newbyteorder('<')
+        ).astype(self.dtype, copy=False)
+
+    def encode(self, samples):
+        return numpy.asarray(
+            samples
+        ).astype(self.dtype.newbyteorder('<'), copy=False).tostring()
+
+    def __repr__(self):
+        return "<SampleFormat %s>" % self.name
+
+
+class PackedInt24Format(SampleFormat):
+    """
+    24-bit samples, packed into three bytes each on the wire and on disk,
+    and held in memory as int32s in [-2 ** 23, 2 ** 23).
+    """
+
+    def __init__(self):
+        super(PackedInt24Format, self).__init__(
+            'int24', numpy.int32, 3, float(2 ** 23), 'paInt24')
+
+    def decode(self, raw):
+        packed = numpy.frombuffer(raw, dtype=numpy.uint8).reshape((-1, 3))
+        # Put each sample's three bytes in the high bytes of an int32,
+        # then shift back down to sign-extend.
+        padded = numpy.zeros((len(packed), 4), dtype=numpy.uint8)
+        padded[:, 1:] = packed
+        return padded.view('<i4').reshape(-1) >> 8
+
+    def encode(self, samples):
+        wide = numpy.ascontiguousarray(samples, dtype='<i4').reshape(-1)
+        return wide.view(numpy.uint8).reshape((-1, 4))[:, :3].tostring()
+
+
+INT16 = SampleFormat('int16', numpy.int16, 2, float(2 ** 15), 'paInt16')
+INT24 = PackedInt24Format()
+FLOAT32 = SampleFormat(
+    'float32', numpy.float32, 4, 1.0, 'paFloat32', WAVE_FORMAT_IEEE_FLOAT)
+
+FORMATS = dict((f.name, f) for f in (INT16, INT24, FLOAT32))
+
+
+def by_name(name):
+    try:
+        return FORMATS[name]
+    except KeyError:
+        raise ValueError("Unknown sample format '%s'; expected one of: %s" % (
+            name, ", ".join(sorted(FORMATS))))
+
+
+def by_wave_format(format_tag, sample_width):
+    for sample_format in FORMATS.values():
+        if sample_format.wave_format_tag == format_tag and \
+                sample_format.sample_width == sample_width:
+            return sample_format
+    raise ValueError(
+        "Unsupported WAV format %d with %d-byte samples." % (
+            format_tag, sample_width))
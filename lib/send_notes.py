@@ -1,25 +1,43 @@
 import os
 import time
+from collections import deque
 from tqdm import tqdm
-from record import save_to_file, get_input_device_name_by_index
-from sfzparser import SFZFile, Region
-from pitch import compute_zones, Zone
-from utils import trim_data, \
-    note_name, \
-    first_non_none, \
-    warn_on_clipping
-from constants import bit_depth, SAMPLE_RATE
+from record import save_to_file, AudioSession
+from backends import HardwareBackend
+from sfzparser import Region
+from journal import SessionJournal
+from wavio import read_wave_file
+from pitch import compute_zones, plan_zones, Zone
+from compare import timbre_distance
+from utils import note_name, note_frequency, warn_on_clipping
+from constants import SAMPLE_RATE, SAMPLE_FORMAT
 from volume_leveler import level_volume
 from flacize import flacize_after_sampling
-from loop import find_loop_points
+from loop import find_loop_points, DEFAULT_LOOP_STRATEGY
+from pipeline import Job, WorkerPool
+from decay_model import DecayPriors
+from planner import plan_session, \
+    history_folders, \
+    sampled_keys, \
+    describe_plan, \
+    DurationModel, \
+    Progress, \
+    FALLBACK_TAIL_SECONDS
+from cache import Cache
+from range_probe import responsive_keys, \
+    prune_zones, \
+    range_cache_key, \
+    RANGE_PROBE_LIMIT, \
+    RANGE_CACHE_NAME
+from velocity_probe import probe_velocity_layers, \
+    probe_keys, \
+    louder_channel, \
+    VelocityPlan
 from midi_helpers import Midi, all_notes_off, \
-    open_midi_port, \
-    open_midi_port_by_index, \
     set_program_number, \
     CHANNEL_OFFSET
-from audio_helpers import sample_threshold_from_noise_floor, \
-    generate_sample, \
-    check_for_clipping
+from calibration import calibrate
+from audio_helpers import generate_sample
 
 VELOCITIES = [
     15, 44,
@@ -32,6 +50,23 @@ PRINT_SILENCE_WARNINGS = False
 PORTAMENTO_PRESAMPLE_LIMIT = 2.0
 PORTAMENTO_PRESAMPLE_WAIT = 1.0
 
+# Threads that trim, save, loop and level samples during later captures.
+POST_PROCESSING_WORKERS = 2
+
+# With looping, notes are released once they've been steady this long.
+LOOP_SUSTAIN = 4.0
+
+# How long each note played while probing velocity layers or timbre is
+# held.
+PROBE_LIMIT = 3.0
+
+# How far apart neighbouring samples can sound; see pitch.plan_zones.
+ADAPTIVE_ZONE_TOLERANCE = 0.25
+
+# The largest step between adaptively planned zones, unless another is
+# given. Bisecting from single keys could only ever add probes.
+ADAPTIVE_ZONE_MAX_STEP = 12
+
 # percentage - how much left/right delta can we tolerate?
 VOLUME_DIFF_THRESHOLD = 0.01
 
@@ -85,7 +120,33 @@ def all_notes(zones_to_sample, velocities, ascending=False):
 CLICK_RETRIES = 5
 
 
-def generate_and_save_sample(
+def timbre_distance_between_keys(probe, velocity, sample_rate):
+    """
+    A distance for pitch.plan_zones. ``probe`` is called once per key,
+    with (key, ``velocity``), and returns its trimmed capture or None.
+    """
+    captures = {}
+
+    def capture(key):
+        if key not in captures:
+            data = probe(key, velocity)
+            captures[key] = None if data is None else louder_channel(data)
+        return captures[key]
+
+    def distance(low, high):
+        low_data, high_data = capture(low), capture(high)
+        if low_data is None or high_data is None:
+            # Find where the instrument's range ends.
+            return 0.0 if low_data is high_data else float('inf')
+        return timbre_distance(
+            low_data, high_data,
+            note_frequency(low), note_frequency(high),
+            sample_rate,
+        )
+    return distance
+
+
+def capture_sample(
     limit,
     midiout,
     zone,
@@ -93,36 +154,145 @@ def generate_and_save_sample(
     midi_channel,
     filename,
     threshold,
-    velocity_levels,
-    looping_enabled=False,
     print_progress=False,
     audio_interface_name=None,
     sample_rate=SAMPLE_RATE,
+    session=None,
+    stream_to_disk=False,
+    decay_prior=None,
+    steady_seconds=None,
 ):
-    while True:
-        sample_width, data, release_time = generate_sample(
-            limit=limit,
-            midiout=midiout,
-            note=zone.center,
-            velocity=velocity,
-            midi_channel=midi_channel,
-            threshold=threshold,
-            print_progress=print_progress,
-            audio_interface_name=audio_interface_name,
-            sample_rate=sample_rate,
+    """Play and capture one sample; the part that needs the instrument."""
+    return generate_sample(
+        limit=limit,
+        midiout=midiout,
+        note=zone.center,
+        velocity=velocity,
+        midi_channel=midi_channel,
+        threshold=threshold,
+        print_progress=print_progress,
+        audio_interface_name=audio_interface_name,
+        sample_rate=sample_rate,
+        session=session,
+        stream_to=filename if stream_to_disk else None,
+        start_threshold=threshold * 10,
+        end_threshold=threshold,
+        decay_prior=decay_prior,
+        steady_seconds=steady_seconds,
+    )
+
+
+def process_sample(
+    recording,
+    zone,
+    velocity,
+    filename,
+    velocity_levels,
+    looping_enabled=False,
+    sample_rate=SAMPLE_RATE,
+    loop_strategy=DEFAULT_LOOP_STRATEGY,
+):
+    """
+    Trim, save and loop a captured sample, and return its region, or
+    None if the capture was silent. Safe to run on a worker thread.
+    """
+    if recording.path is not None:
+        # Already trimmed and written; only read it back if we must.
+        warn_on_clipping(
+            recording.peak,
+            full_scale=recording.sample_format.full_scale)
+        if looping_enabled:
+            data = read_wave_file(filename, True)
+    elif recording.data is not None:
+        data = recording.trimmed
+        warn_on_clipping(
+            data,
+            full_scale=recording.sample_format.full_scale)
+        save_to_file(filename, recording.sample_format, data, sample_rate)
+    else:
+        return None
+
+    if looping_enabled:
+        loop = find_loop_points(
+            data,
+            sample_rate,
+            end=recording.sustain_length,
+            strategy=loop_strategy,
         )
+    else:
+        loop = None
+    return generate_region(zone, velocity, velocity_levels, loop)
+
+
+def level_note(note_regions, output_folder):
+    """
+    Volume-level one note's regions, each of which may be a Region or
+    the Job that will produce it.
+    """
+    regions = []
+    for region in note_regions:
+        if isinstance(region, Job):
+            region = region.result()
+        if region:
+            regions.append(region)
+    if regions:
+        return level_volume(regions, output_folder)
+
+
+def collect_regions(pending, journal):
+    """
+    Move finished samples off the front of ``pending`` and into the
+    journal, in the order they were sampled.
+    """
+    while pending and pending[0][0].done:
+        job, zone, velocity, seconds = pending.popleft()
+        region = job.result()
+        if region:
+            journal.add(region, seconds)
+        elif PRINT_SILENCE_WARNINGS:
+            print("Got no sound for %s at velocity %s." % (
+                note_name(zone.center), velocity))
+
+
+def finish_program(
+    pool,
+    pending,
+    journal,
+    group_jobs,
+    velocity_plan,
+    output_folder,
+    flac=True,
+    cleanup_aif_files=True,
+):
+    """
+    Wait for a program's samples to be processed and leveled, then write
+    its SFZ files and, optionally, compress it to FLAC.
+    """
+    pool.close()
+    collect_regions(pending, journal)
+    sfzfile = os.path.join(output_folder, 'file.sfz')
+    journal.materialize(sfzfile)
+    journal.close()
+    groups = [
+        velocity_plan.apply(group)
+        for group in (job.result() for job in group_jobs)
+        if group is not None
+    ]
 
-        if data is not None:
-            data = trim_data(data, threshold * 10, threshold)
-            warn_on_clipping(data)
-            if looping_enabled:
-                loop = find_loop_points(data, SAMPLE_RATE)
-            else:
-                loop = None
-            save_to_file(filename, sample_width, data, sample_rate)
-            return generate_region(zone, velocity, velocity_levels, loop)
-        else:
-            return None
+    # Write the volume-leveled output:
+    with open(sfzfile + '.leveled.sfz', 'w') as file:
+        file.write("\n".join([str(group) for group in groups]))
+
+    if flac:
+        # Do a FLAC compression pass afterwards
+        # TODO: Do this after each note if possible
+        # would require graceful re-parsing of FLAC-combined regions
+        flacize_after_sampling(
+            output_folder,
+            groups,
+            sfzfile,
+            cleanup_aif_files=cleanup_aif_files,
+        )
 
 
 def sample_program(
@@ -144,18 +314,74 @@ def sample_program(
     cleanup_aif_files=True,
     limit=None,
     looping_enabled=False,
+    loop_strategy=DEFAULT_LOOP_STRATEGY,
     print_progress=False,
     has_portamento=False,
     sample_asc=False,
     sample_rate=SAMPLE_RATE,
+    stream_to_disk=False,
+    sample_format=SAMPLE_FORMAT,
+    backend=None,
+    workers=POST_PROCESSING_WORKERS,
+    loop_sustain=LOOP_SUSTAIN,
+    probe_velocities=False,
+    adaptive_zones=None,
+    probe_range=False,
+    reprobe_range=False,
+    dry_run=False,
+    recalibrate=False,
+    midiout=None,
+    session=None,
+    noise_model=None,
+    finisher=None,
 ):
-    if midi_port_name:
-        midiout = open_midi_port(midi_port_name)
+    """
+    Sample one program into ``output_folder``.
+
+    To sample several programs in a row, pass an open ``midiout`` and
+    ``session`` to reuse, the ``noise_model`` measured for the first
+    program, and a ``finisher`` WorkerPool to level and compress each
+    program on while the next is sampled; see batch.py. Returns the
+    calibration used and the Job that finishes the program.
+    """
+    # Remove repeated velocity levels that might exist in user input
+    temp_vel = {int(v) for v in velocity_levels}
+    # Sort velocity levels ascending
+    velocity_levels = sorted(temp_vel)
+
+    held = limit or 0
+    if looping_enabled and loop_sustain:
+        held = min(held, loop_sustain) if held else loop_sustain
+    duration_model = DurationModel.from_folders(
+        history_folders(output_folder), held + FALLBACK_TAIL_SECONDS)
+    if has_portamento:
+        presample_seconds = PORTAMENTO_PRESAMPLE_LIMIT + \
+            PORTAMENTO_PRESAMPLE_WAIT + FALLBACK_TAIL_SECONDS
     else:
-        midiout = open_midi_port_by_index(midi_port_index)
+        presample_seconds = 0
+
+    if dry_run:
+        sampled = sampled_keys(output_folder)
+        plan = plan_session(
+            compute_zones(Zone(low=low_key, high=high_key), step=key_range),
+            velocity_levels,
+            sample_asc,
+            lambda zone, velocity: (zone.center, velocity) in sampled,
+            has_portamento,
+        )
+        print(describe_plan(plan, duration_model, presample_seconds))
+        if probe_range or reprobe_range or adaptive_zones:
+            print("Probing may change which keys are sampled; this plan "
+                  "samples every %d keys from %s to %s." % (
+                      key_range, note_name(low_key), note_name(high_key)))
+        return
+
+    backend = backend or HardwareBackend()
+    if midiout is None:
+        midiout = backend.open_midi_output(midi_port_name, midi_port_index)
 
     if not audio_interface_name:
-        audio_interface_name = get_input_device_name_by_index(
+        audio_interface_name = backend.input_device_name(
             audio_interface_index)
 
     path_prefix = output_folder
@@ -170,14 +396,7 @@ def sample_program(
     except OSError:
         pass
 
-    sfzfile = os.path.join(path_prefix, 'file.sfz')
-    try:
-        regions = sum([group.regions
-                       for group in SFZFile(open(sfzfile).read()).groups],
-                      [])
-        regions = [region for region in regions if region.exists(path_prefix)]
-    except IOError:
-        regions = []
+    journal = SessionJournal.for_folder(path_prefix)
 
     midi = Midi(midiout, channel=midi_channel)
     for cc in cc_before or []:  # Send out MIDI controller changes
@@ -186,43 +405,114 @@ def sample_program(
     for cc in cc_after or []:   # Send out MIDI controller changes
         midi.cc(cc[0], cc[1])
 
-    threshold = sample_threshold_from_noise_floor(
-        bit_depth,
-        audio_interface_name
-    )
+    owns_session = session is None
+    if owns_session:
+        session = AudioSession(
+            audio_interface_name,
+            sample_rate,
+            sample_format,
+            backend=backend,
+        ).open()
 
-    check_for_clipping(
+    calibration = calibrate(
         midiout,
         midi_channel,
-        threshold,
-        bit_depth,
-        audio_interface_name
+        audio_interface_name,
+        session,
+        sample_rate,
+        program_number,
+        recalibrate=recalibrate,
+        noise_model=noise_model,
+        midi_port=midi_port_name or midi_port_index,
+        cc_before=cc_before,
+        cc_after=cc_after,
     )
+    session.noise_model = calibration.noise_model
+    threshold = session.noise_model.threshold
 
-    # Remove repeated velocity levels that might exist in user input
-    temp_vel = {int(v) for v in velocity_levels}
-    # Sort velocity levels ascending
-    velocity_levels = sorted(temp_vel)
-
-    groups = []
     note_regions = []
+    pending = deque()
+    group_jobs = []
+    decay_priors = DecayPriors()
+    pool = WorkerPool(workers)
 
-    zones_to_sample = compute_zones(
-        Zone(low=low_key, high=high_key), step=key_range)
+    def probe(note, velocity, limit=PROBE_LIMIT):
+        return generate_sample(
+            limit=limit,
+            midiout=midiout,
+            note=note,
+            velocity=velocity,
+            midi_channel=midi_channel,
+            threshold=threshold,
+            audio_interface_name=audio_interface_name,
+            sample_rate=sample_rate,
+            session=session,
+        ).trimmed
+
+    if probe_range or reprobe_range:
+        # Only a known program can be looked up again later.
+        if program_number is not None:
+            range_cache = Cache(RANGE_CACHE_NAME)
+            range_key = range_cache_key(
+                midi_port_name or midi_port_index,
+                program_number, cc_before, cc_after)
+            if reprobe_range:
+                range_cache.delete(range_key)
+        else:
+            range_cache = range_key = None
+        keys = responsive_keys(
+            lambda key: probe(
+                key, velocity_levels[-1], RANGE_PROBE_LIMIT) is not None,
+            range(low_key, high_key + 1),
+            range_cache,
+            range_key,
+        )
+        if not keys:
+            raise Exception(
+                "No keys from %s to %s made a sound." % (
+                    note_name(low_key), note_name(high_key)))
+        low_key, high_key = keys[0], keys[-1]
+    else:
+        keys = None
+
+    if adaptive_zones:
+        zones_to_sample = plan_zones(
+            Zone(low=low_key, high=high_key),
+            timbre_distance_between_keys(
+                probe, velocity_levels[-1], sample_rate),
+            adaptive_zones,
+            max_step=key_range,
+        )
+        print("Planned %d zones: %s" % (len(zones_to_sample), ", ".join(
+            note_name(zone.center) for zone in zones_to_sample)))
+    else:
+        zones_to_sample = compute_zones(
+            Zone(low=low_key, high=high_key), step=key_range)
+    if keys is not None:
+        zones_to_sample = prune_zones(zones_to_sample, keys)
+
+    if probe_velocities:
+        velocity_plan = probe_velocity_layers(
+            probe, probe_keys(zones_to_sample), velocity_levels)
+        velocity_levels = velocity_plan.velocity_levels
+    else:
+        velocity_plan = VelocityPlan(velocity_levels)
 
-    for zone, velocity, done_note in tqdm(list(all_notes(
+    plan = plan_session(
         zones_to_sample,
         velocity_levels,
-        sample_asc
-    ))):
-        already_sampled_region = first_non_none([
-            region for region in regions
-            if region.attributes['hivel'] == str(velocity) and
-            region.attributes.get(
-                'key', region.attributes.get(
-                    'pitch_keycenter', None
-                )) == str(zone.center)])
-        if already_sampled_region is None:
+        sample_asc,
+        lambda zone, velocity: journal.get(zone.center, velocity) is not None,
+        has_portamento,
+    )
+    planned_seconds = [
+        duration_model.note_seconds(note, presample_seconds) for note in plan]
+    print(describe_plan(plan, duration_model, presample_seconds))
+    progress = Progress(sum(planned_seconds))
+
+    for note, note_seconds in tqdm(zip(plan, planned_seconds)):
+        zone, velocity = note.zone, note.velocity
+        if not note.sampled:
             filename = os.path.join(
                 path_prefix, filename_for(zone.center, velocity))
 
@@ -230,8 +520,8 @@ def sample_program(
                 print("Sampling %s at velocity %s..." % (
                     note_name(zone.center), velocity))
 
-            if has_portamento:
-                sample_width, data, release_time = generate_sample(
+            if note.presample:
+                generate_sample(
                     limit=PORTAMENTO_PRESAMPLE_LIMIT,
                     midiout=midiout,
                     note=zone.center,
@@ -241,12 +531,14 @@ def sample_program(
                     print_progress=print_progress,
                     audio_interface_name=audio_interface_name,
                     sample_rate=sample_rate,
+                    session=session,
                 )
                 time.sleep(PORTAMENTO_PRESAMPLE_WAIT)
 
-            for attempt in xrange(0, MAX_ATTEMPTS):
+            for attempt in xrange(0, max_attempts):
+                started = time.time()
                 try:
-                    region = generate_and_save_sample(
+                    recording = capture_sample(
                         limit=limit,
                         midiout=midiout,
                         zone=zone,
@@ -254,45 +546,73 @@ def sample_program(
                         midi_channel=midi_channel,
                         filename=filename,
                         threshold=threshold,
-                        velocity_levels=velocity_levels,
-                        looping_enabled=looping_enabled,
                         print_progress=print_progress,
                         audio_interface_name=audio_interface_name,
                         sample_rate=sample_rate,
+                        session=session,
+                        stream_to_disk=stream_to_disk,
+                        decay_prior=decay_priors.prior_for(
+                            zone.center, velocity),
+                        steady_seconds=(
+                            loop_sustain if looping_enabled else None),
                     )
-                    if region:
-                        regions.append(region)
-                        note_regions.append(region)
-                        with open(sfzfile, 'w') as file:
-                            file.write("\n".join([str(r) for r in regions]))
-                    elif PRINT_SILENCE_WARNINGS:
-                        print("Got no sound for %s at velocity %s." % (
-                            note_name(zone.center), velocity))
                 except IOError:
                     pass
                 else:
+                    decay_priors.add(
+                        zone.center, velocity, recording.decay_rate)
+                    # Trim, save and loop on a worker while the next note
+                    # is captured.
+                    job = pool.submit(
+                        process_sample,
+                        recording,
+                        zone,
+                        velocity,
+                        filename,
+                        velocity_levels,
+                        looping_enabled=looping_enabled,
+                        sample_rate=sample_rate,
+                        loop_strategy=loop_strategy,
+                    )
+                    pending.append(
+                        (job, zone, velocity, time.time() - started))
+                    note_regions.append(job)
                     break
             else:
                 print("Could not sample %s at vel %s: too many IOErrors." % (
                     note_name(zone.center), velocity))
         else:
-            note_regions.append(already_sampled_region)
+            note_regions.append(journal.get(zone.center, velocity))
+        progress.advance(note_seconds)
 
-        if done_note and len(note_regions) > 0:
-            groups.append(level_volume(note_regions, output_folder))
+        if note.done_note and len(note_regions) > 0:
+            group_jobs.append(
+                pool.submit(level_note, note_regions, output_folder))
             note_regions = []
-
-    # Write the volume-leveled output:
-    with open(sfzfile + '.leveled.sfz', 'w') as file:
-        file.write("\n".join([str(group) for group in groups]))
-
-    if flac:
-        # Do a FLAC compression pass afterwards
-        # TODO: Do this after each note if possible
-        # would require graceful re-parsing of FLAC-combined regions
-        flacize_after_sampling(
-            output_folder,
-            groups,
-            sfzfile,
-            cleanup_aif_files=cleanup_aif_files,
-        )
+            if not note.sampled:
+                print("Finished %s: %s" % (
+                    note_name(zone.center), progress.report()))
+
+        collect_regions(pending, journal)
+
+    if owns_session:
+        session.close()
+        print(session.timing_report())
+
+    finish_args = (
+        pool,
+        pending,
+        journal,
+        group_jobs,
+        velocity_plan,
+        output_folder,
+        flac,
+        cleanup_aif_files,
+    )
+    if finisher is not None:
+        finished = finisher.submit(finish_program, *finish_args)
+    else:
+        finished = Job(finish_program, finish_args)
+        finished.run()
+        finished.result()
+    return calibration, finished
@@ -0,0 +1,83 @@
+import numpy
+
+# Frames of audio in each spectrum; about 85ms at 48kHz.
+ANALYSIS_SIZE = 4096
+# How far a spectrum's shape (its unit-normalized magnitudes) may drift
+# from the start of a steady stretch, and how far its level may drift,
+# before the stretch is over.
+FLUX_THRESHOLD = 0.15
+LEVEL_TOLERANCE_DB = 1.5
+# Near-silence is steady too, but there's nothing there to loop.
+MIN_LEVEL_ABOVE_FLOOR_DB = 20.0
+
+
+class SteadyStateDetector(object):
+    """
+    Watches a held note, chunk by chunk, for the point where it stops
+    changing, so it can be released as soon as there's enough stable
+    sustain to loop instead of being held for the full limit.
+
+    Each spectrum and level is compared against those at the start of
+    the current steady stretch rather than the previous chunk, so a slow
+    drift (like a decay) still ends the stretch.
+    """
+
+    def __init__(
+        self,
+        sample_rate,
+        required_seconds,
+        full_scale,
+        floor_db=-numpy.inf,
+        size=ANALYSIS_SIZE,
+    ):
+        self.required = int(required_seconds * sample_rate)
+        self.full_scale = float(full_scale)
+        self.min_level_db = floor_db + MIN_LEVEL_ABOVE_FLOOR_DB
+        self.buffer = numpy.zeros(size)
+        self.window = numpy.hanning(size)
+        self.filled = 0
+        self.position = 0
+        self.reference = None
+        self.reference_db = None
+        self.stable_since = None
+
+    def update(self, chunk):
+        """Account for the next (channels, frames) chunk of the capture."""
+        mono = numpy.mean(chunk, 0, dtype=numpy.float64) / self.full_scale
+        size = len(self.buffer)
+        if len(mono) >= size:
+            self.buffer[:] = mono[-size:]
+        else:
+            self.buffer[:-len(mono)] = self.buffer[len(mono):]
+            self.buffer[-len(mono):] = mono
+        self.filled += len(mono)
+        self.position += len(mono)
+        if self.filled < size:
+            return
+
+        power = numpy.mean(self.buffer ** 2)
+        level_db = 10 * numpy.log10(power) if power else -numpy.inf
+        if level_db < self.min_level_db:
+            self.reference = self.stable_since = None
+            return
+
+        spectrum = numpy.absolute(numpy.fft.rfft(self.buffer * self.window))
+        spectrum /= numpy.linalg.norm(spectrum)
+        if self.reference is None or \
+                numpy.linalg.norm(spectrum - self.reference) > \
+                FLUX_THRESHOLD or \
+                abs(level_db - self.reference_db) > LEVEL_TOLERANCE_DB:
+            self.reference = spectrum
+            self.reference_db = level_db
+            self.stable_since = self.position
+
+    @property
+    def stable_length(self):
+        """How many frames the current steady stretch has lasted."""
+        if self.stable_since is None:
+            return 0
+        return self.position - self.stable_since
+
+    @property
+    def ready(self):
+        return self.stable_length >= self.required
@@ -31,14 +31,23 @@ def note_number(note_name):
     return C0_OFFSET + NOTE_NAMES.index(name) + (12 * octave_number)
 
 
+def note_frequency(note):
+    """The frequency in Hz of a MIDI note number, with A4 at 440Hz."""
+    return 440.0 * 2 ** ((note - 69) / 12.0)
+
+
 def two_ints(value):
     """Type for argparse. Demands 2 integers separated by a comma."""
     key, val = value.split(',')
     return (int(key), int(val))
 
 
-def warn_on_clipping(data, threshold=0.9999):
-    if numpy.amax(numpy.absolute(data)) > ((2 ** (bit_depth - 1)) * threshold):
+def warn_on_clipping(
+    data,
+    threshold=0.9999,
+    full_scale=float(2 ** (bit_depth - 1)),
+):
+    if numpy.amax(numpy.absolute(data)) > (full_scale * threshold):
         print("WARNING: Clipping detected!")
 
 
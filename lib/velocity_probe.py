@@ -0,0 +1,115 @@
+"""
+Find out, before a full run, whether an instrument's velocity layers are
+worth sampling separately.
+
+The quietest and loudest velocities are captured on a few keys and
+compared. If every pair has the same timbre and the same envelope shape,
+velocity only changes the gain, so one layer plus an amp_velcurve
+sounds the same as all of them.
+"""
+
+import numpy
+from compare import aligned_sublists, \
+    envelope_difference, \
+    peak_diff, \
+    spectral_distance
+from utils import note_name, percent_to_db
+
+# How many keys, spread across the range, are probed.
+PROBE_KEYS = 3
+# Beyond these, two layers are considered different sounds.
+MAX_SPECTRAL_DISTANCE = 0.1
+MAX_ENVELOPE_DIFFERENCE = 0.05
+
+
+def probe_keys(zones, count=PROBE_KEYS):
+    """The centers of ``count`` zones spread evenly across ``zones``."""
+    centers = sorted(zone.center for zone in zones)
+    if len(centers) <= count:
+        return centers
+    indices = numpy.linspace(0, len(centers) - 1, count)
+    return sorted(set(centers[int(round(i))] for i in indices))
+
+
+def louder_channel(data):
+    return data[numpy.argmax(numpy.amax(numpy.absolute(data), 1))]
+
+
+def compare_layers(quiet, loud):
+    """
+    Compare two captures of the same key at different velocities.
+    Returns (spectral distance, envelope difference, gain of the quiet
+    layer relative to the loud one).
+    """
+    quiet_channel, loud_channel = aligned_sublists(
+        louder_channel(quiet), louder_channel(loud))
+    return (
+        spectral_distance(quiet_channel, loud_channel),
+        envelope_difference(quiet_channel, loud_channel),
+        peak_diff(numpy.absolute(quiet), numpy.absolute(loud)),
+    )
+
+
+class VelocityPlan(object):
+    """
+    Which velocity layers to sample and, if they were collapsed into
+    one, the amp_velcurve (velocity to gain) that stands in for them.
+    """
+
+    def __init__(self, velocity_levels, velcurve=None):
+        self.velocity_levels = velocity_levels
+        self.velcurve = velcurve
+
+    @property
+    def collapsed(self):
+        return self.velcurve is not None
+
+    def apply(self, group):
+        """Give a leveled group the measured velcurve, if collapsed."""
+        if self.collapsed and group is not None:
+            group.attributes = dict(
+                ('amp_velcurve_%d' % velocity, gain)
+                for velocity, gain in self.velcurve.iteritems()
+            )
+        return group
+
+    def __repr__(self):
+        return "<VelocityPlan velocity_levels=%s velcurve=%s>" % (
+            self.velocity_levels, self.velcurve)
+
+
+def probe_velocity_layers(capture, keys, velocity_levels):
+    """
+    Decide which of ``velocity_levels`` to sample. ``capture`` is called
+    with (note, velocity) and returns the trimmed (channels, frames)
+    capture, or None if it was silent.
+    """
+    velocity_levels = sorted(velocity_levels)
+    if len(velocity_levels) < 2:
+        return VelocityPlan(velocity_levels)
+    lowest, highest = velocity_levels[0], velocity_levels[-1]
+
+    gains = []
+    for key in keys:
+        quiet = capture(key, lowest)
+        loud = capture(key, highest)
+        if quiet is None or loud is None:
+            print "Probing %s: got silence; keeping all layers." % (
+                note_name(key))
+            return VelocityPlan(velocity_levels)
+        distance, envelope, gain = compare_layers(quiet, loud)
+        print "Probing %s: spectral distance %2.3f, envelope " \
+            "difference %2.3f, velocity %d is %2.2f dB quieter." % (
+                note_name(key), distance, envelope, lowest,
+                -percent_to_db(gain))
+        if distance > MAX_SPECTRAL_DISTANCE or \
+                envelope > MAX_ENVELOPE_DIFFERENCE:
+            print "Velocity changes the sound; sampling all %d layers." % (
+                len(velocity_levels))
+            return VelocityPlan(velocity_levels)
+        gains.append(gain)
+
+    gain = float(numpy.mean(gains))
+    print "Velocity only changes gain; sampling 1 layer instead of %d." % (
+        len(velocity_levels))
+    return VelocityPlan([highest], {lowest: gain, highest: 1})
@@ -0,0 +1,282 @@
+"""
+An in-process synthesizer that stands in for a MIDI instrument and the
+audio interface it's plugged into, so the whole sampling pipeline can be
+run, benchmarked and profiled without any hardware.
+"""
+
+import threading
+import time
+import numpy
+
+from backends import PA_CONTINUE
+from utils import note_frequency
+
+NOTE_OFF = 0x80
+NOTE_ON = 0x90
+CONTROL_CHANGE = 0xB0
+PROGRAM_CHANGE = 0xC0
+
+ALL_NOTES_OFF = 0x7B
+
+VIRTUAL_INSTRUMENT_NAME = 'Virtual Instrument'
+
+
+class Voice(object):
+    """One sounding note, and where it is in its envelope."""
+
+    def __init__(self, note, velocity, midi_channel, start_frame):
+        self.note = note
+        self.velocity = velocity
+        self.midi_channel = midi_channel
+        self.start_frame = start_frame
+        self.release_frame = None
+
+
+class VirtualInstrument(object):
+    """
+    A deterministic additive synth, usable anywhere a backend is.
+
+    Each note is a stack of harmonics (``harmonics`` are their relative
+    amplitudes) shaped by a linear attack, an exponential decay towards
+    ``sustain``, and an exponential release after note off, all in
+    seconds. Keys outside ``low_key``-``high_key`` are silent, and a
+    constant, seeded noise floor of ``noise_floor`` (as a fraction of
+    full scale) is always present. Program changes rebalance the
+    harmonics, so different programs sound different.
+
+    Audio is generated on its own thread, ``speed`` times faster than
+    real time. With more than two input channels, MIDI channel N plays
+    into inputs 2N - 1 and 2N (counting from 1), as if one stereo module
+    were plugged in per channel pair; otherwise every channel plays into
+    every input.
+    """
+
+    def __init__(
+        self,
+        speed=1.0,
+        harmonics=(1.0, 0.5, 0.33, 0.25, 0.2),
+        attack=0.005,
+        decay=0.4,
+        sustain=0.3,
+        release=0.3,
+        noise_floor=0.0001,
+        low_key=0,
+        high_key=127,
+        velocity_sensitivity=1.0,
+        level=0.5,
+        seed=0,
+    ):
+        self.speed = speed
+        self.harmonics = harmonics
+        self.attack = attack
+        self.decay = decay
+        self.sustain = sustain
+        self.release = release
+        self.noise_floor = noise_floor
+        self.low_key = low_key
+        self.high_key = high_key
+        self.velocity_sensitivity = velocity_sensitivity
+        self.level = level
+        self.seed = seed
+        self.program = 0
+        self.frame = 0
+        self.voices = []
+        self.lock = threading.Lock()
+        self.messages_received = 0
+
+    # Backend methods; see backends.py.
+
+    def open_midi_output(self, midi_port_name=None, midi_port_index=None):
+        return self
+
+    def input_device_name(self, audio_interface_index):
+        return VIRTUAL_INSTRUMENT_NAME
+
+    def open_audio_input(
+        self,
+        audio_interface_name,
+        num_channels,
+        sample_rate,
+        sample_format,
+        frames_per_buffer,
+        callback,
+    ):
+        return VirtualInput(
+            self,
+            num_channels,
+            sample_rate,
+            sample_format,
+            frames_per_buffer,
+            callback,
+        )
+
+    # MIDI input.
+
+    def send_message(self, message):
+        status, data1, data2 = (list(message) + [0, 0])[:3]
+        kind = status & 0xF0
+        midi_channel = (status & 0x0F) + 1
+        self.messages_received += 1
+        with self.lock:
+            if kind == NOTE_ON and data1 < 128 and data2 > 0:
+                self.voices.append(
+                    Voice(data1, data2, midi_channel, self.frame))
+            elif kind == NOTE_OFF or (kind == NOTE_ON and data1 < 128):
+                self.release_voices(
+                    midi_channel, lambda voice: voice.note == data1)
+            elif kind == CONTROL_CHANGE and data1 == ALL_NOTES_OFF:
+                self.release_voices(midi_channel, lambda voice: True)
+            elif kind == PROGRAM_CHANGE:
+                self.program = data1
+
+    def release_voices(self, midi_channel, matches):
+        for voice in self.voices:
+            if voice.midi_channel == midi_channel and \
+                    voice.release_frame is None and matches(voice):
+                voice.release_frame = self.frame
+
+    # Synthesis.
+
+    def harmonic_amplitudes(self):
+        """Darker for even programs, brighter for odd ones."""
+        tilt = 1.0 + (self.program % 4) * 0.5
+        if self.program % 2:
+            tilt = 1.0 / tilt
+        return [
+            amplitude ** tilt for amplitude in self.harmonics
+        ]
+
+    def envelope(self, voice, frames, sample_rate):
+        """The amplitude of ``voice`` at each of the absolute ``frames``."""
+        t = (frames - voice.start_frame) / float(sample_rate)
+        env = numpy.where(
+            t < self.attack,
+            t / self.attack,
+            self.sustain + (1.0 - self.sustain) * numpy.exp(
+                -(t - self.attack) / self.decay),
+        )
+        if voice.release_frame is not None:
+            release_t = (
+                voice.release_frame - voice.start_frame) / float(sample_rate)
+            if release_t < self.attack:
+                at_release = release_t / self.attack
+            else:
+                at_release = self.sustain + (1.0 - self.sustain) * numpy.exp(
+                    -(release_t - self.attack) / self.decay)
+            released = frames >= voice.release_frame
+            env[released] = at_release * numpy.exp(
+                -(frames[released] - voice.release_frame) /
+                float(sample_rate) / self.release)
+        return env
+
+    def gain(self, voice):
+        if not self.low_key <= voice.note <= self.high_key:
+            return 0.0
+        return self.level * (
+            voice.velocity / 127.0) ** self.velocity_sensitivity
+
+    def render(self, num_frames, num_channels, sample_rate, noise):
+        """Render the next ``num_frames`` as (channels, frames) floats."""
+        out = numpy.empty((num_channels, num_frames))
+        out[:] = noise.uniform(
+            -self.noise_floor, self.noise_floor, (num_channels, num_frames))
+
+        with self.lock:
+            frames = numpy.arange(self.frame, self.frame + num_frames)
+            amplitudes = self.harmonic_amplitudes()
+            nyquist = sample_rate / 2.0
+            finished = []
+            for voice in self.voices:
+                env = self.envelope(voice, frames, sample_rate) * \
+                    self.gain(voice)
+                if voice.release_frame is not None and \
+                        env[-1] < self.noise_floor / 10:
+                    finished.append(voice)
+                t = (frames - voice.start_frame) / float(sample_rate)
+                frequency = note_frequency(voice.note)
+                tone = numpy.zeros(num_frames)
+                for k, amplitude in enumerate(amplitudes, 1):
+                    if frequency * k >= nyquist:
+                        break
+                    tone += amplitude * numpy.sin(
+                        2 * numpy.pi * frequency * k * t)
+                tone *= env / sum(amplitudes)
+                if num_channels > 2:
+                    first = 2 * (voice.midi_channel - 1)
+                    out[first:first + 2] += tone
+                else:
+                    out += tone
+            for voice in finished:
+                self.voices.remove(voice)
+            self.frame += num_frames
+        return out
+
+
+class VirtualInput(object):
+    """
+    An audio input stream of a VirtualInstrument, delivering chunks to a
+    PyAudio-style callback from its own thread.
+    """
+
+    def __init__(
+        self,
+        instrument,
+        num_channels,
+        sample_rate,
+        sample_format,
+        frames_per_buffer,
+        callback,
+    ):
+        self.instrument = instrument
+        self.num_channels = num_channels
+        self.sample_rate = sample_rate
+        self.sample_format = sample_format
+        self.frames_per_buffer = frames_per_buffer
+        self.callback = callback
+        self.noise = numpy.random.RandomState(instrument.seed)
+        self.running = True
+        self.closed = False
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def next_chunk(self):
+        samples = self.instrument.render(
+            self.frames_per_buffer,
+            self.num_channels,
+            self.sample_rate,
+            self.noise,
+        )
+        full_scale = self.sample_format.full_scale
+        if self.sample_format.dtype.kind == 'i':
+            samples = numpy.clip(
+                numpy.round(samples * full_scale),
+                -full_scale, full_scale - 1)
+        return self.sample_format.encode(samples.T)
+
+    def run(self):
+        interval = self.frames_per_buffer / (
+            float(self.sample_rate) * self.instrument.speed)
+        deadline = time.time()
+        while not self.closed:
+            if self.running:
+                if self.callback(
+                    self.next_chunk(), self.frames_per_buffer, {}, 0
+                )[1] != PA_CONTINUE:
+                    break
+            deadline += interval
+            delay = deadline - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                deadline = time.time()
+
+    def stop_stream(self):
+        self.running = False
+
+    def start_stream(self):
+        self.running = True
+
+    def close(self):
+        self.closed = True
+        self.thread.join()
@@ -1,19 +1,27 @@
 import os
 import wave
 import numpy
+import struct
 import subprocess
 
-from constants import NUMPY_DTYPE
+from sample_format import INT16, \
+    by_wave_format, \
+    WAVE_FORMAT_PCM, \
+    WAVE_FORMAT_EXTENSIBLE
 
+# The rest of the GUID that WAVE_FORMAT_EXTENSIBLE's SubFormat starts with
+# the format tag of.
+EXTENSIBLE_GUID_TAIL = \
+    '\x00\x00\x00\x00\x10\x00\x80\x00\x00\xaa\x00\x38\x9b\x71'
 
-def read_flac_file(filename, use_numpy=False):
-    tempfile = filename + '.tmp.wav'
+
+def decode_flac_file(filename, output_filename):
     commandline = [
         'ffmpeg',
         '-y',
         '-i',
         filename,
-        tempfile
+        output_filename
     ]
     # sys.stderr.write("Calling '%s'...\n" % ' '.join(commandline))
     subprocess.call(
@@ -21,22 +29,311 @@ def read_flac_file(filename, use_numpy=False):
         stdout=open('/dev/null', 'w'),
         stderr=open('/dev/null', 'w')
     )
+
+
+def read_flac_file(filename, use_numpy=False):
+    tempfile = filename + '.tmp.wav'
+    decode_flac_file(filename, tempfile)
     result = read_wave_file(tempfile, use_numpy)
     os.unlink(tempfile)
     return result
 
 
+class WaveHeader(object):
+    """The parts of a WAV file's header that we need to read its data."""
+
+    def __init__(
+        self,
+        sample_format,
+        num_channels,
+        sample_rate,
+        data_offset,
+        data_size,
+        fact_offset=None,
+    ):
+        self.sample_format = sample_format
+        self.num_channels = num_channels
+        self.sample_rate = sample_rate
+        self.data_offset = data_offset
+        self.data_size = data_size
+        # Where the frame count of the fact chunk is, if there is one.
+        self.fact_offset = fact_offset
+
+    @property
+    def block_align(self):
+        return self.num_channels * self.sample_format.sample_width
+
+    @property
+    def num_frames(self):
+        return self.data_size // self.block_align
+
+
+def read_wave_header(f):
+    """
+    Parse the RIFF header of an open WAV file, leaving ``f`` positioned
+    at the start of its sample data. Unlike the wave module, this handles
+    IEEE float and 24-bit files.
+    """
+    riff, _, wave_id = struct.unpack('<4sI4s', f.read(12))
+    if riff != 'RIFF' or wave_id != 'WAVE':
+        raise wave.Error("file does not start with RIFF/WAVE id")
+    fmt = None
+    fact_offset = None
+    while True:
+        header = f.read(8)
+        if len(header) < 8:
+            raise wave.Error("file has no data chunk")
+        chunk_id, chunk_size = struct.unpack('<4sI', header)
+        if chunk_id == 'fmt ':
+            fmt = list(struct.unpack('<HHIIHH', f.read(16)))
+            skip = chunk_size - 16
+            if fmt[0] == WAVE_FORMAT_EXTENSIBLE and chunk_size >= 40:
+                # The real format tag starts the SubFormat GUID.
+                fmt[0], = struct.unpack('<8xH', f.read(10))
+                skip -= 10
+            f.seek(skip + (chunk_size & 1), os.SEEK_CUR)
+        elif chunk_id == 'fact':
+            fact_offset = f.tell()
+            f.seek(chunk_size + (chunk_size & 1), os.SEEK_CUR)
+        elif chunk_id == 'data':
+            if fmt is None:
+                raise wave.Error("data chunk before fmt chunk")
+            format_tag, num_channels, sample_rate, _, _, bits = fmt
+            try:
+                sample_format = by_wave_format(format_tag, bits // 8)
+            except ValueError as e:
+                raise wave.Error(str(e))
+            return WaveHeader(
+                sample_format,
+                num_channels,
+                sample_rate,
+                f.tell(),
+                chunk_size,
+                fact_offset,
+            )
+        else:
+            f.seek(chunk_size + (chunk_size & 1), os.SEEK_CUR)
+
+
 def read_wave_file(filename, use_numpy=False):
     try:
-        w = wave.open(filename)
-        a = numpy.fromstring(w.readframes(9999999999), dtype=NUMPY_DTYPE)
+        with open(filename, 'rb') as f:
+            header = read_wave_header(f)
+            raw = f.read(header.num_frames * header.block_align)
+        a = header.sample_format.decode(raw)
         if use_numpy:
-            return numpy.reshape(a, (w.getnchannels(), -1), 'F')
+            return numpy.reshape(a, (header.num_channels, -1), 'F')
         else:
             return [
-                a[i::w.getnchannels()]
-                for i in xrange(w.getnchannels())
+                a[i::header.num_channels]
+                for i in xrange(header.num_channels)
             ]
     except wave.Error:
         print "Could not open %s" % filename
         raise
+
+
+def read_sample_file(filename):
+    """
+    Read a WAV or FLAC file as a (channels, frames) array, along with its
+    sample rate.
+    """
+    if filename.lower().endswith('.flac'):
+        tempfile = filename + '.tmp.wav'
+        decode_flac_file(filename, tempfile)
+        try:
+            return read_sample_file(tempfile)
+        finally:
+            os.unlink(tempfile)
+    with open(filename, 'rb') as f:
+        sample_rate = read_wave_header(f).sample_rate
+    return read_wave_file(filename, True), sample_rate
+
+
+def channel_mask(num_channels):
+    """The speaker positions of WAVE_FORMAT_EXTENSIBLE's dwChannelMask."""
+    if num_channels == 1:
+        return 0x4  # Front center
+    if num_channels > 18:
+        return 0
+    return (1 << num_channels) - 1
+
+
+def write_wave_header(f, num_channels, sample_format, sample_rate, data_size):
+    """
+    Write the header of a WAV file whose ``data_size`` bytes of samples
+    will follow. As the RIFF spec asks, samples of more than 16 bits or
+    more than two channels use WAVE_FORMAT_EXTENSIBLE, and non-PCM
+    formats (like IEEE float) get an extended fmt chunk and a fact chunk.
+    """
+    block_align = num_channels * sample_format.sample_width
+    format_tag = sample_format.wave_format_tag
+    bits = sample_format.bits_per_sample
+    fmt = struct.pack(
+        '<HHIIHH',
+        format_tag,
+        num_channels,
+        sample_rate,
+        sample_rate * block_align,
+        block_align,
+        bits,
+    )
+    if num_channels > 2 or (format_tag == WAVE_FORMAT_PCM and bits > 16):
+        fmt = struct.pack(
+            '<HHIIHHHHI',
+            WAVE_FORMAT_EXTENSIBLE,
+            num_channels,
+            sample_rate,
+            sample_rate * block_align,
+            block_align,
+            bits,
+            22,
+            bits,
+            channel_mask(num_channels),
+        ) + struct.pack('<H', format_tag) + EXTENSIBLE_GUID_TAIL
+    elif format_tag != WAVE_FORMAT_PCM:
+        fmt += struct.pack('<H', 0)
+
+    chunks = struct.pack('<4sI', 'fmt ', len(fmt)) + fmt
+    if format_tag != WAVE_FORMAT_PCM:
+        chunks += struct.pack('<4sII', 'fact', 4, data_size // block_align)
+    f.write(struct.pack(
+        '<4sI4s',
+        'RIFF',
+        4 + len(chunks) + 8 + data_size + (data_size & 1),
+        'WAVE',
+    ) + chunks + struct.pack('<4sI', 'data', data_size))
+
+
+class WaveWriter(object):
+    """
+    Write (channels, frames) arrays to a WAV file, either all at once or
+    incrementally, one chunk at a time, as audio is captured.
+
+    Channels are interleaved by encoding a transposed (strided) view of
+    each chunk, so no per-sample Python objects are ever created.
+    """
+
+    def __init__(
+        self,
+        path,
+        num_channels,
+        sample_format,
+        sample_rate,
+    ):
+        self.path = path
+        self.num_channels = num_channels
+        self.sample_format = sample_format
+        self.sample_rate = sample_rate
+        self.frames_written = 0
+        self.file = open(path, 'wb')
+        # The sizes in the header are filled in by close().
+        write_wave_header(self.file, num_channels, sample_format,
+                          sample_rate, 0)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def write(self, data):
+        if data.shape[0] != self.num_channels:
+            raise ValueError(
+                "Expected %d channels of audio, got %d." % (
+                    self.num_channels, data.shape[0]))
+        self.file.write(self.sample_format.encode(data.T))
+        self.frames_written += data.shape[1]
+
+    def close(self):
+        if self.file.closed:
+            return
+        data_size = (
+            self.frames_written *
+            self.num_channels *
+            self.sample_format.sample_width
+        )
+        if data_size & 1:
+            self.file.write('\0')
+        self.file.seek(0)
+        write_wave_header(self.file, self.num_channels, self.sample_format,
+                          self.sample_rate, data_size)
+        self.file.close()
+
+
+def write_wave_file(path, data, sample_format=INT16, sample_rate=48000):
+    with WaveWriter(
+        path,
+        data.shape[0],
+        sample_format,
+        sample_rate,
+    ) as writer:
+        writer.write(data)
+
+
+def truncate_wave_file(path, num_frames):
+    """
+    Cut a WAV file down to its first ``num_frames`` frames in place, by
+    truncating the file and rewriting the sizes in its header.
+    """
+    with open(path, 'r+b') as f:
+        header = read_wave_header(f)
+        data_size = min(header.data_size, num_frames * header.block_align)
+        f.truncate(header.data_offset + data_size)
+        if data_size & 1:
+            f.seek(0, os.SEEK_END)
+            f.write('\0')
+        f.seek(header.data_offset - 4)
+        f.write(struct.pack('<I', data_size))
+        if header.fact_offset is not None:
+            f.seek(header.fact_offset)
+            f.write(struct.pack('<I', data_size // header.block_align))
+        f.seek(4)
+        f.write(struct.pack(
+            '<I', header.data_offset + data_size + (data_size & 1) - 8))
+
+
+class TrimmingWaveWriter(WaveWriter):
+    """
+    A WaveWriter that trims silence from both ends of a capture while it
+    is being streamed to disk, using an onsets.OnsetTracker.
+
+    Nothing is written until the onset is found. After that, every chunk
+    goes straight to disk, and the tail is cut off on close by truncating
+    the file, so only one chunk is ever held in memory.
+    """
+
+    def __init__(self, path, num_channels, sample_format, sample_rate,
+                 tracker):
+        super(TrimmingWaveWriter, self).__init__(
+            path, num_channels, sample_format, sample_rate)
+        self.tracker = tracker
+        self.previous_frame = None
+
+    def write(self, data, absolute=None):
+        offset = self.tracker.length
+        had_onset = self.tracker.found_onset
+        self.tracker.update(data, absolute)
+
+        if had_onset:
+            super(TrimmingWaveWriter, self).write(data)
+        elif self.tracker.found_onset:
+            start = self.tracker.start - offset
+            if start < 0:
+                # The sample before the onset was the last one we dropped.
+                super(TrimmingWaveWriter, self).write(self.previous_frame)
+                start = 0
+            super(TrimmingWaveWriter, self).write(data[:, start:])
+        else:
+            self.previous_frame = data[:, -1:].copy()
+
+    @property
+    def trimmed_length(self):
+        if not self.tracker.found_onset:
+            return 0
+        return self.tracker.end - self.tracker.start
+
+    def close(self):
+        super(TrimmingWaveWriter, self).close()
+        if self.trimmed_length < self.frames_written:
+            truncate_wave_file(self.path, self.trimmed_length)
@@ -4,7 +4,17 @@
 
 import argparse
 from lib.utils import note_number, two_ints
-from lib.send_notes import sample_program, VELOCITIES, MAX_ATTEMPTS
+from lib.send_notes import sample_program, VELOCITIES, MAX_ATTEMPTS, \
+    POST_PROCESSING_WORKERS, \
+    LOOP_SUSTAIN, \
+    ADAPTIVE_ZONE_TOLERANCE, \
+    ADAPTIVE_ZONE_MAX_STEP
+from lib.constants import SAMPLE_FORMAT
+from lib.sample_format import FORMATS
+from lib.loop import LOOP_STRATEGIES, DEFAULT_LOOP_STRATEGY
+from lib.lanes import parse_lane, sample_lanes, LANE_UNSUPPORTED_OPTIONS
+from lib.batch import parse_programs, parse_program_cc, sample_programs
+from lib.virtual_instrument import VirtualInstrument
 
 
 if __name__ == '__main__':
@@ -22,7 +32,19 @@ if __name__ == '__main__':
         '--cc 0,127 "64,65"', nargs='*')
     sampling_options.add_argument(
         '--program-number', type=int,
-        help='switch to a program number before recording')
+        help='switch to a program number before recording (not with '
+             '--programs)')
+    sampling_options.add_argument(
+        '--programs', type=parse_programs, nargs='+', metavar='PROGRAMS',
+        help='sample several programs in one run, each into its own '
+             'folder of output_folder. Give program numbers or ranges. '
+             'Example: --programs 0-15 32')
+    sampling_options.add_argument(
+        '--program-cc', type=parse_program_cc, action='append',
+        dest='program_ccs', metavar='PROGRAM:CC,VALUE',
+        help='with --programs, send MIDI CC before one program\'s program '
+             'change, after any --cc-before. Repeat once per program. '
+             'Example: --program-cc 5:0,1:32,0')
     sampling_options.add_argument(
         '--low-key', type=note_number, default=21,
         help='key to start sampling from (key name, octave number)')
@@ -33,14 +55,35 @@ if __name__ == '__main__':
         '--velocity-levels', type=int, default=VELOCITIES, nargs='+',
         help='velocity levels (in [1, 127]) to sample')
     sampling_options.add_argument(
-        '--key-skip', type=int, default=1, dest='key_range',
-        help='number of keys covered by one sample')
+        '--key-skip', type=int, default=None, dest='key_range',
+        help='number of keys covered by one sample (default 1, or %d '
+             'with --adaptive-zones)' % ADAPTIVE_ZONE_MAX_STEP)
     sampling_options.add_argument(
         '--max-attempts', type=int, default=MAX_ATTEMPTS,
         help='maximum number of tries to resample a note')
     sampling_options.add_argument(
         '--limit', type=float, default=45,
         help='length in seconds of longest sample')
+    sampling_options.add_argument(
+        '--adaptive-zones', type=float, nargs='?',
+        const=ADAPTIVE_ZONE_TOLERANCE, default=None, metavar='TOLERANCE',
+        dest='adaptive_zones',
+        help='treat --key-skip (at least 2) as the largest step, and '
+             'sample more keys wherever neighbouring samples sound more '
+             'than TOLERANCE apart (default %2.2f)' % ADAPTIVE_ZONE_TOLERANCE)
+    sampling_options.add_argument(
+        '--probe-velocities', action='store_true', dest='probe_velocities',
+        help='before sampling, compare the lowest and highest velocity '
+             'levels on a few keys, and only sample one layer if they '
+             'differ only in volume (default false)')
+    sampling_options.add_argument(
+        '--probe-range', action='store_true', dest='probe_range',
+        help='before sampling, play each key briefly and skip the ones '
+             'that make no sound. With --program-number, the result is '
+             'remembered for next time (default false)')
+    sampling_options.add_argument(
+        '--reprobe-range', action='store_true', dest='reprobe_range',
+        help='like --probe-range, but ignore any remembered result')
     sampling_options.add_argument(
         '--has-portamento', action='store_true', dest='has_portamento',
         help='play each note once before sampling to avoid '
@@ -63,6 +106,23 @@ if __name__ == '__main__':
         '--loop', action='store_true', dest='looping_enabled',
         help='attempt to loop sounds (should only be used '
              'with sounds with infinite sustain)')
+    output_options.add_argument(
+        '--loop-strategy', choices=sorted(LOOP_STRATEGIES),
+        default=DEFAULT_LOOP_STRATEGY, dest='loop_strategy',
+        help='with --loop, how loop points are found: by autocorrelation, '
+             'or by cross-correlating the waveform after each candidate '
+             'loop start with everything after it, which suits steady '
+             'sustains best (default %s)' % DEFAULT_LOOP_STRATEGY)
+    output_options.add_argument(
+        '--loop-sustain', type=float, default=LOOP_SUSTAIN,
+        metavar='SECONDS', dest='loop_sustain',
+        help='with --loop, release each note once it has been steady for '
+             'this long instead of holding it for --limit; 0 always holds '
+             'it for --limit (default %2.1f)' % LOOP_SUSTAIN)
+    output_options.add_argument(
+        '--stream-to-disk', action='store_true', dest='stream_to_disk',
+        help='write each sample to disk while it is being recorded, '
+             'to keep memory use low for long samples')
 
     io_options = parser.add_argument_group('MIDI/Audio IO Options')
     io_options.add_argument(
@@ -74,6 +134,13 @@ if __name__ == '__main__':
     io_options.add_argument(
         '--midi-channel', type=int, default=1,
         help='MIDI channel to send messages on')
+    io_options.add_argument(
+        '--lane', type=parse_lane, action='append', dest='lanes',
+        help='sample several instruments at once from one multichannel '
+             'audio interface. Repeat once per instrument, as '
+             'MIDI_CHANNEL:LEFT_INPUT,RIGHT_INPUT[:MIDI_PORT_NAME]. '
+             'Example: --lane 1:1,2 --lane 2:3,4. Not all sampling '
+             'options work with lanes; the others are rejected.')
     io_options.add_argument(
         '--audio-interface-name', type=str,
         help='name of audio input device to use')
@@ -83,36 +150,160 @@ if __name__ == '__main__':
     io_options.add_argument(
         '--sample-rate', type=int, default=48000,
         help='sample rate to use. audio interface must support this rate.')
+    io_options.add_argument(
+        '--sample-format', choices=sorted(FORMATS), default=SAMPLE_FORMAT,
+        help='sample format to record and save samples in (default %s)' %
+             SAMPLE_FORMAT)
 
     misc_options = parser.add_argument_group('Misc Options')
     misc_options.add_argument(
         '--print-progress', action='store_true', dest='print_progress',
-        help='show text-based VU meters in terminal (default false, '
-             'can cause audio artifacts)')
+        help='show text-based VU meters in terminal (default false)')
+    misc_options.add_argument(
+        '--recalibrate', action='store_true', dest='recalibrate',
+        help='measure the noise floor and check for clipping even if this '
+             'interface, sample rate and --program-number were calibrated '
+             'recently')
+    misc_options.add_argument(
+        '--dry-run', action='store_true', dest='dry_run',
+        help='print how many notes would be sampled and an estimate of how '
+             'long it would take, from the journals of earlier sessions in '
+             'neighbouring folders, without sampling anything')
+    misc_options.add_argument(
+        '--workers', type=int, default=POST_PROCESSING_WORKERS,
+        help='number of threads that trim, save, loop and level samples '
+             'while later notes are captured; 0 does this between '
+             'captures (default %d)' % POST_PROCESSING_WORKERS)
+    misc_options.add_argument(
+        '--virtual-instrument', type=float, nargs='?', const=1.0,
+        default=None, metavar='SPEED', dest='virtual_instrument',
+        help='sample a built-in synthesizer instead of MIDI and audio '
+             'hardware, SPEED times faster than real time (default 1)')
 
     args = parser.parse_args()
 
-    sample_program(
-        output_folder=args.output_folder,
-        low_key=args.low_key,
-        high_key=args.high_key,
-        max_attempts=args.max_attempts,
-        midi_channel=args.midi_channel,
-        midi_port_name=args.midi_port_name,
-        midi_port_index=args.midi_port_index,
-        audio_interface_name=args.audio_interface_name,
-        audio_interface_index=args.audio_interface_index,
-        cc_before=args.cc_before,
-        program_number=args.program_number,
-        cc_after=args.cc_after,
-        flac=args.flac,
-        velocity_levels=args.velocity_levels,
-        key_range=args.key_range,
-        cleanup_aif_files=args.cleanup_aif_files,
-        limit=args.limit,
-        looping_enabled=args.looping_enabled,
-        print_progress=args.print_progress,
-        has_portamento=args.has_portamento,
-        sample_asc=args.sample_asc,
-        sample_rate=args.sample_rate,
-    )
+    if args.lanes:
+        unsupported = [
+            option for option, dest in LANE_UNSUPPORTED_OPTIONS
+            if getattr(args, dest) != parser.get_default(dest)
+        ]
+        if unsupported:
+            parser.error("%s can't be used with --lane." % (
+                ", ".join(unsupported)))
+
+    if args.program_ccs and not args.programs:
+        parser.error("--program-cc can only be used with --programs.")
+    if args.programs and args.program_number is not None:
+        parser.error("--program-number can't be used with --programs.")
+
+    if args.key_range is None:
+        args.key_range = ADAPTIVE_ZONE_MAX_STEP if args.adaptive_zones else 1
+    elif args.adaptive_zones and args.key_range < 2:
+        parser.error("--adaptive-zones needs a --key-skip of at least 2.")
+
+    if args.virtual_instrument is not None:
+        backend = VirtualInstrument(speed=args.virtual_instrument)
+    else:
+        backend = None
+
+    if args.lanes:
+        sample_lanes(
+            args.lanes,
+            output_folder=args.output_folder,
+            low_key=args.low_key,
+            high_key=args.high_key,
+            midi_port_name=args.midi_port_name,
+            midi_port_index=args.midi_port_index,
+            audio_interface_name=args.audio_interface_name,
+            audio_interface_index=args.audio_interface_index,
+            cc_before=args.cc_before,
+            program_number=args.program_number,
+            cc_after=args.cc_after,
+            flac=args.flac,
+            velocity_levels=args.velocity_levels,
+            key_range=args.key_range,
+            cleanup_aif_files=args.cleanup_aif_files,
+            limit=args.limit,
+            looping_enabled=args.looping_enabled,
+            loop_strategy=args.loop_strategy,
+            print_progress=args.print_progress,
+            sample_asc=args.sample_asc,
+            sample_rate=args.sample_rate,
+            sample_format=args.sample_format,
+            backend=backend,
+        )
+    elif args.programs:
+        sample_programs(
+            sum(args.programs, []),
+            output_folder=args.output_folder,
+            low_key=args.low_key,
+            high_key=args.high_key,
+            max_attempts=args.max_attempts,
+            midi_channel=args.midi_channel,
+            midi_port_name=args.midi_port_name,
+            midi_port_index=args.midi_port_index,
+            audio_interface_name=args.audio_interface_name,
+            audio_interface_index=args.audio_interface_index,
+            cc_before=args.cc_before,
+            program_ccs=dict(args.program_ccs or []),
+            cc_after=args.cc_after,
+            flac=args.flac,
+            velocity_levels=args.velocity_levels,
+            key_range=args.key_range,
+            cleanup_aif_files=args.cleanup_aif_files,
+            limit=args.limit,
+            looping_enabled=args.looping_enabled,
+            loop_strategy=args.loop_strategy,
+            print_progress=args.print_progress,
+            has_portamento=args.has_portamento,
+            sample_asc=args.sample_asc,
+            sample_rate=args.sample_rate,
+            stream_to_disk=args.stream_to_disk,
+            sample_format=args.sample_format,
+            backend=backend,
+            workers=args.workers,
+            loop_sustain=args.loop_sustain,
+            probe_velocities=args.probe_velocities,
+            adaptive_zones=args.adaptive_zones,
+            probe_range=args.probe_range,
+            reprobe_range=args.reprobe_range,
+            dry_run=args.dry_run,
+            recalibrate=args.recalibrate,
+        )
+    else:
+        sample_program(
+            output_folder=args.output_folder,
+            low_key=args.low_key,
+            high_key=args.high_key,
+            max_attempts=args.max_attempts,
+            midi_channel=args.midi_channel,
+            midi_port_name=args.midi_port_name,
+            midi_port_index=args.midi_port_index,
+            audio_interface_name=args.audio_interface_name,
+            audio_interface_index=args.audio_interface_index,
+            cc_before=args.cc_before,
+            program_number=args.program_number,
+            cc_after=args.cc_after,
+            flac=args.flac,
+            velocity_levels=args.velocity_levels,
+            key_range=args.key_range,
+            cleanup_aif_files=args.cleanup_aif_files,
+            limit=args.limit,
+            looping_enabled=args.looping_enabled,
+            loop_strategy=args.loop_strategy,
+            print_progress=args.print_progress,
+            has_portamento=args.has_portamento,
+            sample_asc=args.sample_asc,
+            sample_rate=args.sample_rate,
+            stream_to_disk=args.stream_to_disk,
+            sample_format=args.sample_format,
+            backend=backend,
+            workers=args.workers,
+            loop_sustain=args.loop_sustain,
+            probe_velocities=args.probe_velocities,
+            adaptive_zones=args.adaptive_zones,
+            probe_range=args.probe_range,
+            reprobe_range=args.reprobe_range,
+            dry_run=args.dry_run,
+            recalibrate=args.recalibrate,
+        )
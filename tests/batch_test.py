@@ -0,0 +1,14 @@
+from lib.batch import parse_programs, parse_program_cc, program_folder
+
+
+def test_parse_programs():
+    assert parse_programs('5') == [5]
+    assert parse_programs('0-3') == [0, 1, 2, 3]
+
+
+def test_parse_program_cc():
+    assert parse_program_cc('5:0,1:32,2') == (5, [(0, 1), (32, 2)])
+
+
+def test_program_folder():
+    assert program_folder('bank', 7) == 'bank/007'
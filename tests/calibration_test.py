@@ -0,0 +1,86 @@
+import time
+import shutil
+import tempfile
+import numpy
+import pytest
+from lib.cache import Cache
+from lib.noise_model import NoiseModel
+from lib.calibration import Calibration, cached_calibration, \
+    calibration_key, \
+    CALIBRATION_TTL
+
+
+@pytest.fixture
+def folder():
+    path = tempfile.mkdtemp()
+    yield path
+    shutil.rmtree(path)
+
+
+def calibration(noise_rms=(0.001, 0.002), measured_at=None):
+    return Calibration(
+        NoiseModel(noise_rms, [0.004, 0.008]), 0.5, measured_at)
+
+
+def test_round_trips_through_json():
+    original = calibration((0.001, numpy.inf))
+    restored = Calibration.from_json(original.to_json())
+    assert numpy.array_equal(
+        restored.noise_model.noise_rms, original.noise_model.noise_rms)
+    assert restored.noise_model.threshold == original.noise_model.threshold
+    assert restored.max_volume == 0.5
+    assert restored.measured_at == original.measured_at
+
+
+def test_drift():
+    cached = calibration()
+    assert cached.drift_db(NoiseModel([0.001, 0.002], [0, 0])) == 0
+    assert abs(cached.drift_db(
+        NoiseModel([0.001, 0.004], [0, 0])) - 6.02) < 0.01
+    assert cached.drift_db(NoiseModel([0.001], [0])) == numpy.inf
+
+
+def test_ignored_inputs_do_not_drift():
+    cached = calibration((0.001, numpy.inf))
+    assert cached.drift_db(NoiseModel([0.001, 0.5], [0, 0])) == 0
+
+
+def test_expired_calibrations_are_not_used(folder):
+    cache = Cache('calibrations', folder)
+    key = calibration_key('Interface', 48000, 'Port', 1, 3)
+    cache.set(key, calibration(
+        measured_at=time.time() - CALIBRATION_TTL - 1).to_json())
+    assert cached_calibration(cache, key, 'Interface') is None
+    assert cached_calibration(
+        cache, calibration_key('Interface', 44100, 'Port', 1, 3),
+        'Interface') is None
+
+
+def test_keys_tell_instruments_and_banks_apart():
+    key = calibration_key('Interface', 48000, 'Port', 1, 3, [(0, 1)])
+    assert key == calibration_key(
+        'Interface', 48000, 'Port', 1, 3, [(0, 1)])
+    for other in [
+        calibration_key('Interface', 48000, 'Other Port', 1, 3, [(0, 1)]),
+        calibration_key('Interface', 48000, 'Port', 2, 3, [(0, 1)]),
+        calibration_key('Interface', 48000, 'Port', 1, 3, [(0, 2)]),
+        calibration_key('Interface', 48000, 'Port', 1, 3, [(0, 1)],
+                        [(7, 100)]),
+    ]:
+        assert other != key
+
+
+def test_unmeasurable_drift_makes_calibrations_stale(folder, monkeypatch):
+    cached = calibration()
+    assert not numpy.isfinite(cached.drift_db(
+        NoiseModel([0.001, numpy.nan], [0, 0])))
+    assert not numpy.isfinite(cached.drift_db(
+        NoiseModel([numpy.nan, 0.002], [0, 0])))
+    cache = Cache('calibrations', folder)
+    key = calibration_key('Interface', 48000, 'Port', 1, 3)
+    cache.set(key, cached.to_json())
+    monkeypatch.setattr(
+        'lib.calibration.measure_drift', lambda *args: numpy.nan)
+    assert cached_calibration(cache, key, 'Interface') is None
+    monkeypatch.setattr('lib.calibration.measure_drift', lambda *args: 0.5)
+    assert cached_calibration(cache, key, 'Interface') is not None
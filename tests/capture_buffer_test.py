@@ -0,0 +1,44 @@
+import numpy
+from lib.capture_buffer import CaptureBuffer
+
+
+def chunks(count, chunk_size=4):
+    return [
+        numpy.arange(i * chunk_size * 2, (i + 1) * chunk_size * 2,
+                     dtype=numpy.int16).reshape((2, -1), order='F')
+        for i in range(count)
+    ]
+
+
+def test_data_matches_concatenation():
+    buffer = CaptureBuffer(2, numpy.int16, capacity=4, chunk_size=4)
+    expected = chunks(10)
+    for chunk in expected:
+        buffer.append(chunk)
+    assert buffer.capacity >= 40
+    assert (buffer.data == numpy.concatenate(expected, axis=1)).all()
+
+
+def test_data_is_a_view():
+    buffer = CaptureBuffer(2, numpy.int16, capacity=16, chunk_size=4)
+    for chunk in chunks(2):
+        buffer.append(chunk)
+    assert buffer.data.base is not None
+    assert buffer.data.shape == (2, 8)
+
+
+def test_chunk_addressing():
+    buffer = CaptureBuffer(2, numpy.int16, capacity=16, chunk_size=4)
+    expected = chunks(3)
+    for chunk in expected:
+        buffer.append(chunk)
+    buffer.append(expected[0][:, :2])
+    assert buffer.num_chunks == 4
+    assert (buffer.chunk(1) == expected[1]).all()
+    assert (buffer.chunk(-1) == expected[0][:, :2]).all()
+
+
+def test_for_limit_preallocates():
+    buffer = CaptureBuffer.for_limit(2, 1000, 2, numpy.int16, 100,
+                                     tail_seconds=1)
+    assert buffer.capacity == 3000
@@ -0,0 +1,61 @@
+import numpy
+from lib.compare import sustained_spectral_centroid, timbre_distance
+from lib.pitch import Zone, plan_zones
+from lib.send_notes import timbre_distance_between_keys, \
+    ADAPTIVE_ZONE_TOLERANCE
+from lib.utils import note_frequency
+from lib.virtual_instrument import VirtualInstrument, Voice
+
+SAMPLE_RATE = 48000
+
+
+def play(key, program=0, seconds=1.0):
+    instrument = VirtualInstrument()
+    instrument.program = program
+    instrument.voices.append(Voice(key, 127, 1, 0))
+    return numpy.round(instrument.render(
+        int(seconds * SAMPLE_RATE), 2, SAMPLE_RATE,
+        numpy.random.RandomState(0)) * 2 ** 15)
+
+
+def test_brightness_is_the_same_on_every_key():
+    brightness = [
+        sustained_spectral_centroid(play(key)[0], SAMPLE_RATE) /
+        note_frequency(key)
+        for key in range(48, 73)
+    ]
+    assert numpy.ptp(brightness) < 0.01
+
+
+def test_neighbouring_keys_of_a_smooth_patch_sound_alike():
+    for key in range(48, 72):
+        assert timbre_distance(
+            play(key)[0], play(key + 1)[0],
+            note_frequency(key), note_frequency(key + 1),
+            SAMPLE_RATE) < 0.1
+
+
+def plan(program_for_key):
+    probed = []
+
+    def probe(key, velocity):
+        probed.append(key)
+        return play(key, program_for_key(key))
+    zones = plan_zones(
+        Zone(low=48, high=72),
+        timbre_distance_between_keys(probe, 127, SAMPLE_RATE),
+        ADAPTIVE_ZONE_TOLERANCE,
+    )
+    return [zone.center for zone in zones], sorted(set(probed))
+
+
+def test_smooth_patch_is_not_bisected():
+    centers, probed = plan(lambda key: 0)
+    assert centers == [48, 60, 72]
+    assert probed == [48, 60, 72]
+
+
+def test_patch_is_bisected_where_it_brightens():
+    centers, _ = plan(lambda key: 0 if key < 66 else 1)
+    assert 65 in centers and 66 in centers
+    assert 53 not in centers
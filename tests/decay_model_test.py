@@ -0,0 +1,50 @@
+import numpy
+from lib.decay_model import DecayEstimator, DecayPriors
+
+CHUNK_SECONDS = 1024 / 48000.
+
+
+def feed(estimator, rate, start_db=-10, seconds=1.0, noise=0.0, seed=0):
+    random = numpy.random.RandomState(seed)
+    for t in numpy.arange(0, seconds, CHUNK_SECONDS):
+        estimator.update(t, start_db + rate * t + random.normal(0, noise))
+
+
+def test_predicts_floor_crossing():
+    estimator = DecayEstimator(-80, CHUNK_SECONDS)
+    feed(estimator, -20, noise=0.5)
+    assert abs(estimator.rate - -20) < 1
+    assert abs(estimator.floor_time() - 3.5) < 0.2
+
+
+def test_needs_enough_points():
+    estimator = DecayEstimator(-80, CHUNK_SECONDS)
+    feed(estimator, -20, seconds=CHUNK_SECONDS * 5)
+    assert estimator.floor_time() is None
+    estimator.restart(prior=-20)
+    feed(estimator, -20, seconds=CHUNK_SECONDS * 5)
+    assert estimator.floor_time() is not None
+
+
+def test_does_not_trust_a_wobbly_envelope():
+    estimator = DecayEstimator(-80, CHUNK_SECONDS)
+    for i, t in enumerate(numpy.arange(0, 1, CHUNK_SECONDS)):
+        estimator.update(t, -20 + (10 if i % 2 else -10))
+    assert estimator.floor_time() is None
+
+
+def test_ignores_the_floor_itself():
+    estimator = DecayEstimator(-80, CHUNK_SECONDS)
+    feed(estimator, -40, seconds=2.0)
+    assert abs(estimator.rate - -40) < 0.01
+
+
+def test_priors_prefer_near_neighbours():
+    priors = DecayPriors()
+    assert priors.prior_for(60, 100) is None
+    priors.add(60, 100, -10)
+    priors.add(62, 100, -40)
+    priors.add(70, 100, -1000)
+    prior = priors.prior_for(61, 100)
+    assert -40 < prior < -10
+    assert priors.prior_for(60, 100) > prior
@@ -0,0 +1,71 @@
+import os
+import shutil
+import tempfile
+import pytest
+from lib.journal import SessionJournal, JOURNAL_FILENAME
+from lib.sfzparser import SFZFile, Region
+
+
+@pytest.fixture
+def folder():
+    path = tempfile.mkdtemp()
+    yield path
+    shutil.rmtree(path)
+
+
+def region(folder, key, hivel):
+    sample = 'sample_%d_%d.aif' % (key, hivel)
+    open(os.path.join(folder, sample), 'w').close()
+    return Region({
+        'sample': sample,
+        'pitch_keycenter': key,
+        'hivel': hivel,
+        'lovel': 1,
+    })
+
+
+def test_regions_survive_reopening(folder):
+    with SessionJournal.for_folder(folder) as journal:
+        journal.add(region(folder, 60, 127))
+        journal.add(region(folder, 61, 127))
+    with SessionJournal.for_folder(folder) as journal:
+        assert len(journal) == 2
+        assert journal.get(61, 127).attributes['sample'] == \
+            'sample_61_127.aif'
+        assert journal.get(61, 63) is None
+
+
+def test_torn_last_line_is_dropped(folder):
+    with SessionJournal.for_folder(folder) as journal:
+        journal.add(region(folder, 60, 127))
+        journal.add(region(folder, 61, 127))
+    path = os.path.join(folder, JOURNAL_FILENAME)
+    with open(path, 'r+b') as f:
+        f.truncate(os.path.getsize(path) - 5)
+    with SessionJournal.for_folder(folder) as journal:
+        assert len(journal) == 1
+        journal.add(region(folder, 62, 127))
+    with SessionJournal.for_folder(folder) as journal:
+        assert len(journal) == 2
+
+
+def test_missing_samples_are_not_indexed(folder):
+    with SessionJournal.for_folder(folder) as journal:
+        journal.add(region(folder, 60, 127))
+    os.unlink(os.path.join(folder, 'sample_60_127.aif'))
+    with SessionJournal.for_folder(folder) as journal:
+        assert journal.get(60, 127) is None
+
+
+def test_imports_and_materializes_sfz(folder):
+    regions = [region(folder, 60, 63), region(folder, 60, 127)]
+    sfzfile = os.path.join(folder, 'file.sfz')
+    with open(sfzfile, 'w') as f:
+        f.write("\n".join([str(r) for r in regions]))
+    with SessionJournal.for_folder(folder) as journal:
+        assert len(journal) == 2
+        journal.add(region(folder, 61, 127))
+        journal.materialize()
+    parsed = SFZFile(open(sfzfile).read()).groups[0].regions
+    assert [r.attributes['sample'] for r in parsed] == [
+        'sample_60_63.aif', 'sample_60_127.aif', 'sample_61_127.aif']
@@ -0,0 +1,151 @@
+import os
+import shutil
+import tempfile
+import numpy
+import pytest
+from lib.lanes import Lane, \
+    parse_lane, \
+    capture_lanes, \
+    channel_thresholds, \
+    sample_lane_note, \
+    sample_lanes
+from lib.journal import SessionJournal
+from lib.loop import find_loop_points
+from lib.pitch import Zone
+from lib.record import AudioSession
+from lib.sample_format import INT16
+from lib.virtual_instrument import VirtualInstrument
+from lib.wavio import read_wave_file
+
+
+@pytest.fixture
+def folder():
+    path = tempfile.mkdtemp()
+    yield path
+    shutil.rmtree(path)
+
+
+def test_parse_lane():
+    lane = parse_lane('2:3,4')
+    assert lane.midi_channel == 2
+    assert lane.input_channels == (2, 3)
+    assert lane.midi_port_name is None
+    assert parse_lane('1:1,2:Port: A').midi_port_name == 'Port: A'
+    with pytest.raises(ValueError):
+        parse_lane('1:0,1')
+
+
+def test_unused_inputs_never_count():
+    lanes = [parse_lane('1:3,4')]
+    lanes[0].threshold = 0.01
+    thresholds = channel_thresholds(lanes, 4)
+    assert numpy.isinf(thresholds[:2]).all()
+    assert (thresholds[2:] == 0.01).all()
+
+
+def test_one_capture_is_split_per_lane(folder):
+    # MIDI channel 1 plays into inputs 1 and 2, and MIDI channel 3 into
+    # inputs 5 and 6, which aren't captured, so the second lane is silent.
+    instrument = VirtualInstrument(speed=20)
+    lanes = [Lane(1, [0, 1]), Lane(3, [2, 3])]
+    for i, lane in enumerate(lanes):
+        lane.midiout = instrument
+        lane.threshold = 0.001
+        lane.output_folder = os.path.join(folder, 'lane%d' % (i + 1))
+        os.makedirs(lane.output_folder)
+        lane.journal = SessionJournal.for_folder(lane.output_folder)
+
+    with AudioSession(
+        instrument.input_device_name(None),
+        sample_format=INT16,
+        num_channels=4,
+        backend=instrument,
+    ) as session:
+        sample_lane_note(
+            session, lanes, Zone(low=60, high=60, center=60), 127, [127],
+            limit=0.5)
+
+    sounding, silent = lanes
+    assert len(sounding.note_regions) == 1
+    assert not silent.note_regions
+    assert sounding.journal.get(60, 127) is not None
+    assert silent.journal.get(60, 127) is None
+    data = read_wave_file(os.path.join(
+        sounding.output_folder,
+        sounding.note_regions[0].attributes['sample']), True)
+    assert data.shape[0] == 2
+    # Trimmed to the note: it starts one frame before the lane's onset
+    # (ten times its threshold) and lasts through the held half second
+    # and into the release.
+    onset = 10 * 0.001 * 2 ** 15
+    assert numpy.amax(numpy.absolute(data[:, 0])) <= onset
+    assert numpy.amax(numpy.absolute(data[:, 1])) > onset
+    assert data.shape[1] > 0.5 * 48000
+    for lane in lanes:
+        lane.journal.close()
+
+
+def test_lane_loops_stay_before_the_note_off(folder, monkeypatch):
+    instrument = VirtualInstrument(speed=20)
+    lane = Lane(1, [0, 1])
+    lane.midiout = instrument
+    lane.threshold = 0.001
+    lane.output_folder = folder
+    lane.journal = SessionJournal.for_folder(folder)
+
+    captured = []
+
+    def capture(*args, **kwargs):
+        captured.append(capture_lanes(*args, **kwargs))
+        return captured[-1]
+    monkeypatch.setattr('lib.lanes.capture_lanes', capture)
+
+    ends = []
+
+    def find_loop(data, sample_rate, end=None, **kwargs):
+        ends.append(end)
+        return find_loop_points(data, sample_rate, end=end, **kwargs)
+    monkeypatch.setattr('lib.lanes.find_loop_points', find_loop)
+
+    with AudioSession(
+        instrument.input_device_name(None),
+        sample_format=INT16,
+        num_channels=2,
+        backend=instrument,
+    ) as session:
+        sample_lane_note(
+            session, [lane], Zone(low=60, high=60, center=60), 127, [127],
+            limit=2.0, looping_enabled=True)
+
+    (recording, (tracker,)), = captured
+    sustain_length = recording.release_frame - tracker.start
+    assert 0 < sustain_length < tracker.end - tracker.start
+    assert ends == [sustain_length]
+    region, = lane.note_regions
+    assert region.attributes['loop_end'] <= sustain_length
+    lane.journal.close()
+
+
+def test_journaled_notes_are_not_sampled_again(folder, monkeypatch):
+    def sample(instrument):
+        sample_lanes(
+            [parse_lane('1:1,2'), parse_lane('2:3,4')],
+            output_folder=folder,
+            low_key=60,
+            high_key=61,
+            velocity_levels=[127],
+            limit=0.2,
+            flac=False,
+            backend=instrument,
+        )
+    sample(VirtualInstrument(speed=20))
+
+    sampled = []
+    monkeypatch.setattr(
+        'lib.lanes.sample_lane_note',
+        lambda session, lanes, zone, *args: sampled.append(zone.center))
+    sample(VirtualInstrument(speed=20))
+    assert sampled == []
+    for lane in ('lane1', 'lane2'):
+        with open(os.path.join(folder, lane, 'file.sfz')) as f:
+            assert f.read().count('<region>') == 2
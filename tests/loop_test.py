@@ -0,0 +1,169 @@
+import numpy
+from benchmarks.loop_matching import find_similar_sample_index_loop
+from lib.loop import find_similar_sample_index, \
+    find_similar_sample_indices, \
+    find_loop_points, \
+    smooth_length, \
+    normalized_cross_correlation, \
+    loop_quality, \
+    score_loop_candidates, \
+    best_loop, \
+    SCORING_BATCH, \
+    MATCH_BATCH, \
+    Autocorrelation
+
+
+def test_matches_the_one_at_a_time_search():
+    random = numpy.random.RandomState(0)
+    file = random.normal(0, 3000, 10000).astype(numpy.int16)
+    references = random.randint(200, 9700, 200)
+    around = random.randint(200, 9700, 200)
+    assert find_similar_sample_indices(
+        file, references, around).tolist() == [
+        find_similar_sample_index_loop(file, r, a)
+        for r, a in zip(references, around)
+    ]
+
+
+def test_full_scale_samples_and_the_edges_of_the_file():
+    random = numpy.random.RandomState(1)
+    # Differences between full scale samples don't fit in an int16.
+    file = random.randint(-2 ** 15, 2 ** 15, 2000).astype(numpy.int16)
+    # Searching around the first and last few samples would reach past
+    # both ends of the file.
+    references = random.randint(1, 1998, 300)
+    around = numpy.concatenate([
+        random.randint(0, 50, 100),
+        random.randint(1950, 2000, 100),
+        random.randint(0, 2000, 100),
+    ])
+    matches = find_similar_sample_indices(file, references, around)
+    assert matches.tolist() == [
+        find_similar_sample_index_loop(file, r, a)
+        for r, a in zip(references, around)
+    ]
+
+
+def test_many_positions_are_matched_in_batches():
+    random = numpy.random.RandomState(2)
+    file = random.normal(0, 3000, 20000).astype(numpy.int16)
+    references = random.randint(200, 19700, MATCH_BATCH + 10)
+    around = random.randint(200, 19700, MATCH_BATCH + 10)
+    matches = find_similar_sample_indices(file, references, around)
+    assert len(matches) == MATCH_BATCH + 10
+    assert matches[-10:].tolist() == [
+        find_similar_sample_index_loop(file, r, a)
+        for r, a in zip(references[-10:], around[-10:])
+    ]
+
+
+def test_finds_the_same_point_one_period_later():
+    t = numpy.arange(4800)
+    file = (10000 * numpy.sin(2 * numpy.pi * t / 480.0)).astype(numpy.int16)
+    assert find_similar_sample_index(file, 1000, 1000 + 480 + 30) == 1480
+
+
+def test_falls_back_without_a_matching_slope():
+    file = numpy.arange(1000)
+    file[501] = 0
+    assert find_similar_sample_index(file, 500, 200, search_size=10) == 200
+
+
+def test_smooth_length():
+    assert [smooth_length(n) for n in (1, 7, 17, 97, 1000, 1025)] == \
+        [1, 8, 18, 100, 1000, 1080]
+
+
+def test_autocorrelation_does_not_wrap_around():
+    x = numpy.random.RandomState(0).normal(0, 1, 101)
+    xp = x - x.mean()
+    expected = numpy.correlate(xp, xp, 'full')[100:150] / numpy.sum(xp ** 2)
+    autocorrelation = Autocorrelation(x)
+    assert autocorrelation.fft_size == 216
+    assert numpy.allclose(autocorrelation.values, expected, atol=1e-5)
+
+
+def test_loops_stay_in_the_sustain_window():
+    t = numpy.arange(96000)
+    x = (8000 * numpy.sin(2 * numpy.pi * 220 * t / 48000.)).astype(
+        numpy.int16)
+    start, end = find_loop_points(
+        numpy.array([x, x]), 48000, sustain_window=(0.5, 1.0))
+    assert 48000 <= start < end <= 96000
+    assert abs(int(x[start]) - int(x[end])) < 500
+
+
+def test_normalized_cross_correlation():
+    random = numpy.random.RandomState(0)
+    signal = random.normal(0, 1, 300)
+    template = signal[100:120] * 3 + 5
+    scores = normalized_cross_correlation(template, signal)
+    expected = [
+        numpy.corrcoef(template, signal[i:i + 20])[0, 1]
+        for i in xrange(281)
+    ]
+    assert numpy.allclose(scores, expected)
+    assert numpy.argmax(scores) == 100
+
+
+def test_cross_correlation_loops_match_the_waveform():
+    t = numpy.arange(96000)
+    x = (8000 * numpy.sin(2 * numpy.pi * 330 * t / 48000.) +
+         2000 * numpy.sin(2 * numpy.pi * 990 * t / 48000.)).astype(
+        numpy.int16)
+    start, end = find_loop_points(
+        numpy.array([x, x]), 48000, strategy='cross-correlation')
+    assert end - start >= 9600
+    difference = x[start:start + 480].astype(float) - \
+        x[end + 1:end + 481]
+    assert numpy.sqrt(numpy.mean(difference ** 2)) < 100
+
+
+def test_loop_quality_prefers_matching_boundaries():
+    t = numpy.arange(48000)
+    channel = numpy.sin(2 * numpy.pi * t / 240.) * 10000
+    # A loop's end is the last frame played before wrapping around.
+    assert loop_quality(channel, 4800, 4800 + 240 * 40 - 1, 48000) > 0.99
+    assert loop_quality(channel, 4800, 4800 + 240 * 40 + 119, 48000) < 0.1
+
+
+def test_scores_every_candidate_at_once():
+    t = numpy.arange(48000)
+    left = numpy.sin(2 * numpy.pi * t / 240.) * 10000
+    right = numpy.sin(2 * numpy.pi * t / 160.) * 10000
+    data = numpy.array([left, right])
+    # Seamless in both channels, only in the left, and in neither.
+    scores = score_loop_candidates(
+        data, [4800, 4800, 4800], [4800 + 960 - 1, 4800 + 240 - 1,
+                                   4800 + 100], 48000)
+    assert scores.total.shape == (3,)
+    assert numpy.argmin(scores.total) == 0
+    assert scores.waveform[0] < 0.01 and scores.stereo[0] < 0.01
+    assert scores.stereo[1] > 0.1
+    assert scores.slope[2] > scores.slope[0]
+    assert scores.spectrum[0] < 0.01
+
+
+def test_best_loop_stops_at_the_first_batch_once_its_budget_is_spent():
+    t = numpy.arange(48000)
+    data = numpy.array([numpy.sin(2 * numpy.pi * t / 240.) * 10000])
+    loop_starts = numpy.full(SCORING_BATCH + 1, 4800)
+    loop_ends = numpy.full(SCORING_BATCH + 1, 4800 + 100)
+    loop_ends[-1] = 4800 + 960 - 1
+    assert best_loop(data, loop_starts, loop_ends, 48000) == \
+        (4800, 4800 + 960 - 1)
+    assert best_loop(data, loop_starts, loop_ends, 48000, budget=0) == \
+        (4800, 4800 + 100)
+
+
+def test_best_loop_scores_a_fixed_number_of_batches():
+    t = numpy.arange(48000)
+    data = numpy.array([numpy.sin(2 * numpy.pi * t / 240.) * 10000])
+    loop_starts = numpy.full(SCORING_BATCH * 3, 4800)
+    loop_ends = numpy.full(SCORING_BATCH * 3, 4800 + 100)
+    loop_ends[SCORING_BATCH + 1] = 4800 + 960 - 1
+    loop_ends[-1] = 4800 + 480 - 1
+    assert best_loop(data, loop_starts, loop_ends, 48000, max_batches=1) == \
+        (4800, 4800 + 100)
+    assert best_loop(data, loop_starts, loop_ends, 48000, max_batches=2) == \
+        (4800, 4800 + 960 - 1)
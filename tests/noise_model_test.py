@@ -0,0 +1,54 @@
+import numpy
+from lib.noise_model import NoiseModel, windowed_rms
+
+FULL_SCALE = 2 ** 15
+
+
+def noise(frames, level=10, channels=2, seed=0):
+    return numpy.random.RandomState(seed).normal(
+        0, level, (channels, frames)).astype(numpy.int16)
+
+
+def test_windowed_rms():
+    data = numpy.ones((2, 1000)) * 3
+    data[1] *= 2
+    rms = windowed_rms(data, 256)
+    assert rms.shape == (2, 3)
+    assert numpy.allclose(rms[0], 3)
+    assert numpy.allclose(rms[1], 6)
+
+
+def test_model_ignores_clicks_in_noise_capture():
+    capture = noise(96000)
+    clean = NoiseModel.from_capture(capture, FULL_SCALE)
+    capture[0, 5000] = 10000
+    clicky = NoiseModel.from_capture(capture, FULL_SCALE)
+    assert numpy.allclose(clean.noise_rms, clicky.noise_rms, rtol=0.01)
+    assert clicky.threshold > clean.threshold
+
+
+def test_click_does_not_open_gate():
+    gate = NoiseModel.from_capture(noise(96000), FULL_SCALE).gate(FULL_SCALE)
+    chunk = noise(1024, seed=1)
+    chunk[1, 100] = 300
+    assert gate.is_silent(chunk)
+
+
+def test_gate_hysteresis():
+    model = NoiseModel.from_capture(noise(96000), FULL_SCALE)
+    gate = model.gate(FULL_SCALE)
+    assert not gate.is_silent(noise(1024, level=1000, seed=1))
+    # Between the close and open levels, the gate stays open...
+    assert not gate.is_silent(noise(1024, level=20, seed=2))
+    # ...until the tail is back down at the noise floor.
+    assert gate.is_silent(noise(1024, level=10, seed=3))
+    assert gate.is_silent(noise(1024, level=20, seed=4))
+
+
+def test_ignored_channels_never_count():
+    capture = noise(96000)
+    model = NoiseModel.from_capture(capture, FULL_SCALE, channels=[0])
+    gate = model.gate(FULL_SCALE)
+    chunk = noise(1024, seed=1)
+    chunk[1] = noise(1024, level=5000, channels=1, seed=2)
+    assert gate.is_silent(chunk)
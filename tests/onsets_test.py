@@ -0,0 +1,52 @@
+import os
+import numpy
+import tempfile
+from lib.onsets import OnsetTracker
+from lib.utils import trim_data
+from lib.wavio import read_wave_file, TrimmingWaveWriter
+from lib.sample_format import INT16
+
+
+def note(frames=5000, onset=1234, offset=4321):
+    data = numpy.zeros((2, frames), dtype=numpy.int16)
+    data[:, onset:offset] = numpy.random.randint(
+        1000, 2000, (2, offset - onset))
+    data[1, onset] = 3000
+    return data
+
+
+def chunks_of(data, size=512):
+    for start in xrange(0, data.shape[1], size):
+        yield data[:, start:start + size]
+
+
+def test_tracker_matches_trim_data():
+    data = note()
+    tracker = OnsetTracker(500, 100)
+    for chunk in chunks_of(data):
+        tracker.update(chunk)
+    expected = trim_data(data, 500, 100)
+    assert (data[:, tracker.start:tracker.end] == expected).all()
+
+
+def test_tracker_without_onset_keeps_everything():
+    tracker = OnsetTracker(500, 100)
+    tracker.update(numpy.zeros((2, 100), dtype=numpy.int16))
+    assert not tracker.found_onset
+    assert (tracker.start, tracker.end) == (0, 100)
+
+
+def test_trimming_writer_matches_trim_data():
+    for onset in (0, 1, 511, 512, 513, 1234):
+        data = note(onset=onset)
+        path = tempfile.mktemp(suffix='.wav')
+        try:
+            writer = TrimmingWaveWriter(
+                path, 2, INT16, 48000, OnsetTracker(500, 100))
+            for chunk in chunks_of(data):
+                writer.write(chunk)
+            writer.close()
+            expected = trim_data(data, 500, 100)
+            assert (read_wave_file(path, True) == expected).all()
+        finally:
+            os.unlink(path)
@@ -0,0 +1,73 @@
+import time
+import threading
+import numpy
+import pytest
+from lib.pipeline import WorkerPool
+from lib.pitch import Zone
+from lib.record import Recording
+from lib.sample_format import INT16
+from lib.send_notes import process_sample
+
+
+def test_results_come_back_in_submission_order():
+    with WorkerPool(workers=3) as pool:
+        jobs = [
+            pool.submit(lambda i: time.sleep(0.001 * (5 - i)) or i, i)
+            for i in xrange(5)
+        ]
+    assert [job.result() for job in jobs] == range(5)
+
+
+def test_no_workers_runs_inline():
+    pool = WorkerPool(workers=0)
+    job = pool.submit(threading.current_thread)
+    assert job.done
+    assert job.result() is threading.current_thread()
+
+
+def test_errors_are_raised_by_result():
+    with WorkerPool(workers=1) as pool:
+        job = pool.submit(lambda: 1 / 0)
+    with pytest.raises(ZeroDivisionError):
+        job.result()
+
+
+def test_jobs_can_wait_on_earlier_jobs():
+    with WorkerPool(workers=1) as pool:
+        first = pool.submit(lambda: 2)
+        second = pool.submit(lambda: first.result() * 2)
+    assert second.result() == 4
+
+
+def test_submit_blocks_when_backlog_is_full():
+    release = threading.Event()
+    pool = WorkerPool(workers=1, max_pending=2)
+    pool.submit(release.wait)
+    pool.submit(release.wait)
+    submitted = threading.Event()
+
+    def submit_third():
+        pool.submit(lambda: None)
+        submitted.set()
+
+    threading.Thread(target=submit_third).start()
+    assert not submitted.wait(0.05)
+    release.set()
+    assert submitted.wait(1)
+    pool.close()
+
+
+def test_samples_are_looped_at_their_own_sample_rate(tmpdir, monkeypatch):
+    rates = []
+    monkeypatch.setattr(
+        'lib.send_notes.find_loop_points',
+        lambda data, sample_rate, **kwargs: rates.append(sample_rate))
+    data = numpy.ones((2, 1000), numpy.int16)
+    recording = Recording(
+        INT16, data, None, 0, 0, 1, None, 0, 1000, None, None, 500)
+    region = process_sample(
+        recording, Zone(low=60, high=60, center=60), 127,
+        str(tmpdir.join('C4_v127.aif')), [127],
+        looping_enabled=True, sample_rate=96000)
+    assert rates == [96000]
+    assert region.attributes['pitch_keycenter'] == 60
@@ -1,6 +1,6 @@
 """A few tests for pitch.py."""
 
-from lib.pitch import compute_zones, Zone
+from lib.pitch import compute_zones, plan_zones, zones_around, Zone
 
 
 def test_zones_with_step_1():
@@ -43,3 +43,29 @@ def test_zones_with_step_4():
         Zone(low=52, center=54, high=55),
         Zone(low=56, center=58, high=56),
     ] == compute_zones(total, step=4)
+
+
+def test_zones_around_keys():
+    assert [
+        Zone(low=48, high=49, center=48),
+        Zone(low=50, high=53, center=52),
+        Zone(low=54, high=56, center=56),
+    ] == zones_around([48, 52, 56], Zone(48, 56))
+
+
+def test_plan_zones_stays_coarse_for_smooth_sounds():
+    zones = plan_zones(Zone(21, 108), lambda a, b: 0.0, 0.1, max_step=12)
+    assert [zone.center for zone in zones] == \
+        list(range(21, 108, 12)) + [108]
+
+
+def test_plan_zones_bisects_where_sound_changes():
+    # The sound changes abruptly between keys 60 and 61.
+    def distance(a, b):
+        return 1.0 if a <= 60 < b else 0.0
+
+    zones = plan_zones(Zone(48, 72), distance, 0.5, max_step=12)
+    assert [zone.center for zone in zones] == [48, 60, 61, 63, 66, 72]
+    assert zones[0].low == 48 and zones[-1].high == 72
+    for zone, next_zone in zip(zones, zones[1:]):
+        assert zone.high + 1 == next_zone.low
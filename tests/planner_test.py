@@ -0,0 +1,57 @@
+from lib.pitch import Zone
+from lib.planner import plan_session, DurationModel, PlannedNote, \
+    format_seconds
+
+ZONES = [Zone(low=60, high=60, center=60), Zone(low=61, high=61, center=61)]
+
+
+def test_presamples_only_when_the_pitch_changes():
+    plan = plan_session(ZONES, [63, 127], ascending=True, portamento=True)
+    assert [(n.zone.center, n.velocity, n.presample) for n in plan] == [
+        (60, 63, True),
+        (60, 127, False),
+        (61, 63, True),
+        (61, 127, False),
+    ]
+    assert [n.done_note for n in plan] == [False, True, False, True]
+    assert not any(n.presample for n in plan_session(ZONES, [63, 127]))
+
+
+def test_no_presamples_without_portamento():
+    plan = plan_session(ZONES, [63, 127], ascending=True)
+    assert not any(n.presample for n in plan)
+
+
+def test_sampled_notes_are_skipped():
+    plan = plan_session(
+        ZONES, [63, 127],
+        sampled=lambda zone, velocity: velocity == 63,
+        portamento=True)
+    assert [(n.zone.center, n.sampled, n.presample) for n in plan] == [
+        (61, True, False),
+        (61, False, True),
+        (60, True, False),
+        (60, False, True),
+    ]
+
+
+def test_duration_model_uses_nearby_notes():
+    model = DurationModel(fallback=10.0)
+    assert model.estimate(60, 127) == 10.0
+    model.add(60, 127, 4.0)
+    model.add(62, 127, 6.0)
+    assert 4.0 < model.estimate(61, 127) < 6.0
+    assert model.estimate(60, 127) < model.estimate(61, 127)
+    assert model.estimate(100, 127) == 10.0
+
+
+def test_note_seconds():
+    model = DurationModel(fallback=10.0)
+    note = PlannedNote(ZONES[0], 127, True, True, False)
+    assert model.note_seconds(note, presample_seconds=5) == 15.0
+    assert model.note_seconds(note._replace(sampled=True), 5) == 0
+
+
+def test_format_seconds():
+    assert format_seconds(65) == "1m05s"
+    assert format_seconds(3725) == "1h02m05s"
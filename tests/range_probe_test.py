@@ -0,0 +1,57 @@
+import shutil
+import tempfile
+import pytest
+from lib.cache import Cache
+from lib.pitch import Zone
+from lib.range_probe import responsive_keys, prune_zones, range_cache_key
+
+
+@pytest.fixture
+def folder():
+    path = tempfile.mkdtemp()
+    yield path
+    shutil.rmtree(path)
+
+
+def test_finds_responsive_keys():
+    assert responsive_keys(
+        lambda key: 40 <= key <= 50, range(30, 60)) == range(40, 51)
+
+
+def test_cached_keys_are_not_probed_again(folder):
+    probed = []
+
+    def sounds(key):
+        probed.append(key)
+        return key % 2 == 0
+
+    key = range_cache_key('Synth', 5, None, [(0, 1)])
+    first = responsive_keys(
+        sounds, range(60, 66), Cache('ranges', folder), key)
+    assert probed == range(60, 66)
+
+    del probed[:]
+    second = responsive_keys(
+        sounds, range(58, 66), Cache('ranges', folder), key)
+    assert probed == [58, 59]
+    assert first == [60, 62, 64]
+    assert second == [58, 60, 62, 64]
+
+
+def test_programs_are_cached_separately(folder):
+    cache = Cache('ranges', folder)
+    responsive_keys(lambda key: True, [60], cache, range_cache_key('A', 1))
+    assert responsive_keys(
+        lambda key: False, [60], cache, range_cache_key('A', 2)) == []
+
+
+def test_prune_zones():
+    zones = [
+        Zone(low=57, high=59, center=58),
+        Zone(low=60, high=62, center=61),
+        Zone(low=63, high=65, center=64),
+    ]
+    assert prune_zones(zones, [60, 62, 63, 64, 65]) == [
+        Zone(low=60, high=62, center=62),
+        Zone(low=63, high=65, center=64),
+    ]
@@ -0,0 +1,101 @@
+import numpy
+from lib.backends import PA_CONTINUE, PA_INPUT_OVERFLOW
+from lib.noise_model import NoiseModel
+from lib.record import AudioSession, ChunkQueue, CHUNK_SIZE
+from lib.sample_format import INT16
+from lib.utils import note_frequency
+from lib.virtual_instrument import VirtualInstrument
+
+
+def test_full_queue_drops_and_counts_chunks():
+    chunks = ChunkQueue(maxsize=3)
+    chunks.start()
+    for i in range(5):
+        assert chunks.callback(str(i), 1024, {}, 0) == (None, PA_CONTINUE)
+    assert chunks.overflows == 2
+    assert chunks.xruns == 0
+    assert [chunks.get(timeout=0) for _ in range(3)] == ['0', '1', '2']
+
+    # Room again, so nothing more is dropped.
+    chunks.callback('5', 1024, {}, 0)
+    assert chunks.get(timeout=0) == '5'
+    assert chunks.overflows == 2
+
+
+def test_backend_overflows_count_as_xruns():
+    chunks = ChunkQueue(maxsize=2)
+    chunks.start()
+    for status in (0, PA_INPUT_OVERFLOW, 0, PA_INPUT_OVERFLOW):
+        chunks.callback('chunk', 1024, {}, status)
+    assert chunks.xruns == 2
+    assert chunks.overflows == 2
+
+
+def test_counts_start_over_with_each_capture():
+    chunks = ChunkQueue(maxsize=1)
+    chunks.start()
+    for _ in range(3):
+        chunks.callback('chunk', 1024, {}, PA_INPUT_OVERFLOW)
+    chunks.stop()
+
+    # Chunks arriving between captures are neither kept nor counted.
+    chunks.callback('between', 1024, {}, PA_INPUT_OVERFLOW)
+    assert (chunks.overflows, chunks.xruns) == (2, 3)
+    chunks.start()
+    assert (chunks.overflows, chunks.xruns) == (0, 0)
+    chunks.callback('next', 1024, {}, 0)
+    assert chunks.get(timeout=0) == 'next'
+
+
+def test_one_session_captures_note_after_note():
+    instrument = VirtualInstrument(speed=20)
+    opened = []
+    open_audio_input = instrument.open_audio_input
+
+    def open_once(*args):
+        opened.append(open_audio_input(*args))
+        return opened[-1]
+    instrument.open_audio_input = open_once
+
+    def capture(session, note):
+        def on_time_up():
+            instrument.send_message([0x90, note, 0])
+            return True
+        return session.capture_note(
+            limit=0.5,
+            after_start=lambda: instrument.send_message([0x90, note, 127]),
+            on_time_up=on_time_up,
+            threshold=0.001,
+            print_progress=False,
+        )
+
+    with AudioSession(
+        instrument.input_device_name(None),
+        sample_format=INT16,
+        backend=instrument,
+    ) as session:
+        noise = session.capture_note(
+            limit=0.2, threshold=0.1, print_progress=False,
+            allow_empty_return=True)
+        session.noise_model = NoiseModel.from_capture(
+            noise.data, INT16.full_scale)
+        recordings = [capture(session, note) for note in (60, 72)]
+        stream = session.stream
+        assert not session.chunks.listening
+        assert not stream.closed
+
+    assert len(opened) == 1 and opened[0] is stream
+    assert stream.closed
+    assert session.captures == 3
+    for recording, note in zip(recordings, (60, 72)):
+        # Each capture counts frames from its own start, with its own
+        # noise gate and onset tracker, so it's trimmed to its own note
+        # and holds nothing of the one before.
+        assert abs(recording.release_frame - 0.5 * 48000) <= CHUNK_SIZE
+        assert recording.trim_start < recording.release_frame
+        assert (recording.overflows, recording.xruns) == (0, 0)
+        frequency = numpy.argmax(numpy.absolute(numpy.fft.rfft(
+            recording.trimmed[0], 48000)))
+        assert abs(frequency - note_frequency(note)) < 2
+    lengths = [recording.data.shape[1] for recording in recordings]
+    assert abs(lengths[1] - lengths[0]) < 0.25 * lengths[0]
@@ -0,0 +1,141 @@
+import os
+import sys
+import types
+import shutil
+import tempfile
+import numpy
+import pytest
+from lib.reloop import reloop, \
+    region_bounds, \
+    region_problem, \
+    loop_sample, \
+    sustain_end
+from lib.sfzparser import SFZFile
+from lib.virtual_instrument import VirtualInstrument, Voice
+from lib.wavio import write_wave_file
+
+SAMPLE_RATE = 48000
+
+
+@pytest.fixture
+def folder():
+    path = tempfile.mkdtemp()
+    yield path
+    shutil.rmtree(path)
+
+
+def tone(frequency, seconds):
+    t = numpy.arange(int(seconds * SAMPLE_RATE)) / float(SAMPLE_RATE)
+    wave = numpy.sin(2 * numpy.pi * frequency * t) * 10000
+    return wave.astype(numpy.int16)
+
+
+def held_note(hold, release):
+    """A note held for ``hold`` seconds and then released."""
+    instrument = VirtualInstrument(decay=0.1, release=release)
+    instrument.voices.append(Voice(60, 127, 1, 0))
+    noise = numpy.random.RandomState(0)
+    held = instrument.render(int(hold * SAMPLE_RATE), 2, SAMPLE_RATE, noise)
+    instrument.voices[0].release_frame = instrument.frame
+    tail = instrument.render(
+        int(release * 5 * SAMPLE_RATE), 2, SAMPLE_RATE, noise)
+    return numpy.round(
+        numpy.concatenate([held, tail], 1) * 2 ** 15).astype(numpy.int16)
+
+
+def test_end_is_inclusive():
+    assert region_bounds({'offset': '100', 'end': '199'}) == (100, 200)
+    assert region_bounds({}) == (0, None)
+
+
+def test_loops_every_region_of_a_shared_sample(folder):
+    first = tone(200, 2)
+    second = tone(300, 2)
+    data = numpy.concatenate([first, second])
+    write_wave_file(
+        os.path.join(folder, 'C4.wav'),
+        numpy.array([data, data]))
+    sfz = os.path.join(folder, 'file.sfz')
+    with open(sfz, 'w') as f:
+        f.write("<group>\nlokey=60\nhikey=60\n"
+                "<region>\nsample=C4.wav\noffset=0\nend=%d\nhivel=63\n"
+                "<region>\nsample=C4.wav\noffset=%d\nend=%d\nhivel=127\n" % (
+                    len(first) - 1, len(first), len(data) - 1))
+
+    quality = reloop([sfz], workers=2)
+    assert quality > 0.9
+
+    regions = SFZFile(open(sfz).read()).groups[0].regions
+    regions = [region for region in regions if region.attributes]
+    assert len(regions) == 2
+    for region, offset in zip(regions, (0, len(first))):
+        loop_start = int(region.attributes['loop_start'])
+        loop_end = int(region.attributes['loop_end'])
+        assert region.attributes['loop_mode'] == 'loop_continuous'
+        assert offset <= loop_start < loop_end <= offset + len(first)
+        assert loop_end - loop_start > 0.19 * SAMPLE_RATE
+
+
+def test_dry_run_leaves_files_alone(folder):
+    write_wave_file(os.path.join(folder, 'C4.wav'), tone(200, 2)[None])
+    sfz = os.path.join(folder, 'file.sfz')
+    text = "<region>\nsample=C4.wav\n"
+    with open(sfz, 'w') as f:
+        f.write(text)
+    assert reloop([sfz], workers=1, dry_run=True) > 0.9
+    assert open(sfz).read() == text
+
+
+def test_regions_are_checked_before_looping(folder):
+    assert region_problem(96000, 0, None, SAMPLE_RATE) is None
+    assert region_problem(96000, 48000, 96000, SAMPLE_RATE) is None
+    assert 'outside' in region_problem(96000, 48000, 96001, SAMPLE_RATE)
+    assert 'outside' in region_problem(96000, 96000, None, SAMPLE_RATE)
+    assert 'too short' in region_problem(96000, 0, 1000, SAMPLE_RATE)
+
+    path = os.path.join(folder, 'C4.wav')
+    write_wave_file(path, tone(200, 2)[None])
+    _, results, _, error = loop_sample((path, [
+        (0, 0, None),
+        (1, 0, 1000),
+        (2, 90000, 100000),
+    ], 'autocorrelation', (0.5, 0.2)))
+    assert error is None
+    assert all(result.loop is None for result in results)
+    assert 'sustain window' in results[0].problem
+    assert 'too short' in results[1].problem
+    assert 'outside' in results[2].problem
+
+
+def test_sustain_ends_at_the_note_off():
+    for release in (0.3, 1.0, 2.0):
+        assert abs(sustain_end(held_note(2, release), SAMPLE_RATE) -
+                   2 * SAMPLE_RATE) <= 0.02 * SAMPLE_RATE
+    data = tone(200, 2)[None]
+    assert sustain_end(data, SAMPLE_RATE) == data.shape[1]
+
+
+def test_loops_stay_out_of_the_release(folder):
+    path = os.path.join(folder, 'C4.wav')
+    write_wave_file(path, held_note(2, 2.0))
+    for strategy in ('autocorrelation', 'cross-correlation'):
+        _, (result,), _, _ = loop_sample(
+            (path, [(0, 0, None)], strategy, (0.0, 1.0)))
+        assert result.loop[1] < 2 * SAMPLE_RATE
+
+
+def test_plotting_works_when_imported(folder, monkeypatch):
+    plotted = []
+    pyplot = types.ModuleType('matplotlib.pyplot')
+    pyplot.plot = lambda *args: plotted.append(args)
+    pyplot.axvline = pyplot.show = lambda *args: None
+    matplotlib = types.ModuleType('matplotlib')
+    matplotlib.pyplot = pyplot
+    monkeypatch.setitem(sys.modules, 'matplotlib', matplotlib)
+    monkeypatch.setitem(sys.modules, 'matplotlib.pyplot', pyplot)
+
+    from lib.loop import process
+    path = os.path.join(folder, 'C4.wav')
+    write_wave_file(path, tone(200, 2)[None])
+    process(path)
+    assert len(plotted) == 3
@@ -0,0 +1,30 @@
+import struct
+import numpy
+from lib.sample_format import INT16, INT24, FLOAT32, by_name
+
+
+def test_int24_decode():
+    raw = struct.pack('<3B3B3B', 0x01, 0x00, 0x00,
+                      0xff, 0xff, 0xff,
+                      0x00, 0x00, 0x80)
+    assert list(INT24.decode(raw)) == [1, -1, -2 ** 23]
+
+
+def test_int24_round_trip():
+    samples = numpy.random.randint(
+        -2 ** 23, 2 ** 23, 999).astype(numpy.int32)
+    raw = INT24.encode(samples)
+    assert len(raw) == 999 * 3
+    assert (INT24.decode(raw) == samples).all()
+
+
+def test_encode_interleaves_transposed_views():
+    data = numpy.array([[1, 2, 3], [-1, -2, -3]], dtype=numpy.int32)
+    for sample_format in (INT16, INT24, FLOAT32):
+        decoded = sample_format.decode(
+            sample_format.encode(data.T.astype(sample_format.dtype)))
+        assert list(decoded) == [1, -1, 2, -2, 3, -3]
+
+
+def test_by_name():
+    assert by_name('int24') is INT24
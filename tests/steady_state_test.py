@@ -0,0 +1,42 @@
+import numpy
+from lib.steady_state import SteadyStateDetector
+
+SAMPLE_RATE = 48000
+FULL_SCALE = 2 ** 15
+
+
+def tone(seconds, envelope=lambda t: 0.5, frequency=220.0):
+    t = numpy.arange(int(seconds * SAMPLE_RATE)) / float(SAMPLE_RATE)
+    x = envelope(t) * (
+        numpy.sin(2 * numpy.pi * frequency * t) +
+        0.5 * numpy.sin(4 * numpy.pi * frequency * t))
+    return numpy.array([x, x]) * FULL_SCALE * 0.5
+
+
+def seconds_until_ready(data, required=1.0):
+    detector = SteadyStateDetector(SAMPLE_RATE, required, FULL_SCALE, -80)
+    for start in xrange(0, data.shape[1], 1024):
+        detector.update(data[:, start:start + 1024])
+        if detector.ready:
+            return float(start + 1024) / SAMPLE_RATE
+
+
+def test_sustained_tone_becomes_ready():
+    ready_at = seconds_until_ready(tone(3.0))
+    assert ready_at is not None
+    assert 1.0 < ready_at < 1.3
+
+
+def test_decaying_tone_never_becomes_ready():
+    assert seconds_until_ready(
+        tone(5.0, lambda t: numpy.exp(-t))) is None
+
+
+def test_silence_never_becomes_ready():
+    assert seconds_until_ready(numpy.zeros((2, 3 * SAMPLE_RATE))) is None
+
+
+def test_timbre_change_restarts_stretch():
+    data = numpy.concatenate([
+        tone(0.8), tone(2.0, frequency=330.0)], 1)
+    assert seconds_until_ready(data) > 1.8
@@ -0,0 +1,46 @@
+import numpy
+from lib.velocity_probe import probe_velocity_layers, probe_keys, \
+    compare_layers
+from lib.pitch import Zone
+
+SAMPLE_RATE = 48000
+
+
+def note(velocity, brightness=0.0, phase=0.0):
+    t = numpy.arange(SAMPLE_RATE) / float(SAMPLE_RATE)
+    bright = brightness * velocity / 127.0
+    x = numpy.exp(-3 * t) * (
+        numpy.sin(2 * numpy.pi * 220 * t + phase) +
+        bright * numpy.sin(2 * numpy.pi * 1760 * t))
+    x *= 10000 * velocity / 127.0
+    return numpy.array([x, x]).astype(numpy.int16)
+
+
+def test_gain_only_layers_compare_equal():
+    distance, envelope_difference, gain = compare_layers(
+        note(15, phase=1.0), note(127))
+    assert distance < 0.1
+    assert envelope_difference < 0.05
+    assert abs(gain - 15 / 127.0) < 0.01
+
+
+def test_collapses_gain_only_layers():
+    plan = probe_velocity_layers(
+        lambda key, velocity: note(velocity), [48, 60], [15, 63, 127])
+    assert plan.collapsed
+    assert plan.velocity_levels == [127]
+    assert abs(plan.velcurve[15] - 15 / 127.0) < 0.01
+
+
+def test_keeps_layers_that_change_timbre():
+    plan = probe_velocity_layers(
+        lambda key, velocity: note(velocity, brightness=2.0),
+        [48, 60],
+        [15, 63, 127])
+    assert not plan.collapsed
+    assert plan.velocity_levels == [15, 63, 127]
+
+
+def test_probe_keys_spread_across_zones():
+    zones = [Zone(low=k, high=k, center=k) for k in range(21, 109)]
+    assert probe_keys(zones) == [21, 65, 108]
@@ -0,0 +1,83 @@
+import numpy
+from lib.virtual_instrument import VirtualInstrument
+from lib.record import AudioSession
+from lib.sample_format import INT16
+from lib.midi_helpers import set_program_number
+
+
+def render(instrument, frames=4800, channels=2, seed=0):
+    return instrument.render(
+        frames, channels, 48000, numpy.random.RandomState(seed))
+
+
+def test_silent_until_note_on():
+    instrument = VirtualInstrument(noise_floor=0.001)
+    assert numpy.amax(numpy.absolute(render(instrument))) <= 0.001
+    instrument.send_message([0x90, 60, 127])
+    assert numpy.amax(numpy.absolute(render(instrument))) > 0.1
+
+
+def test_rendering_is_deterministic():
+    outputs = []
+    for _ in xrange(2):
+        instrument = VirtualInstrument()
+        instrument.send_message([0x90, 60, 100])
+        outputs.append(render(instrument))
+    assert (outputs[0] == outputs[1]).all()
+
+
+def test_release_tail_dies_out():
+    instrument = VirtualInstrument(release=0.05)
+    instrument.send_message([0x90, 60, 127])
+    render(instrument)
+    instrument.send_message([0x90, 60, 0])
+    render(instrument, frames=48000)
+    assert not instrument.voices
+    assert numpy.amax(numpy.absolute(render(instrument))) <= \
+        instrument.noise_floor
+
+
+def test_all_notes_off_and_key_range():
+    instrument = VirtualInstrument(low_key=40, high_key=80)
+    instrument.send_message([0x90, 20, 127])
+    assert numpy.amax(numpy.absolute(render(instrument))) <= \
+        instrument.noise_floor
+    instrument.send_message([0xB0, 0x7B, 0])
+    assert all(voice.release_frame is not None
+               for voice in instrument.voices)
+
+
+def test_channels_map_to_input_pairs():
+    instrument = VirtualInstrument(noise_floor=0)
+    instrument.send_message([0x91, 60, 127])
+    out = render(instrument, channels=4)
+    assert not out[:2].any()
+    assert out[2:].any()
+
+
+def test_session_captures_a_note_and_its_release():
+    instrument = VirtualInstrument(speed=20)
+
+    def on_time_up():
+        instrument.send_message([0x90, 60, 0])
+        return True
+    with AudioSession(
+        instrument.input_device_name(None),
+        sample_format=INT16,
+        backend=instrument,
+    ) as session:
+        recording = session.capture_note(
+            limit=0.5,
+            after_start=lambda: instrument.send_message([0x90, 60, 127]),
+            on_time_up=on_time_up,
+            threshold=0.001,
+            print_progress=False,
+        )
+    assert recording.release_time is not None
+    assert recording.trimmed.shape[1] > 0.5 * 48000
+
+
+def test_program_changes_reach_the_instrument():
+    instrument = VirtualInstrument()
+    set_program_number(instrument, 3, 5)
+    assert instrument.program == 5
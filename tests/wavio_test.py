@@ -0,0 +1,166 @@
+import os
+import wave
+import numpy
+import struct
+import pytest
+import tempfile
+from lib.wavio import read_wave_file, \
+    read_wave_header, \
+    write_wave_file, \
+    truncate_wave_file, \
+    WaveWriter
+from lib.sample_format import INT16, INT24, FLOAT32
+
+
+def stereo(frames):
+    return numpy.random.randint(
+        -2 ** 15, 2 ** 15, (2, frames)).astype(numpy.int16)
+
+
+def test_round_trip():
+    data = stereo(1000)
+    path = tempfile.mktemp(suffix='.wav')
+    try:
+        write_wave_file(path, data, INT16, 48000)
+        assert (read_wave_file(path, True) == data).all()
+    finally:
+        os.unlink(path)
+
+
+def test_streamed_chunks_match_single_write():
+    data = stereo(1000)
+    path = tempfile.mktemp(suffix='.wav')
+    try:
+        with WaveWriter(path, 2, INT16, 48000) as writer:
+            for start in range(0, 1000, 300):
+                writer.write(data[:, start:start + 300])
+        assert writer.frames_written == 1000
+        assert (read_wave_file(path, True) == data).all()
+    finally:
+        os.unlink(path)
+
+
+def test_round_trip_other_formats():
+    for sample_format, data in [
+        (INT24, numpy.random.randint(
+            -2 ** 23, 2 ** 23, (2, 1001)).astype(numpy.int32)),
+        (FLOAT32, numpy.random.uniform(
+            -1, 1, (2, 1001)).astype(numpy.float32)),
+    ]:
+        path = tempfile.mktemp(suffix='.wav')
+        try:
+            write_wave_file(path, data, sample_format, 48000)
+            with open(path, 'rb') as f:
+                data_offset = read_wave_header(f).data_offset
+            assert os.path.getsize(path) == data_offset + data.nbytes * \
+                sample_format.sample_width / data.itemsize
+            assert (read_wave_file(path, True) == data).all()
+        finally:
+            os.unlink(path)
+
+
+def chunks(path):
+    """The (id, contents) of each chunk of a RIFF/WAVE file."""
+    with open(path, 'rb') as f:
+        riff, size, wave_id = struct.unpack('<4sI4s', f.read(12))
+        assert (riff, wave_id) == ('RIFF', 'WAVE')
+        assert size == os.path.getsize(path) - 8
+        found = []
+        while f.tell() < size + 8:
+            chunk_id, chunk_size = struct.unpack('<4sI', f.read(8))
+            found.append((chunk_id, f.read(chunk_size)))
+            f.read(chunk_size & 1)
+        return found
+
+
+def write_chunks(sample_format, num_channels, frames=101):
+    data = numpy.zeros((num_channels, frames), sample_format.dtype)
+    path = tempfile.mktemp(suffix='.wav')
+    try:
+        write_wave_file(path, data, sample_format, 48000)
+        return dict(chunks(path))
+    finally:
+        os.unlink(path)
+
+
+def test_headers_follow_the_spec():
+    pcm = write_chunks(INT16, 2)
+    assert sorted(pcm) == ['data', 'fmt ']
+    assert struct.unpack('<H', pcm['fmt '][:2])[0] == 1
+    assert len(pcm['fmt ']) == 16
+
+    # IEEE float needs a cbSize and a fact chunk with the frame count.
+    floats = write_chunks(FLOAT32, 2)
+    assert sorted(floats) == ['data', 'fact', 'fmt ']
+    assert len(floats['fmt ']) == 18
+    assert struct.unpack('<H', floats['fmt '][:2])[0] == 3
+    assert struct.unpack('<H', floats['fmt '][16:])[0] == 0
+    assert struct.unpack('<I', floats['fact'])[0] == 101
+
+    # More than 16 bits or two channels needs WAVE_FORMAT_EXTENSIBLE.
+    for sample_format, num_channels, sub_format in [
+        (INT24, 2, 1),
+        (INT16, 4, 1),
+        (FLOAT32, 4, 3),
+    ]:
+        fmt = write_chunks(sample_format, num_channels)['fmt ']
+        assert len(fmt) == 40
+        tag, channels = struct.unpack('<HH', fmt[:4])
+        assert (tag, channels) == (0xFFFE, num_channels)
+        cb_size, valid_bits, _, sub_tag = struct.unpack('<HHIH', fmt[16:26])
+        assert cb_size == 22
+        assert valid_bits == sample_format.bits_per_sample
+        assert sub_tag == sub_format
+
+
+def test_truncating_keeps_the_fact_chunk_in_step():
+    data = numpy.random.uniform(-1, 1, (2, 1000)).astype(numpy.float32)
+    path = tempfile.mktemp(suffix='.wav')
+    try:
+        write_wave_file(path, data, FLOAT32, 48000)
+        truncate_wave_file(path, 300)
+        found = dict(chunks(path))
+        assert struct.unpack('<I', found['fact'])[0] == 300
+        assert (read_wave_file(path, True) == data[:, :300]).all()
+    finally:
+        os.unlink(path)
+
+
+def test_stdlib_wave_reads_what_we_write():
+    data = stereo(1000)
+    path = tempfile.mktemp(suffix='.wav')
+    try:
+        write_wave_file(path, data, INT16, 44100)
+        reader = wave.open(path)
+        assert reader.getnchannels() == 2
+        assert reader.getframerate() == 44100
+        frames = numpy.frombuffer(reader.readframes(1000), '<i2')
+        reader.close()
+        assert (frames.reshape((-1, 2)).T == data).all()
+    finally:
+        os.unlink(path)
+
+
+def test_soundfile_reads_what_we_write():
+    soundfile = pytest.importorskip('soundfile')
+    for sample_format, num_channels, dtype in [
+        (INT16, 4, 'int16'),
+        (INT24, 2, 'int32'),
+        (FLOAT32, 2, 'float32'),
+        (FLOAT32, 6, 'float32'),
+    ]:
+        data = numpy.random.uniform(-0.5, 0.5, (num_channels, 500))
+        if sample_format is not FLOAT32:
+            data = (data * sample_format.full_scale).astype(
+                sample_format.dtype)
+        data = data.astype(sample_format.dtype)
+        path = tempfile.mktemp(suffix='.wav')
+        try:
+            write_wave_file(path, data, sample_format, 48000)
+            read, sample_rate = soundfile.read(path, dtype=dtype)
+            assert sample_rate == 48000
+            if sample_format is INT24:
+                read = read >> 8
+            assert (read.T == data).all()
+        finally:
+            os.unlink(path)